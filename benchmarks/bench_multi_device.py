@@ -0,0 +1,79 @@
+"""多設備邊緣節點基準測試
+
+量測單一 EdgeComputing（multi_device 模式）在不同設備數量下的每訊息處理成本，
+並依指定的取樣頻率換算單核心可支撐的設備數量。
+
+用法：
+    python benchmarks/bench_multi_device.py --devices 10 100 1000 --rate 1
+    python benchmarks/bench_multi_device.py --workers 4   # 經由 worker 佇列（overflow="block"）處理
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from edge_computing import EdgeComputing, SENSOR_TYPES  # noqa: E402
+from transport import InMemoryBroker, InMemoryTransport  # noqa: E402
+
+
+class Message:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def run(device_count, messages, window_size, workers=0):
+    edge = EdgeComputing(
+        "device001",
+        window_size=window_size,
+        multi_device=True,
+        transport=InMemoryTransport(InMemoryBroker()),
+        workers=workers,
+        metrics_interval=None
+    )
+    rng = random.Random(0)
+    stream = [
+        Message(f"jetsion/taguchi/device{d:05d}/{sensor_type}", f"{rng.uniform(1, 100):.2f}".encode())
+        for d in range(device_count)
+        for sensor_type in SENSOR_TYPES
+    ]
+    total = max(messages, len(stream))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for i in range(total):
+            edge.on_message(None, None, stream[i % len(stream)])
+        # workers > 0 時計入佇列中剩餘訊息的處理時間
+        if edge.worker_pool is not None:
+            edge.worker_pool.wait_idle()
+        elapsed = time.perf_counter() - start
+        shard_bytes = sum(sum(shard.buffer_memory().values()) for shard in edge.shards.values())
+        edge.stop()
+    return total / elapsed, len(edge.shards), shard_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多設備邊緣節點基準測試")
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=50000, help="每種設備數量處理的訊息數")
+    parser.add_argument("--rate", type=float, default=1.0, help="每個感測器的取樣頻率 (Hz)")
+    parser.add_argument("--window-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker 執行緒數量，0 表示在呼叫端直接處理（只量測單核心成本）")
+    args = parser.parse_args()
+
+    print(f"{'設備數':>8} {'訊息/秒':>12} {'µs/訊息':>10} {'緩衝區 MB':>10} {'可支撐設備數':>12}")
+    for device_count in args.devices:
+        rate, shards, shard_bytes = run(device_count, args.messages, args.window_size, args.workers)
+        sustainable = int(rate / (len(SENSOR_TYPES) * args.rate))
+        print(f"{device_count:>8} {rate:>12.0f} {1e6 / rate:>10.2f} {shard_bytes / 1e6:>10.1f} {sustainable:>12}")
+    print(f"（可支撐設備數以每設備 {len(SENSOR_TYPES)} 個感測器、每感測器 {args.rate} Hz 換算）")
+
+
+if __name__ == "__main__":
+    main()
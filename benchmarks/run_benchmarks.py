@@ -0,0 +1,452 @@
+"""感測器 → 邊緣計算 → UI 數據路徑基準測試
+
+全部以 InMemoryTransport 執行，不需網路與 MQTT broker。
+結果寫成 JSON，可與先前版本的結果比較以偵測效能退化。
+
+用法：
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --quick --compare baseline.json --threshold 0.15
+    python benchmarks/run_benchmarks.py --only edge_on_message sn_ratio
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import numpy as np  # noqa: E402
+
+import checkpoint  # noqa: E402
+from downsample import DEFAULT_MAX_POINTS, downsample  # noqa: E402
+from edge_computing import EdgeComputing, SENSOR_TYPES  # noqa: E402
+from robust_filter import HampelFilter  # noqa: E402
+from spc import SPCMonitor  # noqa: E402
+from sensor_simulator import SensorSimulator, MultiSensorSimulator  # noqa: E402
+from streaming_stats import RunningStats  # noqa: E402
+from topic_router import TopicRouter  # noqa: E402
+from transport import InMemoryBroker, InMemoryTransport, InMemoryMessage  # noqa: E402
+
+RESULT_VERSION = 1
+
+
+def measure(func, operations, repeats):
+    """重複執行 func，回傳每秒操作數（取中位數）與各次結果"""
+    rates = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        rates.append(operations / elapsed)
+    return {
+        "ops_per_s": statistics.median(rates),
+        "best_ops_per_s": max(rates),
+        "us_per_op": 1e6 / statistics.median(rates),
+        "operations": operations,
+        "repeats": repeats,
+    }
+
+
+@contextlib.contextmanager
+def silenced():
+    """暫時丟棄 stdout 與日誌輸出，只保留日誌等級的判斷成本"""
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    root.handlers = [logging.NullHandler()]
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        root.handlers = handlers
+
+
+def make_edge(window_size):
+    return EdgeComputing(
+        "device001",
+        window_size=window_size,
+        transport=InMemoryTransport(InMemoryBroker()),
+        workers=0,
+        metrics_interval=None
+    )
+
+
+def bench_edge_on_message(buffer_sizes, messages, repeats):
+    """EdgeComputing.on_message 在緩衝區已滿時的處理速率"""
+    results = {}
+    rng = np.random.default_rng(0)
+    stream = [
+        InMemoryMessage(f"jetsion/taguchi/device001/{sensor_type}", f"{value:.2f}".encode())
+        for value, sensor_type in zip(rng.uniform(1, 100, 4096), SENSOR_TYPES * 1024)
+    ]
+    for size in buffer_sizes:
+        edge = make_edge(size)
+        shard = edge.shards["device001"]
+        now = time.time()
+        for sensor_type in SENSOR_TYPES:
+            shard.load_history(sensor_type, rng.uniform(1, 100, size), np.full(size, now))
+
+        def run():
+            for i in range(messages):
+                edge.on_message(None, None, stream[i & 4095])
+
+        with silenced():
+            results[str(size)] = measure(run, messages, repeats)
+        edge.stop()
+    return results
+
+
+def bench_edge_pipeline(worker_counts, messages, repeats, devices=16, queue_size=256):
+    """感測器經 InMemoryBroker 到 EdgeComputing worker 的端到端處理速率
+
+    使用預設的 overflow="block" 與較小的佇列，發布速度高於處理速度時發布端會等待；
+    邊緣發布的 S/N 比經由同一個 broker 回到邊緣，可確認 worker 不會在自己的佇列上卡住。
+    """
+    rng = np.random.default_rng(6)
+    stream = [
+        (f"jetsion/taguchi/device{i % devices:03d}/{sensor_type}", f"{value:.2f}".encode())
+        for i, (value, sensor_type) in enumerate(zip(rng.uniform(1, 100, 4096), SENSOR_TYPES * 1024))
+    ]
+    results = {}
+    for workers in worker_counts:
+        broker = InMemoryBroker()
+        with silenced():
+            edge = EdgeComputing(
+                "device001",
+                multi_device=True,
+                transport=InMemoryTransport(broker),
+                workers=workers,
+                queue_size=queue_size,
+                metrics_interval=None
+            )
+        publisher = InMemoryTransport(broker)
+        publisher.connect()
+
+        def run(edge=edge, publish=publisher.publish):
+            for i in range(messages):
+                publish(*stream[i & 4095])
+            if not (edge.client.wait_idle(60) and edge.worker_pool.wait_idle(60)):
+                raise RuntimeError(f"workers={workers} 的邊緣計算層在 60 秒內未處理完畢")
+
+        with silenced():
+            result = measure(run, messages, repeats)
+            stats = edge.queue_stats()
+            edge.stop()
+        result["blocked"] = stats["blocked"]
+        result["inline"] = stats["inline"]
+        results[f"workers_{workers}"] = result
+    return results
+
+
+def bench_sn_ratio(window_sizes, calls, repeats):
+    """calculate_sn_ratio 的成本：list 輸入（逐次掃描）與 RunningStats（增量）"""
+    edge = make_edge(10)
+    results = {}
+    rng = np.random.default_rng(1)
+    for size in window_sizes:
+        values = list(rng.uniform(1, 100, size))
+        stats = RunningStats()
+        stats.rebuild(values)
+        list_calls = max(1, min(calls, calls * 1000 // size))
+        with silenced():
+            results[f"list/{size}"] = measure(
+                lambda: [edge.calculate_sn_ratio(values) for _ in range(list_calls)], list_calls, repeats
+            )
+            results[f"running_stats/{size}"] = measure(
+                lambda: [edge.calculate_sn_ratio(stats) for _ in range(calls)], calls, repeats
+            )
+    edge.stop()
+    return results
+
+
+def bench_generators(samples, repeats):
+    """模擬器產生數據的速率（每秒樣本數）"""
+    random.seed(2)
+    broker = InMemoryBroker()
+    single = SensorSimulator("device001", transport=InMemoryTransport(broker))
+    multi = MultiSensorSimulator(transport=InMemoryTransport(broker))
+    generator = single.load_generator(100, seed=2)
+    with silenced():
+        return {
+            "SensorSimulator.generate_sensor_data": measure(
+                lambda: [single.generate_sensor_data() for _ in range(samples)], samples, repeats
+            ),
+            "MultiSensorSimulator.generate_signal_data": measure(
+                lambda: [multi.generate_signal_data() for _ in range(samples)], samples, repeats
+            ),
+            # 向量化產生 100 台設備的數據區塊，以每秒產生的設備採樣數計
+            "LoadGenerator.generate_block": measure(
+                lambda: generator.generate_block(samples // 100), samples, repeats
+            ),
+        }
+
+
+def bench_ui_ingest(messages, repeats):
+    """ui.MQTTManager._on_message 的接收速率（原始數據與 S/N 比交錯）"""
+    try:
+        import ui
+    except ImportError as e:
+        return {"skipped": f"無法載入 ui 模組: {e}"}
+    manager = ui.MQTTManager(transport=InMemoryTransport(InMemoryBroker()))
+    rng = np.random.default_rng(3)
+    stream = []
+    for value, sensor_type in zip(rng.uniform(1, 100, 4096), SENSOR_TYPES * 1024):
+        stream.append(InMemoryMessage(f"jetsion/taguchi/device001/{sensor_type}", f"{value:.2f}".encode()))
+        stream.append(InMemoryMessage(f"jetsion/taguchi/device001/sn_ratio/{sensor_type}", f"{value / 5:.2f}".encode()))
+
+    def run():
+        for i in range(messages):
+            manager._on_message(None, None, stream[i & 8191])
+
+    with silenced():
+        return {"MQTTManager._on_message": measure(run, messages, repeats)}
+
+
+def bench_downsample(points, repeats):
+    """趨勢圖降採樣的速率（每秒處理的原始點數）"""
+    rng = np.random.default_rng(4)
+    x = np.arange(points) / 100.0
+    y = np.sin(x / 5) + rng.normal(0, 0.1, points)
+    return {
+        f"{method}/{points}->{DEFAULT_MAX_POINTS}": measure(
+            lambda method=method: downsample(x, y, DEFAULT_MAX_POINTS, method), points, repeats
+        )
+        for method in ("lttb", "minmax")
+    }
+
+
+def bench_router(handler_counts, messages, repeats):
+    """TopicRouter 的分派速率：註冊的過濾器數量增加時，每則訊息的成本應維持不變
+
+    cached 為重複主題的一般情況（快取命中），trie 停用快取、每則訊息都走訪字典樹。
+    """
+    devices = [f"device{i:03d}" for i in range(16)]
+    topics = [f"jetsion/taguchi/{device}/{sensor}" for device in devices for sensor in SENSOR_TYPES]
+    topics += [f"jetsion/taguchi/{device}/control_factors/A/1" for device in devices]
+    topics += [f"jetsion/device001/taguchi/experiment_data/{run}/pressure" for run in range(16)]
+    stream = [topics[i % len(topics)] for i in range(8192)]
+    payload = b"1.0"
+
+    def handler(message):
+        return message.params
+
+    results = {}
+    for count in handler_counts:
+        for mode, cache_size in (("cached", 4096), ("trie", 0)):
+            router = TopicRouter(cache_size=cache_size)
+            router.add("jetsion/taguchi/{device}/control_factors/{factor}/{level}", handler)
+            router.add("jetsion/taguchi/{device}/{sensor}", handler)
+            router.add("jetsion/device001/taguchi/{category}/{key}/{sub_key}", handler)
+            router.add("jetsion/#", handler)
+            # 其餘過濾器與上面共用前綴並混合萬用字元，但不會符合測試的主題：
+            # 設備層的文字節點讓走訪先進入不符合的分支再退回 {device}，其餘分支增加每層的候選節點
+            for i in range(count - 4):
+                kind = i % 4
+                if kind == 0:
+                    router.add(f"jetsion/taguchi/{devices[i // 4 % len(devices)]}/x{i}", handler)
+                elif kind == 1:
+                    router.add(f"jetsion/taguchi/+/control_factors/x{i}/+", handler)
+                elif kind == 2:
+                    router.add(f"jetsion/taguchi/{{device}}/{{sensor}}/x{i}/#", handler)
+                else:
+                    router.add(f"jetsion/device001/+/x{i}/#", handler)
+
+            def run(router=router):
+                dispatch = router.dispatch
+                for i in range(messages):
+                    dispatch(stream[i & 8191], payload)
+
+            results[f"{mode}/{count}_handlers"] = measure(run, messages, repeats)
+    return results
+
+
+def bench_outlier_filter(window_sizes, samples, repeats):
+    """Hampel 濾波器每秒處理的樣本數（10% 為 0 的突波），成本只與視窗大小有關
+
+    視窗先以歷史數據填滿，量測的是每筆都需要移除最舊數據的穩定狀態；
+    大視窗時可看出排序 list 插入與移除的搬移成本（見 robust_filter.py）。
+    """
+    rng = np.random.default_rng(5)
+    values = rng.normal(50, 2, samples)
+    values[rng.random(samples) < 0.1] = 0
+    values = values.tolist()
+    results = {}
+    for window in window_sizes:
+        outlier_filter = HampelFilter(window)
+        outlier_filter.prime(rng.normal(50, 2, window))
+
+        def run(update=outlier_filter.update):
+            for value in values:
+                update(value)
+
+        results[f"window_{window}"] = measure(run, samples, repeats)
+    return results
+
+
+def bench_spc(stream_counts, samples, repeats):
+    """SPCMonitor 每秒更新的樣本數：stream 數量增加時每筆的成本應維持不變（已過基準期）"""
+    rng = np.random.default_rng(6)
+    values = rng.normal(50, 2, samples).tolist()
+    results = {}
+    for streams in stream_counts:
+        keys = [(f"device{i // 4:05d}", SENSOR_TYPES[i % 4]) for i in range(streams)]
+        monitor = SPCMonitor()
+        # 先讓每個 stream 完成基準期
+        for i in range(streams * monitor.config.baseline):
+            device_id, sensor_type = keys[i % streams]
+            monitor.update(device_id, sensor_type, values[i % samples])
+
+        def run(monitor=monitor, keys=keys):
+            update = monitor.update
+            count = len(keys)
+            for i, value in enumerate(values):
+                device_id, sensor_type = keys[i % count]
+                update(device_id, sensor_type, value)
+
+        results[f"{streams}_streams"] = measure(run, samples, repeats)
+    return results
+
+
+def bench_checkpoint(buffer_sizes, repeats):
+    """狀態快照的寫入與還原速率（每秒次數），各感測器視窗皆已填滿"""
+    rng = np.random.default_rng(7)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "edge.npz")
+        for size in buffer_sizes:
+            edge = make_edge(size)
+            shard = edge.shards["device001"]
+            now = time.time()
+            for sensor_type in SENSOR_TYPES:
+                shard.load_history(sensor_type, rng.uniform(1, 100, size), np.full(size, now))
+            restored = make_edge(size)
+
+            def save(edge=edge):
+                edge.save_checkpoint(path)
+
+            def restore(restored=restored):
+                checkpoint.restore(restored, *checkpoint.read(path))
+
+            results[f"save/{size}"] = measure(save, 1, repeats)
+            results[f"restore/{size}"] = measure(restore, 1, repeats)
+    return results
+
+
+BENCHMARKS = ("edge_on_message", "edge_pipeline", "sn_ratio", "generators", "ui_ingest", "downsample", "router", "outlier_filter", "spc",
+              "checkpoint")
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_suite(selected, quick):
+    scale = 0.1 if quick else 1.0
+    repeats = 3 if quick else 5
+    buffer_sizes = [10, 1000, 100000, 1000000]
+    results = {}
+    if "edge_on_message" in selected:
+        results["edge_on_message"] = bench_edge_on_message(buffer_sizes, int(20000 * scale), repeats)
+    if "edge_pipeline" in selected:
+        results["edge_pipeline"] = bench_edge_pipeline([1, 4], int(20000 * scale), repeats)
+    if "sn_ratio" in selected:
+        results["sn_ratio"] = bench_sn_ratio(buffer_sizes, int(20000 * scale), repeats)
+    if "generators" in selected:
+        results["generators"] = bench_generators(int(50000 * scale), repeats)
+    if "ui_ingest" in selected:
+        results["ui_ingest"] = bench_ui_ingest(int(20000 * scale), repeats)
+    if "downsample" in selected:
+        # 100 Hz 一小時的數據
+        results["downsample"] = bench_downsample(360000, repeats)
+    if "router" in selected:
+        results["router"] = bench_router([4, 64, 1024], int(100000 * scale), repeats)
+    if "outlier_filter" in selected:
+        results["outlier_filter"] = bench_outlier_filter([25, 101, 1001, 10001, 100001], int(50000 * scale), repeats)
+    if "spc" in selected:
+        results["spc"] = bench_spc([4, 400, 4000], int(100000 * scale), repeats)
+    if "checkpoint" in selected:
+        results["checkpoint"] = bench_checkpoint([1000, 100000], repeats)
+    return results
+
+
+def flatten(results):
+    """將結果展開為 {"群組/名稱": 每秒操作數}"""
+    flat = {}
+    for group, entries in results.items():
+        for name, entry in entries.items():
+            if isinstance(entry, dict) and "ops_per_s" in entry:
+                flat[f"{group}/{name}"] = entry["ops_per_s"]
+    return flat
+
+
+def compare(current, baseline, threshold):
+    """比較兩次結果，回傳退化超過 threshold（比例）的項目"""
+    regressions = []
+    base = flatten(baseline["results"])
+    for key, rate in flatten(current["results"]).items():
+        if key not in base:
+            continue
+        change = rate / base[key] - 1
+        marker = ""
+        if change < -threshold:
+            regressions.append(key)
+            marker = "  <-- 退化"
+        print(f"{key:<60} {base[key]:>14.0f} -> {rate:>14.0f} ({change:+.1%}){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="感測器 → 邊緣計算 → UI 數據路徑基準測試")
+    parser.add_argument("--output", help="結果 JSON 檔路徑")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.15, help="視為退化的速率下降比例")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="縮短執行時間（結果較不穩定）")
+    args = parser.parse_args()
+
+    report = {
+        "version": RESULT_VERSION,
+        "environment": environment(),
+        "quick": args.quick,
+        "results": run_suite(args.only, args.quick),
+    }
+    for key, rate in flatten(report["results"]).items():
+        print(f"{key:<60} {rate:>14.0f} ops/s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} 項效能退化超過 {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
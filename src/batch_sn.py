@@ -0,0 +1,253 @@
+"""離線批次計算歷史數據的 S/N 比
+
+以固定大小的區塊串流讀取 CSV 匯出檔或 TimeSeriesStore 儲存區，依設備、感測器、實驗次數與
+時間區間分組，以向量化運算累計各組的筆數、平均值、離均差平方和與 Σ1/y²（分組合併採用 Chan 等人的
+平行變異數公式），記憶體用量只與分組數量有關，與檔案大小無關。所有 S/N 特性都由這組累計量求得。多個檔案（或儲存區中的多個
+stream）可用 --workers 分配到多個程序處理。
+
+CSV 格式（需有標頭列）：
+    長格式：timestamp,device,sensor,value[,run]
+    寬格式：timestamp,device[,run],pressure,vibration,...（每個數值欄位視為一個感測器）
+timestamp 可為 Unix 秒數或 ISO 8601 字串。
+
+用法：
+    python src/batch_sn.py exports/*.csv --group device sensor run --output sn.csv
+    python src/batch_sn.py data/history --bucket 3600 --workers 4
+    python src/batch_sn.py data/history --sn-type stb --all-sn
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sn_ratio import DEFAULT_SN_TYPE, DEFAULT_SN_TYPES, SN_TYPES, sn_ratios
+from timeseries_store import INDEX_FILE, TimeSeriesStore
+
+# 可用的分組欄位；bucket 為時間區間的起點（需指定 --bucket 秒數）
+GROUP_KEYS = ("device", "sensor", "run", "bucket")
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# 累計的部分結果超過此數量時先合併一次，限制記憶體用量
+MERGE_EVERY = 16
+
+
+def chunk_moments(frame, keys):
+    """計算一個區塊內各分組的 (count, mean, m2, inv_square, zeros)
+
+    m2 為離均差平方和，inv_square 為 Σ1/y²（不含 0），zeros 為數值為 0 的筆數。
+    """
+    grouped = frame.groupby(keys, sort=False, observed=True)["value"]
+    deviation = frame["value"] - grouped.transform("mean")
+    value = frame["value"].to_numpy(dtype=np.float64)
+    nonzero = value != 0
+    inv_square = np.zeros_like(value)
+    inv_square[nonzero] = 1.0 / (value[nonzero] * value[nonzero])
+    frame = frame.assign(m2=deviation * deviation, inv_square=inv_square, zeros=~nonzero)
+    return frame.groupby(keys, sort=False, observed=True).agg(
+        count=("value", "size"), mean=("value", "mean"), m2=("m2", "sum"),
+        inv_square=("inv_square", "sum"), zeros=("zeros", "sum")
+    ).reset_index()
+
+
+def merge_moments(parts, keys):
+    """合併多個部分結果：n = Σn_i，μ = Σn_i·μ_i / n，M2 = Σ(M2_i + n_i·(μ_i - μ)²)，Σ1/y² 與 0 的筆數直接相加"""
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return pd.DataFrame(columns=list(keys) + ["count", "mean", "m2", "inv_square", "zeros"])
+    if len(parts) == 1:
+        return parts[0]
+    frame = pd.concat(parts, ignore_index=True)
+    frame["weighted"] = frame["count"] * frame["mean"]
+    grouped = frame.groupby(keys, sort=False, observed=True)
+    mean = grouped["weighted"].transform("sum") / grouped["count"].transform("sum")
+    frame["m2"] += frame["count"] * (frame["mean"] - mean) ** 2
+    merged = frame.groupby(keys, sort=False, observed=True).agg(
+        count=("count", "sum"), weighted=("weighted", "sum"), m2=("m2", "sum"),
+        inv_square=("inv_square", "sum"), zeros=("zeros", "sum")
+    ).reset_index()
+    merged["mean"] = merged["weighted"] / merged["count"]
+    return merged.drop(columns="weighted")
+
+
+class MomentAccumulator:
+    """逐區塊累計分組統計量，定期合併以限制記憶體用量"""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.parts = []
+        self.rows = 0
+
+    def add_frame(self, frame):
+        """加入一個含 value 與分組欄位的 DataFrame 區塊"""
+        if not len(frame):
+            return
+        self.rows += len(frame)
+        self.add_moments(chunk_moments(frame, self.keys))
+
+    def add_moments(self, moments):
+        self.parts.append(moments)
+        if len(self.parts) >= MERGE_EVERY:
+            self.parts = [merge_moments(self.parts, self.keys)]
+
+    def result(self):
+        return merge_moments(self.parts, self.keys)
+
+
+# ---- 讀取 ----
+def _epoch_seconds(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(np.float64)
+    return pd.to_datetime(column, utc=True).astype("int64") / 1e9
+
+
+def _prepare(frame, options):
+    """補上分組欄位（時間區間），並移除無法解析的數值"""
+    frame = frame.dropna(subset=["value"])
+    if "bucket" in options.group:
+        timestamps = _epoch_seconds(frame["timestamp"])
+        frame = frame.assign(bucket=np.floor(timestamps / options.bucket) * options.bucket)
+    return frame
+
+
+def read_csv_chunks(path, options):
+    """以固定筆數的區塊讀取 CSV，寬格式會轉為長格式"""
+    for chunk in pd.read_csv(path, chunksize=options.chunk_size):
+        if "device" not in chunk.columns:
+            chunk["device"] = options.device
+        if "sensor" not in chunk.columns:
+            id_columns = [column for column in ("timestamp", "device", "run") if column in chunk.columns]
+            chunk = chunk.melt(id_vars=id_columns, var_name="sensor", value_name="value")
+        chunk["value"] = pd.to_numeric(chunk["value"], errors="coerce")
+        if "run" in options.group and "run" not in chunk.columns:
+            raise ValueError(f"{path} 沒有 run 欄位，無法依實驗次數分組")
+        yield _prepare(chunk, options)
+
+
+def read_store_chunks(root, device_id, sensor, options):
+    """以 TimeSeriesStore 的分段（memmap）為單位讀取單一 stream"""
+    if "run" in options.group:
+        raise ValueError("TimeSeriesStore 沒有實驗次數欄位，無法依 run 分組")
+    store = TimeSeriesStore(root)
+    stream = store.stream(device_id, sensor)
+    for records in stream.iter_chunks(options.start, options.end):
+        for offset in range(0, len(records), options.chunk_size):
+            part = records[offset:offset + options.chunk_size]
+            yield _prepare(pd.DataFrame({
+                "timestamp": part["ts"],
+                "value": part["value"],
+                "device": device_id,
+                "sensor": sensor,
+            }), options)
+    store.close()
+
+
+def discover_tasks(paths, include_sn=False):
+    """展開輸入路徑：CSV 檔各為一個工作，TimeSeriesStore 目錄中的每個 stream 各為一個工作"""
+    tasks = []
+    for path in paths:
+        if os.path.isdir(path):
+            is_store = any(INDEX_FILE in files for _, _, files in os.walk(path))
+            if not is_store:
+                raise ValueError(f"{path} 不是 TimeSeriesStore 目錄")
+            for device_id, sensor in TimeSeriesStore(path).streams():
+                if include_sn or not sensor.startswith("sn_ratio/"):
+                    tasks.append(("store", path, device_id, sensor))
+        else:
+            tasks.append(("csv", path))
+    return tasks
+
+
+def process_task(task, options):
+    """處理單一工作，回傳部分統計量（可在子程序中執行）"""
+    accumulator = MomentAccumulator(options.group)
+    if task[0] == "csv":
+        chunks = read_csv_chunks(task[1], options)
+    else:
+        chunks = read_store_chunks(task[1], task[2], task[3], options)
+    for frame in chunks:
+        accumulator.add_frame(frame)
+    return accumulator.result(), accumulator.rows
+
+
+def compute(tasks, options):
+    """處理所有工作並合併結果，回傳 (DataFrame, 處理筆數)"""
+    accumulator = MomentAccumulator(options.group)
+    rows = 0
+    if options.workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=options.workers) as executor:
+            for moments, count in executor.map(process_task, tasks, [options] * len(tasks)):
+                accumulator.add_moments(moments)
+                rows += count
+    else:
+        for task in tasks:
+            moments, count = process_task(task, options)
+            accumulator.add_moments(moments)
+            rows += count
+    result = accumulator.result()
+    variance = np.where(result["count"] > 0, result["m2"].clip(lower=0) / result["count"].clip(lower=1), 0.0)
+    result["std"] = np.sqrt(variance)
+    inv_square_mean = result["inv_square"] / result["count"].clip(lower=1)
+    if options.sn_type != "auto":
+        sn_type = options.sn_type
+    elif "sensor" in result.columns:
+        # 依感測器的預設特性；儲存區中的 sn_ratio/ stream 取最後一段名稱
+        sensors = result["sensor"].astype(str).str.rsplit("/", n=1).str[-1]
+        sn_type = sensors.map(lambda sensor: DEFAULT_SN_TYPES.get(sensor, DEFAULT_SN_TYPE)).to_numpy()
+    else:
+        sn_type = DEFAULT_SN_TYPE
+    result["sn_type"] = sn_type
+    result["sn_ratio"] = sn_ratios(result["count"], result["mean"], variance, inv_square_mean, result["zeros"], sn_type)
+    if options.all_sn:
+        for name in SN_TYPES:
+            result[f"sn_{name}"] = sn_ratios(result["count"], result["mean"], variance, inv_square_mean,
+                                             result["zeros"], name)
+    result = result.drop(columns=["m2", "inv_square", "zeros"]).sort_values(options.group, ignore_index=True)
+    return result, rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="離線批次計算歷史數據的 S/N 比")
+    parser.add_argument("inputs", nargs="+", help="CSV 檔或 TimeSeriesStore 目錄")
+    parser.add_argument("--group", nargs="+", choices=GROUP_KEYS, default=["device", "sensor"],
+                        help="分組欄位（預設 device sensor）")
+    parser.add_argument("--bucket", type=float, help="時間區間長度（秒），指定時自動加入 bucket 分組")
+    parser.add_argument("--start", type=float, help="只處理此時間戳之後的數據（TimeSeriesStore）")
+    parser.add_argument("--end", type=float, help="只處理此時間戳之前的數據（TimeSeriesStore）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每個區塊的筆數")
+    parser.add_argument("--workers", type=int, default=1, help="平行處理的程序數")
+    parser.add_argument("--device", default="device001", help="CSV 沒有 device 欄位時使用的設備 ID")
+    parser.add_argument("--include-sn", action="store_true", help="一併處理儲存區中的 sn_ratio/ stream")
+    parser.add_argument("--sn-type", choices=("auto",) + SN_TYPES, default="auto",
+                        help="S/N 特性，auto 為依感測器的預設特性（振動為 stb，其餘為 ntb2）")
+    parser.add_argument("--all-sn", action="store_true", help="另外輸出所有特性的 S/N 比（sn_stb、sn_ltb ...）")
+    parser.add_argument("--output", help="輸出 CSV 路徑（預設輸出到 stdout）")
+    options = parser.parse_args(argv)
+    if options.bucket is not None:
+        if options.bucket <= 0:
+            parser.error("--bucket 必須大於 0")
+        if "bucket" not in options.group:
+            options.group.append("bucket")
+    elif "bucket" in options.group:
+        parser.error("依 bucket 分組時必須指定 --bucket")
+    options.group = list(dict.fromkeys(options.group))
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    tasks = discover_tasks(options.inputs, options.include_sn)
+    result, rows = compute(tasks, options)
+    if options.output:
+        result.to_csv(options.output, index=False)
+        print(f"已處理 {rows} 筆數據、{len(result)} 個分組，結果寫入 {options.output}", file=sys.stderr)
+    else:
+        result.to_csv(sys.stdout, index=False)
+    return 0 if rows else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import copy
+import io
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 邊緣計算層的狀態快照
+#
+# 保存重新啟動後繼續計算 S/N 比所需的全部狀態：各設備各感測器的滑動視窗（數值與時間戳）、
+# 離群值濾波器的參考視窗與計數、控制因子設定、taguchi_data、製程管制圖的管制界限，以及執行中實驗的進度
+# （含實驗設計、直交表配置與各因子的水準設定值，繼續實驗前以此確認設計沒有改變）。
+# 檔案為未壓縮的 .npz：滑動視窗以 float64 陣列原樣保存，其餘狀態為一段 JSON（存成 uint8 陣列），
+# 載入時不需逐筆解析。寫入時先寫到暫存檔並 fsync，再以 os.replace 取代舊檔，
+# 程序在寫入途中結束時舊的快照仍然完整。
+#
+# 快照由背景執行緒擷取：每個設備在持有分片的鎖（DeviceShard.lock，worker 更新狀態時同樣持有）時
+# 一次讀取視窗、離群值濾波器、控制因子與該設備的管制圖，taguchi_data 則在持有 taguchi_lock 時複製，
+# 因此同一設備的所有狀態屬於同一時間點。還原時 S/N 比的累計量與平滑視窗由還原後的視窗重新建立。
+
+CHECKPOINT_VERSION = 1
+
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+
+_META = "meta"
+
+
+def _encode_plan(plan):
+    """直交表配置轉為 JSON 格式（交互作用的鍵為因子組合，改存成清單）"""
+    if plan is None:
+        return None
+    return {
+        "array": plan["array"],
+        "columns": dict(plan["columns"]),
+        "interactions": [[a, b, list(columns)] for (a, b), columns in plan["interactions"].items()],
+    }
+
+
+def _decode_plan(plan):
+    if plan is None:
+        return None
+    return {
+        "array": plan["array"],
+        "columns": dict(plan["columns"]),
+        "interactions": {(a, b): columns for a, b, columns in plan["interactions"]},
+    }
+
+
+def capture(edge):
+    """擷取 EdgeComputing 的狀態，回傳 (JSON 狀態, {名稱: 陣列})"""
+    arrays = {}
+    devices = {}
+    spc_states = []
+    for device_id, shard in list(edge.shards.items()):
+        sensors = {}
+        with shard.lock:
+            for sensor_type, buffer in shard.data_buffer.items():
+                # 陣列名稱只用流水號，設備與感測器名稱記在 JSON 中
+                key = f"s{len(arrays) // 3}"
+                values, timestamps = buffer.snapshot()
+                arrays[f"{key}_values"] = values
+                arrays[f"{key}_timestamps"] = timestamps
+                sensor = {"array": key}
+                outlier_filter = shard.outlier_filter[sensor_type]
+                if outlier_filter is not None:
+                    sensor["outliers"] = outlier_filter.outliers
+                    sensor["samples"] = outlier_filter.samples
+                    arrays[f"{key}_outlier_window"] = np.asarray(outlier_filter.window.values(), dtype=np.float64)
+                else:
+                    arrays[f"{key}_outlier_window"] = np.empty(0, dtype=np.float64)
+                sensors[sensor_type] = sensor
+            control_factors = copy.deepcopy(shard.control_factors)
+            if edge.spc is not None:
+                spc_states.extend(edge.spc.states(device_id))
+        devices[device_id] = {"control_factors": control_factors, "sensors": sensors}
+    with edge.taguchi_lock:
+        taguchi_data = copy.deepcopy(edge.taguchi_data)
+
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "saved_at": time.time(),
+        "device_id": edge.device_id,
+        "devices": devices,
+        "taguchi_data": taguchi_data,
+        "spc": spc_states,
+        "experiment": None,
+    }
+    runner = edge.experiment_runner
+    if runner is not None and runner.phase in ("settle", "dwell"):
+        control_factors = devices.get(runner.device_id, {}).get("control_factors", {})
+        factors = runner.design[0] if runner.design else {}
+        state["experiment"] = {
+            "device_id": runner.device_id,
+            "settle": runner.settle,
+            "dwell": runner.dwell,
+            "run": runner.current_run,
+            "results": list(runner.results),
+            "design": [dict(row) for row in runner.design],
+            "plan": _encode_plan(runner.plan),
+            "levels": {factor: dict(control_factors.get(factor, {}).get("levels", {})) for factor in factors},
+        }
+    return state, arrays
+
+
+def write(path, state, arrays):
+    """以原子方式寫入快照（暫存檔 + fsync + os.replace），回傳寫入的 bytes 數"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    buffer = io.BytesIO()
+    meta = np.frombuffer(json.dumps(state, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+    np.savez(buffer, **{_META: meta}, **arrays)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getbuffer())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return buffer.tell()
+
+
+def read(path):
+    """讀取快照，回傳 (JSON 狀態, {名稱: 陣列})；檔案不存在時回傳 None"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    state = json.loads(arrays.pop(_META).tobytes().decode("utf-8"))
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"不支援的快照版本: {state.get('version')}")
+    return state, arrays
+
+
+def restore(edge, state, arrays):
+    """將快照還原到 EdgeComputing，回傳還原的 stream 數量
+
+    執行中的實驗只還原進度（edge.pending_experiment），由 EdgeComputing 連線後繼續。
+    """
+    streams = 0
+    for device_id, device in state["devices"].items():
+        if not edge.multi_device and device_id != edge.device_id:
+            continue
+        shard = edge.get_shard(device_id)
+        shard.control_factors = device["control_factors"]
+        for sensor_type, sensor in device["sensors"].items():
+            if sensor_type not in shard.data_buffer:
+                continue
+            key = sensor["array"]
+            shard.data_buffer[sensor_type].clear()
+            shard.load_history(sensor_type, arrays[f"{key}_values"], arrays[f"{key}_timestamps"])
+            outlier_filter = shard.outlier_filter[sensor_type]
+            if outlier_filter is not None and "samples" in sensor:
+                outlier_filter.reset()
+                outlier_filter.prime(arrays[f"{key}_outlier_window"])
+                outlier_filter.samples = sensor["samples"]
+                outlier_filter.outliers = sensor["outliers"]
+            streams += 1
+    for category, data in state["taguchi_data"].items():
+        edge.taguchi_data.setdefault(category, {}).update(data)
+    if edge.spc is not None:
+        edge.spc.restore(state["spc"])
+    experiment = state["experiment"]
+    if experiment is not None and experiment.get("plan") is not None:
+        experiment = dict(experiment, plan=_decode_plan(experiment["plan"]))
+    edge.pending_experiment = experiment
+    return streams
@@ -0,0 +1,90 @@
+import copy
+import threading
+
+from streaming_stats import RunningStats, MovingAverage
+from ring_buffer import RingBuffer
+from robust_filter import DEFAULT_OUTLIER_THRESHOLD, DEFAULT_OUTLIER_WINDOW, HampelFilter
+
+# 每個感測器滑動視窗的預設筆數
+DEFAULT_WINDOW_SIZE = 1000
+
+
+def sensor_option(option, sensor_type, default=None):
+    """取得單一感測器的設定值（支援單一數值或依感測器設定的字典）"""
+    if isinstance(option, dict):
+        return option.get(sensor_type, default)
+    return option
+
+
+class DeviceShard:
+    """單一設備的邊緣計算狀態
+
+    包含各感測器的離群值濾波器、滑動視窗緩衝區、平滑視窗、S/N 比統計量與控制因子設定，
+    由 EdgeComputing 在收到該設備的第一筆訊息時建立。
+    更新上述狀態時須持有 lock：同一設備的數據由同一個 worker 依序處理，這把鎖平時不會有競爭，
+    只讓狀態快照（checkpoint.capture）取得同一時間點的所有狀態。
+    """
+
+    __slots__ = ("device_id", "outlier_filter", "data_buffer", "smoothing_window", "sn_stats", "control_factors",
+                 "lock")
+
+    def __init__(self, device_id, sensor_types, window_size=DEFAULT_WINDOW_SIZE, window_seconds=None,
+                 control_factors=None, outlier_window=DEFAULT_OUTLIER_WINDOW,
+                 outlier_threshold=DEFAULT_OUTLIER_THRESHOLD):
+        self.device_id = device_id
+        # Hampel 濾波器，outlier_window 為 0 或 None 的感測器不過濾
+        self.outlier_filter = {}
+        for sensor_type in sensor_types:
+            window = sensor_option(outlier_window, sensor_type, DEFAULT_OUTLIER_WINDOW)
+            threshold = sensor_option(outlier_threshold, sensor_type, DEFAULT_OUTLIER_THRESHOLD)
+            self.outlier_filter[sensor_type] = HampelFilter(window, threshold) if window else None
+        # 固定容量的環形緩衝區，記憶體用量不隨運行時間增加
+        self.data_buffer = {
+            sensor_type: RingBuffer(
+                sensor_option(window_size, sensor_type, DEFAULT_WINDOW_SIZE),
+                max_age=sensor_option(window_seconds, sensor_type)
+            )
+            for sensor_type in sensor_types
+        }
+        # 增量統計：平滑視窗與 S/N 比的累計矩，每筆數據 O(1) 更新
+        self.smoothing_window = {sensor_type: MovingAverage(3) for sensor_type in sensor_types}
+        self.sn_stats = {sensor_type: RunningStats() for sensor_type in sensor_types}
+        self.control_factors = copy.deepcopy(control_factors) if control_factors else {}
+        self.lock = threading.RLock()
+
+    def update_window(self, sensor_type, value, timestamp):
+        """將新數據放入滑動視窗，並從統計量移出過期的數據"""
+        buffer = self.data_buffer[sensor_type]
+        stats = self.sn_stats[sensor_type]
+        for old_value in buffer.append(value, timestamp):
+            stats.remove(old_value)
+        # 每移出一整個視窗的數據後重新計算一次，避免浮點誤差累積
+        if stats.removals >= buffer.capacity:
+            stats.rebuild(buffer.values()[:-1])
+        self.smoothing_window[sensor_type].push(value)
+
+    def load_history(self, sensor_type, values, timestamps):
+        """批次載入已清洗的歷史數據，並重建視窗統計量與平滑視窗"""
+        buffer = self.data_buffer[sensor_type]
+        buffer.extend(values, timestamps)
+        window_values = buffer.values()
+        self.sn_stats[sensor_type].rebuild(window_values)
+        smoothing = self.smoothing_window[sensor_type]
+        smoothing.reset()
+        for value in window_values[-smoothing.window_size:]:
+            smoothing.push(float(value))
+        outlier_filter = self.outlier_filter[sensor_type]
+        if outlier_filter is not None:
+            outlier_filter.prime(window_values)
+
+    def outlier_stats(self):
+        """回傳各感測器離群值濾波器的 {"samples", "outliers", "ratio"}"""
+        return {
+            sensor_type: outlier_filter.stats()
+            for sensor_type, outlier_filter in self.outlier_filter.items()
+            if outlier_filter is not None
+        }
+
+    def buffer_memory(self):
+        """回傳各感測器緩衝區佔用的記憶體（bytes）"""
+        return {sensor_type: buffer.nbytes for sensor_type, buffer in self.data_buffer.items()}
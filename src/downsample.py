@@ -0,0 +1,88 @@
+import numpy as np
+
+# 降採樣
+#
+# 趨勢圖的點數超過畫面像素時，多出來的點不會讓圖更清楚，只會增加傳給瀏覽器的數據量與繪圖時間。
+# 兩種方法都只挑選原始數據中的點（不做平均），保留峰值與轉折：
+#   lttb   ：Largest-Triangle-Three-Buckets，每個區間挑與前後點形成最大三角形面積的點，線條形狀最接近原圖
+#   minmax ：每個區間保留最小值與最大值，保證不漏掉任何極值，適合找突波
+
+METHODS = ("lttb", "minmax")
+
+# 趨勢圖預設最多的點數，約為寬版版面中半欄圖表的像素寬度
+DEFAULT_MAX_POINTS = 800
+
+
+def _bucket_edges(start, stop, buckets):
+    """將 [start, stop) 等分為 buckets 個區間，回傳 buckets + 1 個邊界索引"""
+    return np.linspace(start, stop, buckets + 1).astype(np.int64)
+
+
+def _endpoints(n, threshold):
+    """threshold 小於演算法所需的最少點數時，只保留第一筆與最後一筆（threshold 為 1 時只有第一筆）"""
+    if threshold < 1:
+        raise ValueError("threshold 必須大於 0")
+    return np.array([0, n - 1][:threshold], dtype=np.int64)
+
+
+def lttb_indices(x, y, threshold):
+    """回傳 LTTB 挑選的索引（遞增，最多 threshold 個），包含第一筆與最後一筆"""
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return _endpoints(n, threshold)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 頭尾各保留一點，中間 n - 2 筆分成 threshold - 2 個區間
+    edges = _bucket_edges(1, n - 1, threshold - 2)
+    counts = np.diff(edges)
+    # 各區間的平均點，作為三角形的第三個頂點；最後一個區間的下一點為最後一筆
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        area = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """回傳每個區間最小值與最大值的索引（遞增、不重複，最多 threshold 個），包含第一筆與最後一筆"""
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 4:
+        return _endpoints(n, threshold)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = (threshold - 2) // 2
+    edges = _bucket_edges(1, n - 1, buckets)
+    # 各區間長度最多差 1，補成 (區間, 最大長度) 的二維陣列後整批取 argmin / argmax
+    width = int(np.diff(edges).max())
+    # 較短的區間以該區間最後一筆補齊
+    index = np.minimum(edges[:-1, None] + np.arange(width), edges[1:, None] - 1)
+    values = y[index]
+    lows = index[np.arange(buckets), np.argmin(values, axis=1)]
+    highs = index[np.arange(buckets), np.argmax(values, axis=1)]
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample(x, y, threshold=DEFAULT_MAX_POINTS, method="lttb"):
+    """將 (x, y) 降採樣為最多 threshold 點，回傳挑選後的 (x, y)；點數未超過時原樣回傳"""
+    if len(y) <= threshold:
+        return x, y
+    if method == "lttb":
+        indices = lttb_indices(x, y, threshold)
+    elif method == "minmax":
+        indices = minmax_indices(y, threshold)
+    else:
+        raise ValueError(f"不支援的降採樣方法: {method}")
+    return x[indices], y[indices]
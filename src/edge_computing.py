@@ -1,40 +1,214 @@
-import paho.mqtt.client as mqtt
 import numpy as np
 from datetime import datetime
+import json
+import logging
+import threading
 import time
 import random
 
+from streaming_stats import RunningStats
+from payload_codec import FRAME_TOPIC, decode_traced_payload, encode_frame
+from device_shard import DEFAULT_WINDOW_SIZE, DeviceShard, sensor_option
+from robust_filter import DEFAULT_OUTLIER_THRESHOLD, DEFAULT_OUTLIER_WINDOW
+from spc import SPCMonitor
+import checkpoint
+from sn_ratio import DEFAULT_SN_TYPE, DEFAULT_SN_TYPES, SN_TYPES, check_sn_type, sn_from_moments, sn_quality
+from worker_pool import PartitionedWorkerPool
+from edge_metrics import EdgeMetrics
+from tracing import TraceStats, trace_clock
+from transport import PahoTransport
+from timeseries_store import DEFAULT_FLUSH_INTERVAL, TimeSeriesStore
+from output_policy import OutputPolicy
+from topic_router import RoutedMessage, TopicRouter
+from experiment_runner import DEFAULT_DWELL, DEFAULT_SETTLE, EXPERIMENT_TOPIC, ExperimentRunner
+import taguchi_analysis
+import orthogonal_arrays
+
+logger = logging.getLogger(__name__)
+
+SENSOR_TYPES = ["pressure", "vibration", "rpm", "current"]
+
+# 同一設備、感測器與管制圖的製程管制警報每隔多少秒最多記錄一則 WARNING（警報本身每次都發布）
+ALARM_LOG_INTERVAL = 60.0
+
+# 控制因子定義（每個設備分片各自保有一份，可個別更新）
+DEFAULT_CONTROL_FACTORS = {
+    "A": {
+        "name": "壓力",
+        "unit": "bar",
+        "levels": {
+            "1": 25,
+            "2": 30,
+            "3": 35
+        }
+    },
+    "B": {
+        "name": "轉速",
+        "unit": "RPM",
+        "levels": {
+            "1": 1000,
+            "2": 2000,
+            "3": 3000
+        }
+    },
+    "C": {
+        "name": "電流",
+        "unit": "A",
+        "levels": {
+            "1": 5,
+            "2": 10,
+            "3": 15
+        }
+    }
+}
+
 class EdgeComputing:
-    def __init__(self, device_id):
+    def __init__(self, device_id, window_size=DEFAULT_WINDOW_SIZE, window_seconds=None, frame_format=None,
+                 multi_device=False, transport=None, workers=2, queue_size=10000, overflow="block",
+                 metrics_interval=10, store=None, sn_types=None, sn_output=None,
+                 outlier_window=DEFAULT_OUTLIER_WINDOW, outlier_threshold=DEFAULT_OUTLIER_THRESHOLD, spc=None,
+                 checkpoint_path=None, checkpoint_interval=checkpoint.DEFAULT_CHECKPOINT_INTERVAL,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """window_size / window_seconds 可為單一數值或 {感測器: 數值} 的字典，
+        S/N 比只針對最近 window_size 筆或最近 window_seconds 秒的數據計算；
+        frame_format 設為 "binary" 或 "json" 時，所有感測器數據合併成單一訊框發布；
+        multi_device 為 True 時以萬用字元訂閱 jetsion/taguchi/+/...，同時服務所有設備；
+        transport 為 MQTT 傳輸層（見 transport.py），預設連線到 jetsion.com，
+        可改用 InMemoryTransport 在單一程序內離線執行；
+        workers 為處理訊息的 worker 執行緒數量，MQTT 網路執行緒只負責把訊息排入佇列，
+        同一設備的訊息固定由同一個 worker 依序處理；workers=0 時直接在網路執行緒處理；
+        queue_size / overflow 為每個 worker 佇列的容量與溢位政策（block、drop_oldest、drop_newest）；
+        metrics_interval 為發布 edge_metrics 的週期（秒），None 或 0 表示不發布；
+        store 為 TimeSeriesStore 或其目錄路徑，設定時會記錄所有原始數據與 S/N 比歷史；
+        sn_types 為 S/N 特性（stb、ltb、ntb1、ntb2），可為單一特性或 {感測器: 特性} 的字典，
+        未指定的感測器使用 sn_ratio.DEFAULT_SN_TYPES（振動為望小，其餘為望目 II）；
+        sn_output 為 S/N 比的發布政策（OutputPolicy：固定週期、死區、心跳與合併發布），
+        預設每個新的 S/N 比都立即發布；不論政策為何，store 都會記錄每一個 S/N 比；
+        outlier_window / outlier_threshold 為 Hampel 離群值濾波器的視窗筆數與門檻（σ 倍數，見 robust_filter.py），
+        可為單一數值或 {感測器: 數值}，視窗為 0 或 None 時不過濾；離群值以中位數取代後才進入 S/N 比視窗；
+        spc 為製程管制圖（SPCMonitor，見 spc.py），預設不做製程管制，True 表示以預設參數建立，
+        警報發布到 jetsion/taguchi/{device}/alarms/{感測器}，日誌依 ALARM_LOG_INTERVAL 彙總；
+        checkpoint_path 為狀態快照的檔案路徑（見 checkpoint.py），設定時啟動時先還原最新的快照，
+        之後每 checkpoint_interval 秒在背景寫入一次，stop() 時再寫入一次；
+        flush_interval 為 store 寫回磁碟與更新索引的週期（秒），None 或 0 表示只在 stop() 時寫回"""
         self.device_id = device_id
-        # 使用唯一的 client ID
-        self.client = mqtt.Client(client_id=f"taguchi_edge_{int(time.time())}")
-        self.client.username_pw_set("jetsion", "jetsion")
+        self.frame_format = frame_format
+        self.multi_device = multi_device
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.outlier_window = outlier_window
+        self.outlier_threshold = outlier_threshold
+        self.spc = SPCMonitor() if spc is True else (spc or None)
+        # {(設備, 感測器, 管制圖): [上次記錄的時間, 之後略過的警報數]}，同一 stream 只由同一個 worker 更新
+        self.alarm_log_interval = ALARM_LOG_INTERVAL
+        self._alarm_log = {}
+        self.sn_types = sn_types
+        for sensor_type in SENSOR_TYPES:
+            check_sn_type(self.sn_type(sensor_type))
+        
+        # 原始數據與 S/N 比的磁碟儲存區
+        if isinstance(store, str):
+            store = TimeSeriesStore(store)
+        self.store = store
+        self.flush_interval = flush_interval
+        self._flush_thread = None
+        
+        # 各設備的狀態分片，收到該設備的第一筆訊息時建立
+        self.shards = {}
+        self.get_shard(device_id)
+        
+        # 實驗設計：依控制因子的水準數自動選擇直交表（3 個三水準因子為 L9）
+        self.experiment_plan = None
+        self.experiment_design = []
+        self.plan_experiment()
+        # 執行中的實驗（見 run_experiment）
+        self.experiment_runner = None
+        # 從快照還原、連線後要繼續的實驗進度
+        self.pending_experiment = None
+        
+        # 田口法相關數據，由 taguchi_data 分區的 worker 更新，更新與快照時持有 taguchi_lock
+        self.taguchi_lock = threading.Lock()
+        self.taguchi_data = {
+            "control_factors": {},
+            "experiment_design": {},
+            "experiment_data": {},
+            "sn_ratio": {},
+            "experiment_results": {},
+            "experiment_status": {},
+            "control": {}
+        }
+        
+        # 計數器與各階段延遲統計
+        self.metrics = EdgeMetrics()
+        # 附帶追蹤資訊的輸入：感測器到邊緣的延遲與各主題的遺失/亂序
+        self.trace_stats = TraceStats(("sensor_edge",))
+        self.metrics_interval = metrics_interval
+        self._stop_event = threading.Event()
+        self._metrics_thread = None
+        self.sn_output = sn_output or OutputPolicy()
+        self._sn_output_thread = None
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_thread = None
+        
+        # 從快照還原狀態（在 worker 開始處理訊息之前）
+        if checkpoint_path is not None:
+            self.restore_checkpoint()
+        
+        # 主題路由：依主題過濾器分派訊息
+        self.router = self.build_router()
+        
+        # 訊息處理 worker
+        self.worker_pool = None
+        if workers:
+            self.worker_pool = PartitionedWorkerPool(
+                self.handle_message, workers=workers, queue_size=queue_size, overflow=overflow
+            )
+            self.worker_pool.start()
         
         # 連接狀態追蹤
         self.connected = False
         
+        # 使用唯一的 client ID
+        if transport is None:
+            transport = PahoTransport("jetsion.com", client_id=f"taguchi_edge_{int(time.time())}")
+        self.client = transport
+        
         # 設定MQTT回調函數
         self.client.on_message = self.on_message
         self.client.on_connect = self.on_connect
         
         # 連接到 MQTT broker
         try:
-            print("正在連接到 MQTT broker...")
-            self.client.connect("jetsion.com", 1883, 60)
-            print("MQTT 連接請求已發送")
+            logger.info("正在連接到 MQTT broker...")
+            self.client.connect()
+            logger.info("MQTT 連接請求已發送")
         except Exception as e:
-            print(f"MQTT 連接失敗: {str(e)}")
+            logger.error("MQTT 連接失敗: %s", e)
             return
             
         # 啟動 MQTT 客戶端
         self.client.loop_start()
         
+        self.subscribe_topics()
+        self.start_metrics_publisher()
+        self.start_sn_output()
+        self.start_checkpointer()
+        self.start_store_flusher()
+        self.resume_experiment()
+        
+    @property
+    def device_filter(self):
+        """感測器主題中的設備欄位，多設備模式為萬用字元"""
+        return "+" if self.multi_device else self.device_id
+        
+    def subscribe_topics(self):
+        """訂閱感測器、控制因子與田口法相關主題"""
         # 訂閱感測器主題
-        self.client.subscribe(f"jetsion/taguchi/{device_id}/#")
+        self.client.subscribe(f"jetsion/taguchi/{self.device_filter}/#")
         
         # 訂閱控制因子主題
-        self.client.subscribe(f"jetsion/taguchi/{device_id}/control_factors/#")
+        self.client.subscribe(f"jetsion/taguchi/{self.device_filter}/control_factors/#")
         
         # 訂閱田口法相關主題
         self.client.subscribe(f"jetsion/device001/taguchi/control_factors/#")
@@ -45,198 +219,621 @@ class EdgeComputing:
         self.client.subscribe(f"jetsion/device001/taguchi/experiment_status/#")
         self.client.subscribe(f"jetsion/device001/taguchi/control/#")
         
-        # 控制因子定義
-        self.control_factors = {
-            "A": {
-                "name": "壓力",
-                "unit": "bar",
-                "levels": {
-                    "1": 25,
-                    "2": 30,
-                    "3": 35
-                }
-            },
-            "B": {
-                "name": "轉速",
-                "unit": "RPM",
-                "levels": {
-                    "1": 1000,
-                    "2": 2000,
-                    "3": 3000
-                }
-            },
-            "C": {
-                "name": "電流",
-                "unit": "A",
-                "levels": {
-                    "1": 5,
-                    "2": 10,
-                    "3": 15
-                }
-            }
-        }
+    def get_shard(self, device_id):
+        """取得設備的狀態分片，不存在時建立"""
+        shard = self.shards.get(device_id)
+        if shard is None:
+            shard = DeviceShard(
+                device_id,
+                SENSOR_TYPES,
+                self.window_size,
+                self.window_seconds,
+                DEFAULT_CONTROL_FACTORS,
+                self.outlier_window,
+                self.outlier_threshold
+            )
+            self.shards[device_id] = shard
+        return shard
         
-        # 實驗設計
-        self.experiment_design = [
-            {"A": 1, "B": 1, "C": 1},
-            {"A": 1, "B": 2, "C": 2},
-            {"A": 1, "B": 3, "C": 3},
-            {"A": 2, "B": 1, "C": 2},
-            {"A": 2, "B": 2, "C": 3},
-            {"A": 2, "B": 3, "C": 1},
-            {"A": 3, "B": 1, "C": 3},
-            {"A": 3, "B": 2, "C": 1},
-            {"A": 3, "B": 3, "C": 2}
-        ]
-        
-        # 數據緩衝區
-        self.data_buffer = {
-            "pressure": [],
-            "vibration": [],
-            "rpm": [],
-            "current": []
-        }
+    # 本機設備（device_id）的狀態
+    @property
+    def data_buffer(self):
+        return self.shards[self.device_id].data_buffer
         
-        # 田口法相關數據
-        self.taguchi_data = {
-            "control_factors": {},
-            "experiment_design": {},
-            "experiment_data": {},
-            "sn_ratio": {},
-            "experiment_results": {},
-            "experiment_status": {},
-            "control": {}
-        }
+    @property
+    def smoothing_window(self):
+        return self.shards[self.device_id].smoothing_window
+        
+    @property
+    def sn_stats(self):
+        return self.shards[self.device_id].sn_stats
+        
+    @property
+    def control_factors(self):
+        return self.shards[self.device_id].control_factors
         
     def on_connect(self, client, userdata, flags, rc):
         """MQTT 連接回調"""
         if rc == 0:
             self.connected = True
-            print("已成功連接到 MQTT broker")
+            logger.info("已成功連接到 MQTT broker")
             # 訂閱所有相關主題
-            self.client.subscribe(f"jetsion/taguchi/{self.device_id}/#")
+            self.client.subscribe(f"jetsion/taguchi/{self.device_filter}/#")
         else:
             self.connected = False
-            print(f"連接失敗，返回碼: {rc}")
+            logger.error("連接失敗，返回碼: %s", rc)
         
     def on_message(self, client, userdata, msg):
-        """處理接收到的感測器數據和田口法相關數據"""
+        """MQTT 訊息回調：只記錄接收時間並排入 worker 佇列
+
+        自身發布的 S/N 比、監控與警報等不處理的主題在排入佇列前就丟棄，不佔用佇列空間。
+        """
+        received_at = time.time()
+        received_clock = trace_clock()
+        if self.worker_pool is None:
+            self.handle_message(msg.topic, msg.payload, received_at, received_clock)
+            return
+        route, _ = self.router.match(msg.topic)
+        if route is None or route.handler == self._ignore_message:
+            self.metrics.count_in("other" if route is None else route.category)
+            return
+        self.worker_pool.submit(self.partition_key(msg.topic), msg.topic, msg.payload, received_at, received_clock)
+        
+    @staticmethod
+    def partition_key(topic):
+        """感測器與控制因子主題依設備分區，其餘主題由同一個 worker 處理"""
+        if topic.startswith("jetsion/taguchi/"):
+            return topic.split("/", 3)[2]
+        return "taguchi_data"
+        
+    def queue_stats(self):
+        """回傳 worker 佇列深度與溢位計數"""
+        if self.worker_pool is None:
+            return {}
+        return self.worker_pool.stats()
+        
+    def build_router(self):
+        """註冊各主題的處理函式（見 topic_router.py），較具體的過濾器優先符合"""
+        router = TopicRouter()
+        device = "jetsion/taguchi/{device}"
+        # S/N 比與自身發布的監控、實驗數據直接跳過
+        router.add(f"{device}/sn_ratio/#", self._ignore_message, "sn_ratio")
+        router.add(f"{device}/edge_metrics", self._ignore_message, "edge_metrics")
+        router.add(f"{device}/{EXPERIMENT_TOPIC}/#", self._ignore_message, "experiment")
+        router.add(f"{device}/outliers/#", self._ignore_message, "outliers")
+        router.add(f"{device}/alarms/#", self._ignore_message, "alarms")
+        # 控制因子：UI 的「停止實驗」按鈕與各水準的設定值，其餘（publish_control_factors 發布的設定、水準與狀態）跳過
+        router.add(f"{device}/control_factors/stop", self._on_stop_experiment, "control_factors")
+        for published in ("setting", "levels", "status"):
+            router.add(f"{device}/control_factors/{published}/#", self._ignore_message, "control_factors")
+        router.add(f"{device}/control_factors/{{factor}}/{{level}}", self._on_factor_level, "control_factors")
+        router.add(f"{device}/control_factors/#", self._ignore_message, "control_factors")
+        # 感測器數據（單一訊框或舊格式的單一數值）
+        router.add(f"{device}/{FRAME_TOPIC}", self._on_sensor_message, "frame")
+        router.add(f"{device}/{{sensor}}", self._on_sensor_message, "sensor")
+        # 田口法相關數據
+        taguchi = "jetsion/device001/taguchi"
+        router.add(f"{taguchi}/sn_ratio/#", self._ignore_message, "sn_ratio")
+        router.add(f"{taguchi}/{{category}}/{{key}}", self._on_taguchi_data, "taguchi_data")
+        router.add(f"{taguchi}/{{category}}/{{key}}/{{sub_key}}", self._on_taguchi_data, "taguchi_data")
+        router.add(f"{taguchi}/#", self._ignore_message, "taguchi_data")
+        return router
+        
+    def topic_category(self, topic):
+        """將主題分類，供計數器使用"""
+        return self.router.category(topic)
+        
+    def handle_message(self, topic, payload, received_at, received_clock=None):
+        """處理接收到的感測器數據和田口法相關數據
+
+        received_clock 為 trace_clock() 記錄的接收時間點，用於延遲追蹤。
+        """
+        metrics = self.metrics
+        route, params = self.router.match(topic)
+        category = "other" if route is None else route.category
+        metrics.count_in(category)
+        if route is None:
+            return
+        message = RoutedMessage(topic, payload, params, route)
         try:
-            print(f"收到訊息: {msg.topic} - {msg.payload.decode()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("收到訊息: %s - %s", topic, message.text)
+            route.handler(message, received_at, received_clock)
+        except Exception as e:
+            metrics.count_error(category)
+            logger.error("處理數據時發生錯誤: %s", e)
             
-            # 如果是 S/N 比數據，直接跳過
-            if "sn_ratio" in msg.topic:
+    def _ignore_message(self, message, received_at, received_clock):
+        pass
+        
+    def _message_shard(self, message):
+        """回傳訊息所屬設備的分片；單一設備模式下其他設備的訊息回傳 None"""
+        device_id = message["device"]
+        if not self.multi_device and device_id != self.device_id:
+            return None
+        return self.get_shard(device_id)
+        
+    def _on_stop_experiment(self, message, received_at, received_clock):
+        shard = self._message_shard(message)
+        runner = self.experiment_runner
+        if shard is not None and runner is not None and runner.device_id == shard.device_id:
+            runner.stop(wait=False)
+            
+    def _on_factor_level(self, message, received_at, received_clock):
+        shard = self._message_shard(message)
+        if shard is None:
+            return
+        factor, level = message["factor"], message["level"]
+        with shard.lock:
+            control_factor = shard.control_factors.get(factor)
+            if control_factor is None:
                 return
-                
-            # 處理感測器數據
-            if msg.topic.startswith(f"jetsion/taguchi/{self.device_id}/"):
-                value = float(msg.payload.decode())
-                sensor_type = msg.topic.split("/")[-1]
-                print(f"處理感測器數據: {sensor_type} = {value}")
-                
-                # 儲存數據
-                self.data_buffer[sensor_type].append(value)
-                print(f"{sensor_type} 緩衝區大小: {len(self.data_buffer[sensor_type])}")
-                
-                # 執行數據清洗和異常檢測
-                self.data_cleaning(sensor_type)
-                
-                # 計算S/N比
-                if len(self.data_buffer[sensor_type]) >= 10:
-                    print(f"計算 {sensor_type} 的 S/N 比...")
-                    sn_ratio = self.calculate_sn_ratio(self.data_buffer[sensor_type])
-                    print(f"{sensor_type} 的 S/N 比: {sn_ratio}")
-                    self.publish_sn_ratio(sensor_type, sn_ratio)
+            levels = control_factor["levels"]
+            if level not in levels:
+                return
+            # 只解析已知因子與水準的數值，其他主題的非數值內容不算錯誤
+            value = float(message.text)
+            levels[level] = value
+        logger.info("更新 %s 控制因子 %s 水準 %s 為 %s", shard.device_id, factor, level, value)
             
-            # 處理控制因子設定
-            elif msg.topic.startswith(f"jetsion/taguchi/{self.device_id}/control_factors/"):
-                topic_parts = msg.topic.split("/")
-                if len(topic_parts) >= 5:
-                    factor = topic_parts[4]
-                    if factor in self.control_factors:
-                        if len(topic_parts) >= 6:
-                            level = topic_parts[5]
-                            if level in self.control_factors[factor]["levels"]:
-                                value = float(msg.payload.decode())
-                                self.control_factors[factor]["levels"][level] = value
-                                print(f"更新控制因子 {factor} 水準 {level} 為 {value}")
+    def _on_sensor_message(self, message, received_at, received_clock):
+        shard = self._message_shard(message)
+        if shard is None:
+            return
+        metrics = self.metrics
+        started = time.perf_counter_ns()
+        timestamp, readings, trace = decode_traced_payload(message.topic, message.payload)
+        metrics.record("decode", time.perf_counter_ns() - started)
+        if timestamp is None:
+            timestamp = received_at
+        if trace is not None:
+            if received_clock is None:
+                received_clock = trace_clock()
+            self.trace_stats.record(message.topic, trace, received_clock)
+            # 附加邊緣接收時間點，隨 S/N 比一起轉發
+            trace = (trace[0], list(trace[1]) + [received_clock])
+        for sensor_type, value in readings.items():
+            self.process_sensor_data(sensor_type, value, timestamp, shard, trace)
             
-            # 處理田口法相關數據
-            elif msg.topic.startswith("jetsion/device001/taguchi/"):
-                topic_parts = msg.topic.split("/")
-                category = topic_parts[3]
-                if len(topic_parts) > 4:
-                    key = topic_parts[4]
-                    if len(topic_parts) > 5:
-                        sub_key = topic_parts[5]
-                        if category in self.taguchi_data:
-                            if key not in self.taguchi_data[category]:
-                                self.taguchi_data[category][key] = {}
-                            self.taguchi_data[category][key][sub_key] = msg.payload.decode()
-                    else:
-                        if category in self.taguchi_data:
-                            self.taguchi_data[category][key] = msg.payload.decode()
-                
+    def _on_taguchi_data(self, message, received_at, received_clock):
+        data = self.taguchi_data.get(message["category"])
+        if data is None:
+            return
+        key = message["key"]
+        sub_key = message.params.get("sub_key")
+        with self.taguchi_lock:
+            if sub_key is None:
+                data[key] = message.text
+            else:
+                entry = data.get(key)
+                if not isinstance(entry, dict):
+                    entry = data[key] = {}
+                entry[sub_key] = message.text
+            
+    def process_sensor_data(self, sensor_type, value, timestamp, shard=None, trace=None):
+        """處理單一感測器數據：儲存、清洗並計算 S/N 比
+
+        trace 為 (序號, [時間點, ...]) 時，S/N 比以附帶追蹤資訊的訊框發布。
+        """
+        if shard is None:
+            shard = self.shards[self.device_id]
+        if sensor_type not in shard.data_buffer:
+            logger.debug("忽略未知的感測器: %s", sensor_type)
+            return
+        logger.debug("處理感測器數據: %s/%s = %s", shard.device_id, sensor_type, value)
+        metrics = self.metrics
+        
+        # 儲存原始數據，離群值以中位數取代後才放入視窗
+        if self.store is not None:
+            self.store.append(shard.device_id, sensor_type, timestamp, value)
+        
+        # 更新設備狀態時持有分片的鎖，狀態快照才會一致（見 DeviceShard）
+        with shard.lock:
+            started = time.perf_counter_ns()
+            value = self.reject_outlier(sensor_type, value, timestamp, shard)
+            metrics.record("outlier_filter", time.perf_counter_ns() - started)
+            if self.spc is not None:
+                started = time.perf_counter_ns()
+                alarms = self.spc.update(shard.device_id, sensor_type, value)
+                if alarms:
+                    self.publish_alarms(shard.device_id, sensor_type, value, timestamp, alarms)
+                metrics.record("spc", time.perf_counter_ns() - started)
+            shard.update_window(sensor_type, value, timestamp)
+            runner = self.experiment_runner
+            if runner is not None:
+                runner.observe(shard.device_id, sensor_type, value, timestamp)
+            logger.debug("%s 緩衝區大小: %d", sensor_type, len(shard.data_buffer[sensor_type]))
+            
+            # 執行數據平滑
+            started = time.perf_counter_ns()
+            self.data_cleaning(sensor_type, shard)
+            metrics.record("data_cleaning", time.perf_counter_ns() - started)
+            
+            # 以清洗後的數值更新視窗統計量
+            shard.sn_stats[sensor_type].push(shard.data_buffer[sensor_type][-1])
+            
+            # 計算S/N比
+            if len(shard.data_buffer[sensor_type]) < 10:
+                return
+            logger.debug("計算 %s 的 S/N 比...", sensor_type)
+            started = time.perf_counter_ns()
+            sn_ratio = self.calculate_sn_ratio(shard.sn_stats[sensor_type], self.sn_type(sensor_type))
+            metrics.record("calculate_sn_ratio", time.perf_counter_ns() - started)
+        logger.debug("%s 的 S/N 比: %s", sensor_type, sn_ratio)
+        if self.store is not None:
+            self.store.append(shard.device_id, f"sn_ratio/{sensor_type}", timestamp, sn_ratio)
+        started = time.perf_counter_ns()
+        emissions = self.sn_output.offer(shard.device_id, sensor_type, sn_ratio, timestamp, trace)
+        if emissions:
+            self.emit_sn_ratios(emissions)
+        metrics.record("publish_sn_ratio", time.perf_counter_ns() - started)
+        
+    def buffer_occupancy(self):
+        """彙總所有設備各感測器緩衝區的使用量"""
+        occupancy = {}
+        total_bytes = 0
+        for shard in list(self.shards.values()):
+            for sensor_type, buffer in shard.data_buffer.items():
+                entry = occupancy.setdefault(sensor_type, {"samples": 0, "capacity": 0})
+                entry["samples"] += len(buffer)
+                entry["capacity"] += buffer.capacity
+                total_bytes += buffer.nbytes
+        for entry in occupancy.values():
+            entry["occupancy"] = round(entry["samples"] / entry["capacity"], 4) if entry["capacity"] else 0.0
+        return {"devices": len(self.shards), "bytes": total_bytes, "sensors": occupancy}
+        
+    def get_metrics(self):
+        """回傳計數器、各階段延遲、緩衝區使用量與佇列狀態"""
+        snapshot = self.metrics.snapshot()
+        snapshot["buffers"] = self.buffer_occupancy()
+        snapshot["queue"] = self.queue_stats()
+        snapshot["trace"] = self.trace_stats.snapshot()
+        snapshot["sn_output"] = self.sn_output.stats()
+        snapshot["outliers"] = self.outlier_stats()
+        if self.spc is not None:
+            snapshot["spc"] = self.spc.stats()
+        return snapshot
+        
+    def publish_metrics(self):
+        """發布監控數據到 edge_metrics 主題"""
+        topic = f"jetsion/taguchi/{self.device_id}/edge_metrics"
+        try:
+            self.client.publish(topic, json.dumps(self.get_metrics(), ensure_ascii=False))
+            self.metrics.count_out("edge_metrics")
         except Exception as e:
-            print(f"處理數據時發生錯誤: {e}")
+            logger.error("發布監控數據失敗: %s", e)
+            
+    def start_metrics_publisher(self):
+        """啟動定期發布監控數據的背景執行緒"""
+        if not self.metrics_interval or self._metrics_thread is not None:
+            return
+        self._metrics_thread = threading.Thread(target=self._metrics_loop, name="edge_metrics", daemon=True)
+        self._metrics_thread.start()
+        
+    def _metrics_loop(self):
+        while not self._stop_event.wait(self.metrics_interval):
+            self.publish_metrics()
+            
+    def start_sn_output(self):
+        """發布政策需要定期判斷（固定週期或心跳）時，啟動發布 S/N 比的背景執行緒"""
+        if self.sn_output.tick is None or self._sn_output_thread is not None:
+            return
+        self._sn_output_thread = threading.Thread(target=self._sn_output_loop, name="sn_output", daemon=True)
+        self._sn_output_thread.start()
+        
+    def _sn_output_loop(self):
+        while not self._stop_event.wait(self.sn_output.tick):
+            try:
+                self.emit_sn_ratios(self.sn_output.collect())
+            except Exception as e:
+                logger.error("發布 S/N 比失敗: %s", e)
+            
+    def emit_sn_ratios(self, emissions):
+        """發布 OutputPolicy 回傳的 [(設備, 感測器, S/N 比, 時間戳, 追蹤資訊)]
+
+        政策設定 batch 時，同一設備的 S/N 比合併為一則訊框發布到 sn_ratio/frame。
+        """
+        if not self.sn_output.batch:
+            for device_id, sensor_type, sn_ratio, _, trace in emissions:
+                self.publish_sn_ratio(sensor_type, sn_ratio, device_id, trace)
+            return
+        by_device = {}
+        for emission in emissions:
+            by_device.setdefault(emission[0], []).append(emission)
+        for device_id, items in by_device.items():
+            readings = {sensor_type: sn_ratio for _, sensor_type, sn_ratio, _, _ in items}
+            timestamp = max(item[3] for item in items)
+            # 訊框只能附帶一組追蹤資訊，取最新一筆
+            traces = [item[4] for item in items if item[4] is not None]
+            trace = None
+            if traces:
+                trace = (traces[-1][0], list(traces[-1][1]) + [trace_clock()])
+            payload = encode_frame(readings, timestamp, frame_format=self.frame_format or "json", trace=trace)
+            self.client.publish(f"jetsion/taguchi/{device_id}/sn_ratio/{FRAME_TOPIC}", payload)
+            self.metrics.count_out("sn_ratio")
             
-    def data_cleaning(self, sensor_type):
-        """數據清洗和異常檢測"""
-        if len(self.data_buffer[sensor_type]) < 3:
+    def start_store_flusher(self):
+        """啟動定期將 store 寫回磁碟的背景執行緒，程序異常結束時重新開啟不必掃描分段檔"""
+        if self.store is None or not self.flush_interval or self._flush_thread is not None:
             return
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="store_flush", daemon=True)
+        self._flush_thread.start()
+        
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.store.flush()
+            except Exception as e:
+                logger.error("寫回歷史數據失敗: %s", e)
             
-        # 使用移動平均進行平滑，但不覆蓋原始數據
-        window_size = 3
-        smoothed_data = np.convolve(self.data_buffer[sensor_type], 
-                                  np.ones(window_size)/window_size, 
-                                  mode='valid')
+    def start_checkpointer(self):
+        """啟動定期寫入狀態快照的背景執行緒"""
+        if self.checkpoint_path is None or not self.checkpoint_interval or self._checkpoint_thread is not None:
+            return
+        self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, name="edge_checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+        
+    def _checkpoint_loop(self):
+        while not self._stop_event.wait(self.checkpoint_interval):
+            try:
+                self.save_checkpoint()
+            except Exception as e:
+                logger.error("寫入狀態快照失敗: %s", e)
+            
+    def save_checkpoint(self, path=None):
+        """寫入狀態快照，回傳寫入的 bytes 數"""
+        path = path or self.checkpoint_path
+        started = time.perf_counter()
+        state, arrays = checkpoint.capture(self)
+        size = checkpoint.write(path, state, arrays)
+        logger.debug("已寫入狀態快照 %s（%d bytes，%.1f ms）", path, size, (time.perf_counter() - started) * 1000)
+        return size
+        
+    def restore_checkpoint(self, path=None):
+        """還原狀態快照，回傳還原的 stream 數量；沒有快照或快照無法讀取時回傳 0"""
+        path = path or self.checkpoint_path
+        started = time.perf_counter()
+        try:
+            snapshot = checkpoint.read(path)
+        except Exception as e:
+            logger.error("讀取狀態快照失敗: %s", e)
+            return 0
+        if snapshot is None:
+            return 0
+        streams = checkpoint.restore(self, *snapshot)
+        logger.info("已從 %s 還原 %d 個 stream（%.1f ms）", path, streams, (time.perf_counter() - started) * 1000)
+        return streams
+        
+    def resume_experiment(self):
+        """繼續從快照還原的實驗：已完成的結果保留，中斷的那一次重新執行"""
+        pending = self.pending_experiment
+        if pending is None:
+            return None
+        self.pending_experiment = None
+        reason = self._pending_design_mismatch(pending)
+        if reason is not None:
+            logger.warning("不繼續快照中的實驗: %s", reason)
+            return None
+        if pending["run"] > len(pending["design"]):
+            return None
+        # 以快照中的實驗設計繼續，分析時也使用同一個設計
+        self.experiment_plan = pending["plan"]
+        self.experiment_design = [dict(row) for row in pending["design"]]
+        runner = ExperimentRunner(self, pending["settle"], pending["dwell"], pending["device_id"])
+        runner.results = list(pending["results"])
+        self.experiment_runner = runner
+        logger.info("從第 %d 次實驗繼續", pending["run"])
+        runner.start(max(pending["run"], 1))
+        return runner
+        
+    def _pending_design_mismatch(self, pending):
+        """檢查快照中的實驗設計能否繼續執行，回傳不能繼續的原因，可以繼續時回傳 None"""
+        design = pending.get("design")
+        if not design:
+            return "快照沒有記錄實驗設計"
+        plan = pending.get("plan")
+        if plan is not None:
+            try:
+                rows = orthogonal_arrays.design_rows(plan)
+            except (KeyError, ValueError) as e:
+                return f"無法重建直交表 {plan['array']} 的配置: {e}"
+            if rows != design:
+                return f"直交表 {plan['array']} 的配置與快照中的實驗設計不一致"
+        shard = self.get_shard(pending["device_id"])
+        with shard.lock:
+            control_factors = shard.control_factors
+            for factor, levels in pending.get("levels", {}).items():
+                if factor not in control_factors:
+                    return f"控制因子 {factor} 不存在"
+                if control_factors[factor]["levels"] != levels:
+                    return f"控制因子 {factor} 的水準設定與快照不同"
+        return None
+
+    def stop(self):
+        """停止 MQTT 連線、worker 與背景執行緒，設定 checkpoint_path 時最後寫入一次狀態快照"""
+        self._stop_event.set()
+        # 先寫入快照再停止實驗，保留實驗進度
+        if self.checkpoint_path is not None:
+            try:
+                self.save_checkpoint()
+            except Exception as e:
+                logger.error("寫入狀態快照失敗: %s", e)
+        if self.experiment_runner is not None:
+            self.experiment_runner.stop()
+        # 批次發布政策保留中的 S/N 比
+        try:
+            self.emit_sn_ratios(self.sn_output.flush())
+        except Exception as e:
+            logger.error("發布 S/N 比失敗: %s", e)
+        self.client.loop_stop()
+        self.client.disconnect()
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        if self.store is not None:
+            self.store.close()
+        
+    def buffer_memory(self, device_id=None):
+        """回傳設備各感測器緩衝區佔用的記憶體（bytes），device_id 預設為本機設備"""
+        return self.shards[device_id or self.device_id].buffer_memory()
+        
+    def reject_outlier(self, sensor_type, value, timestamp, shard=None):
+        """以 Hampel 濾波器判斷離群值，回傳清洗後的數值；離群值以中位數取代並發布到 outliers 主題"""
+        if shard is None:
+            shard = self.shards[self.device_id]
+        outlier_filter = shard.outlier_filter[sensor_type]
+        if outlier_filter is None:
+            return value
+        cleaned, outlier = outlier_filter.update(value)
+        if outlier:
+            logger.debug("%s/%s 離群值: %s → %s", shard.device_id, sensor_type, value, cleaned)
+            self.publish_outlier(shard.device_id, sensor_type, value, cleaned, timestamp, outlier_filter)
+        return cleaned
+        
+    def publish_outlier(self, device_id, sensor_type, value, replacement, timestamp, outlier_filter):
+        """發布離群值旗標與該感測器累計的離群值數量"""
+        topic = f"jetsion/taguchi/{device_id}/outliers/{sensor_type}"
+        flag = {
+            "timestamp": timestamp,
+            "value": value,
+            "replacement": replacement,
+            "outliers": outlier_filter.outliers,
+            "samples": outlier_filter.samples,
+        }
+        try:
+            self.client.publish(topic, json.dumps(flag))
+            self.metrics.count_out("outliers")
+        except Exception as e:
+            self.metrics.count_error("outliers")
+            logger.error("發布離群值失敗: %s", e)
+        
+    def publish_alarms(self, device_id, sensor_type, value, timestamp, alarms):
+        """發布製程管制警報，同一筆數據觸發的多個警報合併為一則訊息"""
+        topic = f"jetsion/taguchi/{device_id}/alarms/{sensor_type}"
+        message = {
+            "timestamp": timestamp,
+            "value": value,
+            "alarms": [
+                {"chart": chart, "statistic": statistic, "lower": lower, "upper": upper}
+                for chart, statistic, lower, upper in alarms
+            ],
+        }
+        try:
+            self.client.publish(topic, json.dumps(message))
+            self.metrics.count_out("alarms")
+        except Exception as e:
+            self.metrics.count_error("alarms")
+            logger.error("發布製程管制警報失敗: %s", e)
+        self.log_alarms(device_id, sensor_type, alarms)
+
+    def log_alarms(self, device_id, sensor_type, alarms, now=None):
+        """記錄製程管制警報：同一設備、感測器與管制圖每 alarm_log_interval 秒最多一則 WARNING，
+        期間略過的次數附在下一則（完整的數量見 get_metrics()["spc"]）"""
+        now = time.monotonic() if now is None else now
+        for alarm in alarms:
+            key = (device_id, sensor_type, alarm[0])
+            entry = self._alarm_log.get(key)
+            if entry is not None and now - entry[0] < self.alarm_log_interval:
+                entry[1] += 1
+                continue
+            if entry is not None and entry[1]:
+                logger.warning("%s/%s 製程管制警報: %s（上次記錄後另有 %d 次）", device_id, sensor_type, alarm[0], entry[1])
+            else:
+                logger.warning("%s/%s 製程管制警報: %s", device_id, sensor_type, alarm[0])
+            self._alarm_log[key] = [now, 0]
+        
+    def outlier_stats(self):
+        """彙總所有設備各感測器的離群值數量"""
+        totals = {}
+        for shard in list(self.shards.values()):
+            for sensor_type, stats in shard.outlier_stats().items():
+                entry = totals.setdefault(sensor_type, {"samples": 0, "outliers": 0})
+                entry["samples"] += stats["samples"]
+                entry["outliers"] += stats["outliers"]
+        for entry in totals.values():
+            entry["ratio"] = round(entry["outliers"] / entry["samples"], 4) if entry["samples"] else 0.0
+        return totals
+        
+    def data_cleaning(self, sensor_type, shard=None):
+        """數據平滑（離群值已由 reject_outlier 取代）"""
+        if shard is None:
+            shard = self.shards[self.device_id]
+        window = shard.smoothing_window[sensor_type]
+        if not window.full:
+            return
+            
+        # 使用移動平均進行平滑，只需維護最後 3 筆，不必掃描整個緩衝區
+        smoothed = window.mean
         
         # 只保留最後一個平滑後的數據
-        if len(smoothed_data) > 0:
-            self.data_buffer[sensor_type][-1] = smoothed_data[-1]
+        window.replace_last(smoothed)
+        shard.data_buffer[sensor_type].replace_last(smoothed)
+        
+    @staticmethod
+    def _as_stats(data):
+        """將 list、dict 或 RunningStats 轉為 RunningStats（list / dict 以向量化運算掃描一次）"""
+        if isinstance(data, RunningStats):
+            return data
+        values = list(data.values()) if isinstance(data, dict) else data
+        stats = RunningStats()
+        stats.rebuild(values)
+        return stats
+        
+    def sn_type(self, sensor_type):
+        """回傳感測器使用的 S/N 特性"""
+        return sensor_option(self.sn_types, sensor_type) or DEFAULT_SN_TYPES.get(sensor_type, DEFAULT_SN_TYPE)
         
-    def calculate_sn_ratio(self, data):
+    def calculate_sn_ratio(self, data, sn_type=DEFAULT_SN_TYPE):
         """計算S/N比
-        使用望目特性S/N比公式：S/N = -10 * log10(σ²/μ²)
+        sn_type 為 S/N 特性（stb、ltb、ntb1、ntb2，見 sn_ratio.py），
+        預設使用望目特性S/N比公式：S/N = -10 * log10(σ²/μ²)
         其中：
         μ = 平均值
         σ = 標準差
+        data 可為 list、dict 或 RunningStats（增量統計，O(1) 計算）
         """
-        if isinstance(data, dict):
-            values = np.array(list(data.values()))
-        else:
-            values = np.array(data)
-            
+        stats = self._as_stats(data)
+        
         # 確保有足夠的數據點
-        if len(values) < 2:
+        if stats.count < 2:
             return 0
-            
-        mean = np.mean(values)
-        std = np.std(values)
         
-        # 避免除以零
-        if mean == 0:
-            return 0
-            
         # 計算S/N比
-        sn_ratio = -10 * np.log10((std**2) / (mean**2))
+        sn = sn_from_moments(sn_type, stats.count, stats.mean, stats.variance, stats.inv_square_mean, stats.zeros)
         
-        # 判斷品質
-        if sn_ratio > 10:
-            quality = "良好"
-        elif sn_ratio > 5:
-            quality = "可接受"
-        else:
-            quality = "不佳"
-            
-        print(f"S/N 比: {round(sn_ratio, 2)} dB, 品質: {quality}")
-        return round(sn_ratio, 2)
+        # 判斷品質（門檻依 S/N 特性而定，見 sn_ratio.QUALITY_THRESHOLDS）
+        if logger.isEnabledFor(logging.DEBUG):
+            quality = sn_quality(sn_type, sn)
+            if quality is None:
+                logger.debug("S/N 比 (%s): %s dB", sn_type, round(sn, 2))
+            else:
+                logger.debug("S/N 比 (%s): %s dB, 品質: %s", sn_type, round(sn, 2), quality)
+        return round(sn, 2)
+        
+    def calculate_sn_ratios(self, data):
+        """由同一組累計量一次計算所有 S/N 特性，回傳 {特性: S/N 比}"""
+        stats = self._as_stats(data)
+        return {
+            sn_type: round(sn_from_moments(sn_type, stats.count, stats.mean, stats.variance,
+                                           stats.inv_square_mean, stats.zeros), 2)
+            for sn_type in SN_TYPES
+        }
         
-    def publish_sn_ratio(self, sensor_type, sn_ratio):
-        """發布S/N比到MQTT broker"""
-        topic = f"jetsion/taguchi/{self.device_id}/sn_ratio/{sensor_type}"
-        print(f"發布 S/N 比到 {topic}: {sn_ratio}")
-        self.client.publish(topic, str(sn_ratio))
+    def publish_sn_ratio(self, sensor_type, sn_ratio, device_id=None, trace=None):
+        """發布S/N比到MQTT broker
+
+        有追蹤資訊時附加發布時間點，以訊框（frame_format，預設 JSON）發布，否則 payload 為 str(S/N 比)。
+        """
+        topic = f"jetsion/taguchi/{device_id or self.device_id}/sn_ratio/{sensor_type}"
+        logger.debug("發布 S/N 比到 %s: %s", topic, sn_ratio)
+        if trace is None:
+            payload = str(sn_ratio)
+        else:
+            trace = (trace[0], list(trace[1]) + [trace_clock()])
+            payload = encode_frame({sensor_type: sn_ratio}, frame_format=self.frame_format or "json", trace=trace)
+        self.client.publish(topic, payload)
+        self.metrics.count_out("sn_ratio")
         
     def publish_control_factors(self):
         """發布控制因子設定"""
@@ -265,15 +862,32 @@ class EdgeComputing:
         full_topic = f"jetsion/taguchi/{self.device_id}/{topic}"
         try:
             self.client.publish(full_topic, str(value))
-            print(f"已發布數據: {full_topic} = {value}")
+            self.metrics.count_out(self.topic_category(full_topic))
+            logger.debug("已發布數據: %s = %s", full_topic, value)
+            return True
+        except Exception as e:
+            self.metrics.count_error(self.topic_category(full_topic))
+            logger.error("發布數據失敗: %s", e)
+            return False
+
+    def publish_frame(self, data, timestamp=None):
+        """將所有感測器數據合併為單一訊框發布"""
+        full_topic = f"jetsion/taguchi/{self.device_id}/{FRAME_TOPIC}"
+        try:
+            self.client.publish(full_topic, encode_frame(data, timestamp, self.frame_format))
+            self.metrics.count_out("frame")
+            logger.debug("已發布訊框: %s = %s", full_topic, data)
             return True
         except Exception as e:
-            print(f"發布數據失敗: {str(e)}")
+            self.metrics.count_error("frame")
+            logger.error("發布數據失敗: %s", e)
             return False
 
     def generate_and_publish_data(self):
         """生成並發布感測器數據"""
         data = self.generate_sensor_data()
+        if self.frame_format:
+            return self.publish_frame(data)
         success = True
         for sensor_type, value in data.items():
             if not self.publish_data(sensor_type, value):
@@ -326,6 +940,54 @@ class EdgeComputing:
         
         return data
 
+    def plan_experiment(self, factors=None, array=None, interactions=()):
+        """以直交表產生實驗設計並更新 experiment_design
+
+        factors 為 {因子: 水準數}，預設取自控制因子設定；array 為 None 時自動選擇
+        實驗次數最少的直交表。回傳 orthogonal_arrays.assign_factors() 的配置結果。
+        """
+        if factors is None:
+            factors = {factor: len(config["levels"]) for factor, config in self.control_factors.items()}
+        if array is None:
+            plan = orthogonal_arrays.select_array(factors, interactions)
+        else:
+            plan = orthogonal_arrays.assign_factors(array, factors, interactions)
+        self.experiment_plan = plan
+        self.experiment_design = orthogonal_arrays.design_rows(plan)
+        return plan
+
+    def analyze_experiment(self, sn_ratios, means=None, pool="auto"):
+        """依 experiment_design 分析各次實驗的結果
+
+        sn_ratios / means 為 {感測器: [每次實驗的數值, ...]}，
+        回傳 taguchi_analysis.analyze() 的結果，並附上因子與感測器名稱。
+        """
+        design, factors = taguchi_analysis.design_matrix(self.experiment_design)
+        responses = list(sn_ratios)
+        sn_matrix = np.column_stack([np.asarray(sn_ratios[name], dtype=np.float64) for name in responses])
+        mean_matrix = None
+        if means is not None:
+            mean_matrix = np.column_stack([np.asarray(means[name], dtype=np.float64) for name in responses])
+        result = taguchi_analysis.analyze(design, sn_matrix, mean_matrix, pool)
+        result["factors"] = factors
+        result["responses"] = responses
+        return result
+
+    def run_experiment(self, settle=DEFAULT_SETTLE, dwell=DEFAULT_DWELL, device_id=None, wait=False):
+        """依 experiment_design 自動執行實驗（見 experiment_runner.py）
+
+        每次實驗發布因子設定值後等待 settle 秒，再收集 dwell 秒的數據並發布統計結果；
+        預設在背景執行並回傳 ExperimentRunner，wait=True 時等待全部完成並回傳各次的結果。
+        """
+        if self.experiment_runner is not None and self.experiment_runner.phase in ("settle", "dwell"):
+            raise RuntimeError("實驗已在執行中")
+        runner = ExperimentRunner(self, settle, dwell, device_id)
+        self.experiment_runner = runner
+        if wait:
+            return runner.run()
+        runner.start()
+        return runner
+
     def simulate_experiment_data(self, design):
         """根據實驗設計產生模擬數據"""
         data = {}
@@ -343,25 +1005,28 @@ class EdgeComputing:
     def run(self):
         """運行邊緣計算層"""
         try:
-            print("開始運行邊緣計算層...")
+            logger.info("開始運行邊緣計算層...")
             
             # 初始發布一次數據
             if self.connected:
                 self.generate_and_publish_data()
-                print("已發布初始數據")
+                logger.info("已發布初始數據")
             
             while True:
                 if self.connected:
                     self.generate_and_publish_data()
-                    print("已發布新數據")
+                    logger.debug("已發布新數據")
                 time.sleep(5)  # 每5秒更新一次
                 
         except KeyboardInterrupt:
-            print("停止邊緣計算層")
-            self.client.loop_stop()
-            self.client.disconnect()
+            logger.info("停止邊緣計算層")
+            self.stop()
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     # 使用範例
     edge_computing = EdgeComputing("device001")
     edge_computing.run() 
\ No newline at end of file
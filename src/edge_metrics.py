@@ -0,0 +1,142 @@
+import threading
+import time
+
+# 每個 2 的次方區間切成 2^(SUB_BUCKET_BITS-1) 個子區間，相對誤差約 3%
+SUB_BUCKET_BITS = 5
+_SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+_SUB_BUCKET_HALF = _SUB_BUCKET_COUNT >> 1
+# 可記錄的最大值約 2^40 ns（約 18 分鐘），超過的數值記在最後一格
+_MAX_EXPONENT = 40 - SUB_BUCKET_BITS + 1
+_BUCKET_COUNT = _SUB_BUCKET_COUNT + _MAX_EXPONENT * _SUB_BUCKET_HALF
+
+# 訊息主題分類
+TOPIC_CATEGORIES = ("sensor", "frame", "control_factors", "taguchi_data", "sn_ratio", "edge_metrics", "experiment", "outliers", "alarms", "other")
+
+# 計時的處理階段
+STAGES = ("decode", "outlier_filter", "spc", "data_cleaning", "calculate_sn_ratio", "publish_sn_ratio")
+
+
+def _bucket_index(value):
+    if value < _SUB_BUCKET_COUNT:
+        return max(value, 0)
+    exponent = value.bit_length() - SUB_BUCKET_BITS
+    if exponent > _MAX_EXPONENT:
+        return _BUCKET_COUNT - 1
+    return _SUB_BUCKET_COUNT + (exponent - 1) * _SUB_BUCKET_HALF + (value >> exponent) - _SUB_BUCKET_HALF
+
+
+def _bucket_value(index):
+    """回傳桶的代表值（區間中點）"""
+    if index < _SUB_BUCKET_COUNT:
+        return index
+    exponent, sub = divmod(index - _SUB_BUCKET_COUNT, _SUB_BUCKET_HALF)
+    exponent += 1
+    low = (sub + _SUB_BUCKET_HALF) << exponent
+    return low + ((1 << exponent) >> 1)
+
+
+class LatencyHistogram:
+    """HDR 風格的對數-線性延遲直方圖（單位 ns）
+
+    每次記錄為 O(1)，記憶體固定約數百個整數，可在不保存原始數據的情況下
+    取得任意百分位數。為避免在熱路徑加鎖，多執行緒同時記錄時計數為近似值。
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKET_COUNT
+        self.reset()
+
+    def reset(self):
+        for i in range(_BUCKET_COUNT):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_ns):
+        """記錄一筆延遲（ns）"""
+        self.counts[_bucket_index(value_ns)] += 1
+        self.count += 1
+        self.total += value_ns
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def percentile(self, percent):
+        """回傳指定百分位數的延遲（ns）"""
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(_bucket_value(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        """回傳統計摘要（µs）"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 3),
+            "min_us": round(self.min / 1000, 3),
+            "p50_us": round(self.percentile(50) / 1000, 3),
+            "p90_us": round(self.percentile(90) / 1000, 3),
+            "p95_us": round(self.percentile(95) / 1000, 3),
+            "p99_us": round(self.percentile(99) / 1000, 3),
+            "p999_us": round(self.percentile(99.9) / 1000, 3),
+            "max_us": round(self.max / 1000, 3),
+        }
+
+
+class EdgeMetrics:
+    """邊緣計算管線的計數器與各階段延遲直方圖"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = {category: {"in": 0, "out": 0, "errors": 0} for category in TOPIC_CATEGORIES}
+        self.latency = {stage: LatencyHistogram() for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def count_in(self, category):
+        self.counters[category]["in"] += 1
+
+    def count_out(self, category):
+        self.counters[category]["out"] += 1
+
+    def count_error(self, category):
+        self.counters[category]["errors"] += 1
+
+    def record(self, stage, elapsed_ns):
+        self.latency[stage].record(elapsed_ns)
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            for counters in self.counters.values():
+                for key in counters:
+                    counters[key] = 0
+            for histogram in self.latency.values():
+                histogram.reset()
+
+    def snapshot(self):
+        """回傳目前的計數與延遲摘要"""
+        with self._lock:
+            uptime = time.time() - self.started_at
+            counters = {category: dict(values) for category, values in self.counters.items()}
+            total_in = sum(values["in"] for values in counters.values())
+            return {
+                "uptime_s": round(uptime, 3),
+                "messages_in": total_in,
+                "messages_out": sum(values["out"] for values in counters.values()),
+                "errors": sum(values["errors"] for values in counters.values()),
+                "rate_in_per_s": round(total_in / uptime, 3) if uptime > 0 else 0.0,
+                "counters": counters,
+                "latency": {stage: histogram.snapshot() for stage, histogram in self.latency.items()},
+            }
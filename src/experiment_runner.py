@@ -0,0 +1,226 @@
+import json
+import logging
+import math
+import threading
+import time
+
+from streaming_stats import RunningStats
+
+logger = logging.getLogger(__name__)
+
+# 實驗執行
+#
+# 依 EdgeComputing.experiment_design 逐列執行實驗：發布該列各控制因子的設定值，等待 settle 秒讓製程穩定，
+# 再收集 dwell 秒的感測器數據。收集期間每筆數據只以 O(1) 更新該次實驗的累計統計量，不保存原始數據；
+# 每次實驗結束後發布平均值、變異數與 S/N 比，全部跑完後以各次實驗的 S/N 比進行田口法分析。
+#
+# 主題（device 為執行實驗的設備）：
+#   jetsion/taguchi/{device}/control_factors/{因子}    該次實驗的因子設定值（與 UI 的「設定因子」按鈕相同）
+#   jetsion/taguchi/{device}/experiment/status         目前的階段 (settle / dwell / done / stopped)
+#   jetsion/taguchi/{device}/experiment/result/{run}   每次實驗的統計結果
+#   jetsion/taguchi/{device}/experiment/summary        全部實驗的最佳水準與 delta
+
+EXPERIMENT_TOPIC = "experiment"
+
+DEFAULT_SETTLE = 5.0
+DEFAULT_DWELL = 30.0
+
+
+def finite_or_none(value):
+    """S/N 比可能為 ±inf（例如變異數為 0），JSON 沒有對應的數值，發布時改為 null"""
+    return value if math.isfinite(value) else None
+
+
+def dumps(data):
+    """序列化要發布的結果，非有限數值必須先以 finite_or_none 轉換，否則拋出 ValueError"""
+    return json.dumps(data, ensure_ascii=False, allow_nan=False)
+
+
+class RunAccumulator:
+    """單次實驗各感測器的累計統計量（只保留計數、平均值與平方差和）"""
+
+    __slots__ = ("run", "levels", "started_at", "ended_at", "stats")
+
+    def __init__(self, run, levels, sensor_types, started_at):
+        self.run = run
+        self.levels = levels
+        self.started_at = started_at
+        self.ended_at = None
+        self.stats = {sensor_type: RunningStats() for sensor_type in sensor_types}
+
+    def push(self, sensor_type, value):
+        stats = self.stats.get(sensor_type)
+        if stats is not None:
+            stats.push(value)
+
+
+class ExperimentRunner:
+    """在邊緣計算層自動執行實驗設計的每一列
+
+    edge 為 EdgeComputing；settle / dwell 為每次實驗的穩定等待與收集時間（秒）；
+    device_id 預設為 edge.device_id，只收集該設備的數據。
+    數據由 edge 的 worker 透過 observe() 送入，與執行實驗的背景執行緒以一把鎖同步。
+    """
+
+    def __init__(self, edge, settle=DEFAULT_SETTLE, dwell=DEFAULT_DWELL, device_id=None):
+        self.edge = edge
+        self.settle = settle
+        self.dwell = dwell
+        self.device_id = device_id or edge.device_id
+        self.design = list(edge.experiment_design)
+        self.plan = edge.experiment_plan
+        self.results = []
+        self.analysis = None
+        self.phase = "idle"
+        # 目前（或中止時）的實驗次數，從 1 起算
+        self.current_run = 0
+        self._active = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def topic(self, *parts):
+        return "/".join(("jetsion/taguchi", self.device_id, EXPERIMENT_TOPIC) + parts)
+
+    def observe(self, device_id, sensor_type, value, timestamp):
+        """收集一筆感測器數據（只計入 dwell 開始之後產生的數據）"""
+        active = self._active
+        if active is None or device_id != self.device_id or timestamp < active.started_at:
+            return
+        with self._lock:
+            if self._active is active:
+                active.push(sensor_type, value)
+
+    def start(self, start_run=1):
+        """在背景執行緒執行所有實驗（start_run 見 run()）"""
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError("實驗已在執行中")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, args=(start_run,), name="experiment_runner", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, wait=True):
+        """中止實驗，目前這一次的數據不發布；wait=False 時不等待背景執行緒結束"""
+        self._stop_event.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def run(self, start_run=1):
+        """依序執行每一次實驗，回傳各次的結果；中途停止時回傳已完成的部分
+
+        start_run 大於 1 時從該次實驗繼續，results 保留先前已完成的結果（例如從 checkpoint 還原）。
+        """
+        if start_run <= 1:
+            self.results = []
+        self.analysis = None
+        for run, row in enumerate(self.design, start=1):
+            if run < start_run:
+                continue
+            if not self.run_once(run, row):
+                self.publish_status("stopped", run)
+                logger.info("實驗於第 %d 次中止", run)
+                return self.results
+        self.analysis = self.analyze()
+        self.publish_summary()
+        self.publish_status("done", len(self.design))
+        return self.results
+
+    def run_once(self, run, row):
+        """執行單次實驗：設定因子、等待穩定、收集數據並發布結果；被中止時回傳 False"""
+        self.current_run = run
+        levels = {factor: int(level) for factor, level in row.items()}
+        self.apply_levels(levels)
+        self.publish_status("settle", run, levels)
+        if self._stop_event.wait(self.settle):
+            return False
+
+        sensor_types = list(self.edge.get_shard(self.device_id).data_buffer)
+        accumulator = RunAccumulator(run, levels, sensor_types, time.time())
+        with self._lock:
+            self._active = accumulator
+        self.publish_status("dwell", run, levels)
+        stopped = self._stop_event.wait(self.dwell)
+        with self._lock:
+            self._active = None
+        if stopped:
+            return False
+        accumulator.ended_at = time.time()
+
+        result = self.summarize(accumulator)
+        self.results.append(result)
+        self.edge.client.publish(self.topic("result", str(run)), dumps(self.publishable(result)))
+        logger.info("第 %d 次實驗完成: %s", run, result["sensors"])
+        return True
+
+    def apply_levels(self, levels):
+        """發布各控制因子在本次實驗的設定值"""
+        control_factors = self.edge.get_shard(self.device_id).control_factors
+        for factor, level in levels.items():
+            value = control_factors.get(factor, {}).get("levels", {}).get(str(level), level)
+            self.edge.client.publish(f"jetsion/taguchi/{self.device_id}/control_factors/{factor}", str(value))
+
+    def summarize(self, accumulator):
+        """將單次實驗的累計統計量整理為可發布的結果"""
+        sensors = {}
+        for sensor_type, stats in accumulator.stats.items():
+            sn_type = self.edge.sn_type(sensor_type)
+            sensors[sensor_type] = {
+                "count": stats.count,
+                "mean": round(stats.mean, 6),
+                "variance": round(stats.variance, 6),
+                "sn_type": sn_type,
+                "sn": self.edge.calculate_sn_ratio(stats, sn_type),
+            }
+        return {
+            "run": accumulator.run,
+            "levels": accumulator.levels,
+            "started_at": accumulator.started_at,
+            "ended_at": accumulator.ended_at,
+            "sensors": sensors,
+        }
+
+    @staticmethod
+    def publishable(result):
+        """回傳可序列化為 JSON 的結果複本（S/N 比為 ±inf 時改為 None），results 本身保留原始數值供分析使用"""
+        sensors = {
+            sensor_type: dict(stats, sn=finite_or_none(stats["sn"]))
+            for sensor_type, stats in result["sensors"].items()
+        }
+        return dict(result, sensors=sensors)
+
+    def analyze(self):
+        """以各次實驗的 S/N 比與平均值進行田口法分析（見 EdgeComputing.analyze_experiment）"""
+        if len(self.results) != len(self.design) or not self.results:
+            return None
+        sensor_types = list(self.results[0]["sensors"])
+        sn_ratios = {name: [result["sensors"][name]["sn"] for result in self.results] for name in sensor_types}
+        means = {name: [result["sensors"][name]["mean"] for result in self.results] for name in sensor_types}
+        return self.edge.analyze_experiment(sn_ratios, means)
+
+    def publish_status(self, phase, run, levels=None):
+        self.phase = phase
+        status = {"phase": phase, "run": run, "runs": len(self.design), "timestamp": time.time()}
+        if levels is not None:
+            status["levels"] = levels
+        self.edge.client.publish(self.topic("status"), dumps(status))
+
+    def publish_summary(self):
+        """發布各感測器 S/N 比的最佳水準與各因子 delta"""
+        if self.analysis is None:
+            return
+        factors = self.analysis["factors"]
+        sn = self.analysis["sn"]
+        summary = {
+            "runs": len(self.results),
+            "best_level": {},
+            "delta": {},
+        }
+        for index, sensor_type in enumerate(self.analysis["responses"]):
+            summary["best_level"][sensor_type] = {
+                factor: int(sn["best_level"][i, index]) for i, factor in enumerate(factors)
+            }
+            summary["delta"][sensor_type] = {
+                factor: finite_or_none(round(float(sn["delta"][i, index]), 4)) for i, factor in enumerate(factors)
+            }
+        self.edge.client.publish(self.topic("summary"), dumps(summary))
@@ -0,0 +1,200 @@
+"""高速率負載產生器
+
+依模擬器的 signals 規格表（min / spec_low / spec_high / max）以 NumPy 一次產生
+N 台虛擬設備 × M 個訊號的數據區塊，並以指定的總發送速率（訊息/秒）發布，用來對邊緣計算層做壓力測試。
+數值分布與模擬器相同：80% 在 spec_low ~ spec_high，10% 在 min ~ spec_low，10% 在 spec_high ~ max。
+
+用法：
+    python src/load_generator.py --devices 100 --rate 50000 --duration 30
+    python src/load_generator.py --profile multi --devices 10 --rate 5000 --frame-format binary
+"""
+import argparse
+import logging
+import threading
+import time
+
+import numpy as np
+
+from payload_codec import FRAME_TOPIC, encode_frame
+
+logger = logging.getLogger(__name__)
+
+# 每次檢查發送進度的時間間隔（秒），決定速率控制的粒度
+PACING_INTERVAL = 0.005
+
+# 每個數據區塊涵蓋的時間（秒）
+BLOCK_SECONDS = 0.1
+
+
+def device_ids(count, prefix="device"):
+    """產生虛擬設備 ID：device001、device002 ..."""
+    return [f"{prefix}{i:03d}" for i in range(1, count + 1)]
+
+
+class LoadGenerator:
+    """向量化產生多設備、多訊號的模擬數據並以固定速率發布
+
+    - signals：模擬器的訊號規格表（需含 name、min、spec_low、spec_high、max）
+    - devices：設備 ID 列表
+    - topic_format：主題格式，例如 "jetsion/taguchi/{device}/{signal}"；訊框模式的主題為 signal="frame"
+    - decimals：各訊號的小數位數，預設 max > 100 的訊號取整數，其餘取 2 位
+    - frame_format：設為 "binary" 或 "json" 時，每台設備每次採樣只發布一個訊框
+    """
+
+    def __init__(self, signals, devices, topic_format, transport, frame_format=None, decimals=None, seed=None):
+        self.signals = signals
+        self.devices = list(devices)
+        self.client = transport
+        self.frame_format = frame_format
+        self.names = [sig["name"] for sig in signals]
+        self.low = np.array([[sig["min"], sig["spec_low"], sig["spec_high"]] for sig in signals], dtype=np.float64)
+        self.high = np.array([[sig["spec_low"], sig["spec_high"], sig["max"]] for sig in signals], dtype=np.float64)
+        if decimals is None:
+            decimals = [0 if sig["max"] > 100 else 2 for sig in signals]
+        self.scale = 10.0 ** np.asarray(decimals, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+        if frame_format:
+            self.topics = [topic_format.format(device=device, signal=FRAME_TOPIC) for device in self.devices]
+        else:
+            self.topics = [
+                topic_format.format(device=device, signal=name) for device in self.devices for name in self.names
+            ]
+        self._stop_event = threading.Event()
+
+    @property
+    def messages_per_sample(self):
+        """每次採樣（所有設備）發布的訊息數"""
+        return len(self.topics)
+
+    def generate_block(self, samples):
+        """產生形狀為 (samples, devices, signals) 的數據區塊"""
+        shape = (samples, len(self.devices), len(self.signals))
+        r = self.rng.random(shape)
+        # 0: min ~ spec_low (10%)，1: spec_low ~ spec_high (80%)，2: spec_high ~ max (10%)
+        region = np.where(r < 0.8, 1, np.where(r < 0.9, 0, 2))
+        signal_index = np.arange(len(self.signals))
+        low = self.low[signal_index, region]
+        high = self.high[signal_index, region]
+        values = low + (high - low) * self.rng.random(shape)
+        return np.round(values * self.scale) / self.scale
+
+    def _messages(self, block, timestamp):
+        """將數據區塊展開為 (主題, payload)"""
+        topics = self.topics
+        if self.frame_format:
+            names = self.names
+            for sample in block.tolist():
+                for topic, values in zip(topics, sample):
+                    yield topic, encode_frame(dict(zip(names, values)), timestamp, self.frame_format)
+        else:
+            for sample in block.reshape(len(block), -1).tolist():
+                for topic, value in zip(topics, sample):
+                    yield topic, str(value)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self, rate=None, duration=None, messages=None, report_interval=1.0):
+        """以 rate（訊息/秒，None 為不限速）發布數據，直到 duration 秒或 messages 則為止
+
+        回傳實際達成的速率等統計：sent、errors、elapsed、target_rate、achieved_rate、max_lag
+        （max_lag 為落後排程的最大秒數，持續增加代表發送端跟不上目標速率）。
+        """
+        if duration is None and messages is None:
+            raise ValueError("必須指定 duration 或 messages")
+        self._stop_event.clear()
+        per_sample = self.messages_per_sample
+        block_messages = max(per_sample, int((rate or 100000) * BLOCK_SECONDS))
+        samples_per_block = max(1, block_messages // per_sample)
+        check_every = max(1, int((rate or 100000) * PACING_INTERVAL))
+
+        publish = self.client.publish
+        sent = errors = 0
+        max_lag = 0.0
+        start = time.perf_counter()
+        deadline = None if duration is None else start + duration
+        next_check = check_every
+        next_report = start + report_interval
+        reported_sent = 0
+        done = False
+        while not done and not self._stop_event.is_set():
+            block = self.generate_block(samples_per_block)
+            for topic, payload in self._messages(block, time.time()):
+                info = publish(topic, payload)
+                if getattr(info, "rc", 0):
+                    errors += 1
+                sent += 1
+                if messages is not None and sent >= messages:
+                    done = True
+                    break
+                if sent < next_check:
+                    continue
+                next_check += check_every
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    done = True
+                    break
+                if rate:
+                    delay = start + sent / rate - now
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        max_lag = max(max_lag, -delay)
+                if now >= next_report:
+                    logger.info("已發送 %d 則，最近速率 %.0f 訊息/秒", sent,
+                                (sent - reported_sent) / (now - next_report + report_interval))
+                    reported_sent = sent
+                    next_report = now + report_interval
+        elapsed = time.perf_counter() - start
+        return {
+            "devices": len(self.devices),
+            "signals": len(self.signals),
+            "sent": sent,
+            "errors": errors,
+            "elapsed": elapsed,
+            "target_rate": rate,
+            "achieved_rate": sent / elapsed if elapsed > 0 else 0.0,
+            "max_lag": max_lag,
+        }
+
+
+def main():
+    from sensor_simulator import SensorSimulator, MultiSensorSimulator
+    from transport import InMemoryTransport, PahoTransport
+
+    parser = argparse.ArgumentParser(description="高速率負載產生器")
+    parser.add_argument("--profile", choices=("taguchi", "multi"), default="taguchi",
+                        help="taguchi 使用 SensorSimulator 的訊號，multi 使用 MultiSensorSimulator 的訊號")
+    parser.add_argument("--devices", type=int, default=100, help="虛擬設備數量")
+    parser.add_argument("--rate", type=float, default=50000, help="目標總發送速率（訊息/秒），0 為不限速")
+    parser.add_argument("--duration", type=float, default=10, help="執行秒數")
+    parser.add_argument("--frame-format", choices=("binary", "json"))
+    parser.add_argument("--broker", default="aiot.jetsion.com", help="MQTT broker，memory 為同程序內的 InMemoryBroker")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    transport = InMemoryTransport() if args.broker == "memory" else PahoTransport(args.broker)
+    if args.profile == "taguchi":
+        simulator = SensorSimulator("device001", frame_format=args.frame_format, transport=transport)
+    else:
+        simulator = MultiSensorSimulator(frame_format=args.frame_format, transport=transport)
+    generator = simulator.load_generator(args.devices, seed=args.seed)
+    # 啟動網路執行緒處理送出緩衝、keepalive 與 QoS 確認，量到的速率才是實際送達 broker 的速率
+    transport.loop_start()
+    try:
+        report = generator.run(rate=args.rate or None, duration=args.duration)
+    except KeyboardInterrupt:
+        generator.stop()
+        return
+    finally:
+        transport.disconnect()
+        transport.loop_stop()
+    target = f"{report['target_rate']:.0f}" if report["target_rate"] else "不限"
+    print(f"設備 {report['devices']} 台 × 訊號 {report['signals']} 個，發送 {report['sent']} 則"
+          f"（錯誤 {report['errors']}），耗時 {report['elapsed']:.2f} 秒")
+    print(f"目標速率 {target} 訊息/秒，實際 {report['achieved_rate']:.0f} 訊息/秒，最大落後 {report['max_lag'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import functools
+import os
+
+import numpy as np
+
+# 田口法直交表
+#
+# 直交表以 (runs, columns) 的 uint8 陣列表示，水準以 1 起算，欄位編號與田口標準表相同（從 1 起算）。
+# 二、三、四、五水準的標準表（L4、L8、L16、L32、L64、L9、L27、L81、L16_4、L64_4、L25）以有限體的線性
+# 構造產生：每個欄位對應一個係數向量，第 r 列的水準為係數與 r 各位數的內積，因此任兩欄的
+# 交互作用欄位可以直接由向量計算；L12、L18、L36 等非線性（混合水準）直交表則以固定的構造產生。
+# 產生後的陣列以 lru_cache 保留在記憶體中，並可指定 cache_dir 存成 .npy 檔，之後以 memmap 載入。
+
+# 線性直交表：名稱 -> (水準數, 基本欄位數)，列數 = 水準數 ** 基本欄位數
+LINEAR_ARRAYS = {
+    "L4": (2, 2),
+    "L8": (2, 3),
+    "L16": (2, 4),
+    "L32": (2, 5),
+    "L64": (2, 6),
+    "L9": (3, 2),
+    "L27": (3, 3),
+    "L81": (3, 4),
+    "L16_4": (4, 2),
+    "L64_4": (4, 3),
+    "L25": (5, 2),
+}
+
+# 混合水準（非線性）直交表：名稱 -> [(水準數, 欄位數), ...]
+MIXED_ARRAYS = {
+    "L12": [(2, 11)],
+    "L18": [(2, 1), (3, 7)],
+    "L36": [(2, 11), (3, 12)],
+}
+
+# GF(4) 的加法為 XOR，乘法查表（元素 2、3 分別為 α、α²）
+_GF4_MUL = np.array([
+    [0, 0, 0, 0],
+    [0, 1, 2, 3],
+    [0, 2, 3, 1],
+    [0, 3, 1, 2],
+], dtype=np.uint8)
+_GF4_INV = [0, 1, 3, 2]
+
+# Plackett-Burman 12 列設計的生成列（1 為 "+"）
+_L12_GENERATOR = [1, 1, 0, 1, 1, 1, 0, 0, 0, 1, 0]
+
+# L18 (2^1 x 3^7)
+_L18 = [
+    [1, 1, 1, 1, 1, 1, 1, 1],
+    [1, 1, 2, 2, 2, 2, 2, 2],
+    [1, 1, 3, 3, 3, 3, 3, 3],
+    [1, 2, 1, 1, 2, 2, 3, 3],
+    [1, 2, 2, 2, 3, 3, 1, 1],
+    [1, 2, 3, 3, 1, 1, 2, 2],
+    [1, 3, 1, 2, 1, 3, 2, 3],
+    [1, 3, 2, 3, 2, 1, 3, 1],
+    [1, 3, 3, 1, 3, 2, 1, 2],
+    [2, 1, 1, 3, 3, 2, 2, 1],
+    [2, 1, 2, 1, 1, 3, 3, 2],
+    [2, 1, 3, 2, 2, 1, 1, 3],
+    [2, 2, 1, 2, 3, 1, 3, 2],
+    [2, 2, 2, 3, 1, 2, 1, 3],
+    [2, 2, 3, 1, 2, 3, 2, 1],
+    [2, 3, 1, 3, 2, 3, 1, 2],
+    [2, 3, 2, 1, 3, 1, 2, 3],
+    [2, 3, 3, 2, 1, 2, 3, 1],
+]
+
+# GF(3) 上的差集方案 D(12, 12, 3)：任兩欄相減後 0、1、2 各出現 4 次，
+# 每列加上 0、1、2 即得到 36 列的三水準直交表
+_D12 = [
+    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 2, 0, 1, 0, 1, 1, 2, 1, 2, 2, 0],
+    [0, 2, 2, 0, 1, 1, 2, 1, 2, 0, 1, 0],
+    [0, 1, 1, 1, 2, 1, 0, 0, 2, 0, 2, 2],
+    [0, 1, 0, 2, 1, 1, 2, 2, 0, 1, 0, 2],
+    [0, 0, 1, 0, 0, 2, 2, 1, 1, 1, 2, 2],
+    [0, 2, 1, 2, 1, 0, 0, 1, 0, 2, 2, 1],
+    [0, 1, 0, 0, 2, 2, 1, 1, 2, 2, 0, 1],
+    [0, 2, 2, 1, 2, 0, 2, 0, 1, 1, 0, 1],
+    [0, 0, 1, 2, 2, 0, 1, 2, 2, 1, 1, 0],
+    [0, 1, 2, 2, 0, 2, 0, 2, 1, 0, 1, 1],
+    [0, 0, 2, 1, 1, 2, 1, 0, 0, 2, 1, 2],
+]
+
+
+def array_names():
+    """回傳所有可用的直交表名稱，依列數排序"""
+    return sorted(list(LINEAR_ARRAYS) + list(MIXED_ARRAYS), key=lambda name: (array_runs(name), name))
+
+
+def array_runs(name):
+    """回傳直交表的實驗次數（列數）"""
+    if name in LINEAR_ARRAYS:
+        levels, basic = LINEAR_ARRAYS[name]
+        return levels ** basic
+    if name in MIXED_ARRAYS:
+        return int(name[1:])
+    raise KeyError(f"未知的直交表: {name}")
+
+
+@functools.lru_cache(maxsize=None)
+def column_levels(name):
+    """回傳各欄位的水準數（唯讀 uint8 陣列）"""
+    if name in LINEAR_ARRAYS:
+        levels, basic = LINEAR_ARRAYS[name]
+        result = np.full((levels ** basic - 1) // (levels - 1), levels, dtype=np.uint8)
+    elif name in MIXED_ARRAYS:
+        result = np.concatenate([np.full(count, levels, dtype=np.uint8) for levels, count in MIXED_ARRAYS[name]])
+    else:
+        raise KeyError(f"未知的直交表: {name}")
+    result.setflags(write=False)
+    return result
+
+
+# ---- 線性構造 ----
+def _field_mul(levels, a, b):
+    if levels == 4:
+        return _GF4_MUL[a, b]
+    return (a * b) % levels
+
+
+def _field_add(levels, a, b):
+    if levels == 4:
+        return a ^ b
+    return (a + b) % levels
+
+
+def _normalize(levels, vector):
+    """將係數向量縮放為最後一個非零係數為 1（同一欄位的唯一表示）"""
+    last = next(value for value in reversed(vector) if value)
+    inverse = _GF4_INV[last] if levels == 4 else pow(int(last), levels - 2, levels)
+    return tuple(int(_field_mul(levels, value, inverse)) for value in vector)
+
+
+@functools.lru_cache(maxsize=None)
+def _column_vectors(name):
+    """線性直交表各欄位的係數向量（依田口標準表的欄位順序）
+
+    第 d 個基本欄位之後，依序為 d 與前面各基本欄位的所有組合；
+    例如 L8 為 A, B, AB, C, AC, BC, ABC，L9 為 A, B, AB, AB²。
+    """
+    levels, basic = LINEAR_ARRAYS[name]
+    vectors = []
+    for d in range(basic):
+        for combination in range(levels ** d):
+            vector = [(combination // levels ** j) % levels for j in range(d)] + [1] + [0] * (basic - d - 1)
+            vectors.append(tuple(vector))
+    return vectors
+
+
+def _generate_linear(name):
+    levels, basic = LINEAR_ARRAYS[name]
+    runs = levels ** basic
+    # 各列的位數，第一個基本欄位為最高位
+    digits = (np.arange(runs)[:, None] // levels ** np.arange(basic - 1, -1, -1)[None, :]) % levels
+    vectors = np.array(_column_vectors(name), dtype=np.intp)
+    if levels == 4:
+        array = np.zeros((runs, len(vectors)), dtype=np.uint8)
+        for j in range(basic):
+            array ^= _GF4_MUL[vectors[None, :, j], digits[:, j, None]]
+    else:
+        array = (digits @ vectors.T) % levels
+    return (array + 1).astype(np.uint8)
+
+
+# ---- 非線性構造 ----
+def _generate_l12():
+    rows = [[0] * 11] + [np.roll(_L12_GENERATOR, shift).tolist() for shift in range(11)]
+    return np.array(rows, dtype=np.uint8) + 1
+
+
+def _generate_l36():
+    # 三水準部分：D(12, 12, 3) 的每一列分別加上 0、1、2；二水準部分：L12 的每一列重複三次
+    d12 = np.array(_D12, dtype=np.uint8)
+    three_level = (d12[:, None, :] + np.arange(3, dtype=np.uint8)[None, :, None]) % 3 + 1
+    two_level = np.repeat(_generate_l12(), 3, axis=0)
+    return np.hstack((two_level, three_level.reshape(36, 12)))
+
+
+_GENERATORS = {
+    "L12": _generate_l12,
+    "L18": lambda: np.array(_L18, dtype=np.uint8),
+    "L36": _generate_l36,
+}
+
+
+def _generate(name):
+    if name in LINEAR_ARRAYS:
+        return _generate_linear(name)
+    if name in _GENERATORS:
+        return _GENERATORS[name]()
+    raise KeyError(f"未知的直交表: {name}")
+
+
+@functools.lru_cache(maxsize=None)
+def orthogonal_array(name, cache_dir=None):
+    """回傳直交表（唯讀 uint8 陣列，形狀 (runs, columns)，水準以 1 起算）
+
+    同一個直交表只產生一次；指定 cache_dir 時會存成 <cache_dir>/<name>.npy，
+    之後直接以 memmap 唯讀載入。
+    """
+    if cache_dir is None:
+        array = _generate(name)
+        array.setflags(write=False)
+        return array
+    path = os.path.join(cache_dir, f"{name}.npy")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, _generate(name))
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+
+def interaction_columns(name, column_a, column_b):
+    """回傳兩欄位的交互作用所在的欄位編號（從 1 起算）
+
+    二水準表為 1 個欄位，三水準表為 2 個欄位，四水準表為 3 個欄位。
+    混合水準表的交互作用分散於各欄，無法指定。
+    """
+    if name not in LINEAR_ARRAYS:
+        raise ValueError(f"{name} 的交互作用分散於各欄位，無法指定交互作用欄位")
+    if column_a == column_b:
+        raise ValueError("交互作用必須為兩個不同的欄位")
+    levels, _ = LINEAR_ARRAYS[name]
+    vectors = _column_vectors(name)
+    lookup = _vector_lookup(name)
+    u = vectors[column_a - 1]
+    v = vectors[column_b - 1]
+    columns = []
+    for multiplier in range(1, levels):
+        combined = [int(_field_add(levels, a, _field_mul(levels, multiplier, b))) for a, b in zip(u, v)]
+        columns.append(lookup[_normalize(levels, combined)])
+    return sorted(columns)
+
+
+@functools.lru_cache(maxsize=None)
+def _vector_lookup(name):
+    return {vector: index + 1 for index, vector in enumerate(_column_vectors(name))}
+
+
+# ---- 因子配置 ----
+def _factor_levels(factors):
+    if isinstance(factors, dict):
+        return {factor: int(levels) for factor, levels in factors.items()}
+    raise TypeError("factors 必須為 {因子: 水準數} 的字典")
+
+
+def assign_factors(name, factors, interactions=()):
+    """將因子與交互作用配置到直交表的欄位
+
+    factors 為 {因子: 水準數}，interactions 為 [(因子, 因子), ...]。
+    回傳 {"array", "columns": {因子: 欄位}, "interactions": {(因子, 因子): [欄位, ...]}}，
+    欄位編號從 1 起算；無法配置時拋出 ValueError。
+    配置時依序嘗試編號最小的可用欄位，交互作用欄位不會再配置其他因子。
+    """
+    factors = _factor_levels(factors)
+    interactions = [tuple(pair) for pair in interactions]
+    for pair in interactions:
+        if len(pair) != 2 or any(factor not in factors for factor in pair):
+            raise ValueError(f"交互作用 {pair} 必須為兩個已定義的因子")
+    levels = column_levels(name)
+    # 有交互作用的因子先配置，交互作用越多越先配置
+    involvement = {factor: sum(factor in pair for pair in interactions) for factor in factors}
+    order = sorted(factors, key=lambda factor: -involvement[factor])
+
+    needed = set(factors.values())
+    columns = {}
+    used = set()
+
+    def interactions_of(factor):
+        reserved = {}
+        for pair in interactions:
+            if factor in pair:
+                other = pair[1] if pair[0] == factor else pair[0]
+                if other in columns:
+                    reserved[pair] = interaction_columns(name, columns[factor], columns[other])
+        return reserved
+
+    def fits(position):
+        # 剩餘可用欄位數不足時提前放棄
+        for level in needed:
+            free = sum(1 for c in range(1, len(levels) + 1) if c not in used and levels[c - 1] == level)
+            if free < sum(1 for factor in order[position:] if factors[factor] == level):
+                return False
+        return True
+
+    def place(position, reserved):
+        if position == len(order):
+            return reserved
+        if not fits(position):
+            return None
+        factor = order[position]
+        for column in range(1, len(levels) + 1):
+            if column in used or levels[column - 1] != factors[factor]:
+                continue
+            columns[factor] = column
+            new = interactions_of(factor) if involvement[factor] else {}
+            new_columns = [c for cols in new.values() for c in cols]
+            if len(set(new_columns)) == len(new_columns) and not (set(new_columns) & (used | {column})):
+                used.add(column)
+                used.update(new_columns)
+                result = place(position + 1, {**reserved, **new})
+                if result is not None or not involvement[factor]:
+                    # 沒有交互作用的因子配置在最小的可用欄位即可，不需回溯
+                    return result
+                used.discard(column)
+                used.difference_update(new_columns)
+            del columns[factor]
+        return None
+
+    reserved = place(0, {})
+    if reserved is None:
+        raise ValueError(f"{name} 無法配置 {len(factors)} 個因子與 {len(interactions)} 個交互作用")
+    return {
+        "array": name,
+        "columns": {factor: columns[factor] for factor in factors},
+        "interactions": {pair: reserved[pair] for pair in interactions},
+    }
+
+
+def select_array(factors, interactions=()):
+    """選出可配置所有因子與交互作用、實驗次數最少的直交表，回傳 assign_factors() 的結果"""
+    factors = _factor_levels(factors)
+    needed = set(factors.values())
+    for name in array_names():
+        available = set(column_levels(name).tolist())
+        if not needed <= available:
+            continue
+        if interactions and name not in LINEAR_ARRAYS:
+            continue
+        try:
+            return assign_factors(name, factors, interactions)
+        except ValueError:
+            continue
+    raise ValueError(f"沒有可配置 {len(factors)} 個因子與 {len(interactions)} 個交互作用的直交表")
+
+
+def design_array(assignment):
+    """回傳只包含已配置因子的設計矩陣 (runs, factors)，欄位順序同 assignment["columns"]"""
+    array = orthogonal_array(assignment["array"])
+    return array[:, [column - 1 for column in assignment["columns"].values()]]
+
+
+def design_rows(assignment):
+    """將配置結果轉為 [{"A": 1, "B": 1, ...}, ...] 形式（EdgeComputing.experiment_design 的格式）"""
+    names = list(assignment["columns"])
+    return [dict(zip(names, map(int, row))) for row in design_array(assignment)]
+
+
+def experiment_design(factors, array=None, interactions=()):
+    """產生 [{"A": 1, "B": 1, ...}, ...] 形式的實驗設計
+
+    array 為 None 時自動選擇實驗次數最少的直交表。
+    """
+    assignment = select_array(factors, interactions) if array is None else assign_factors(array, factors, interactions)
+    return design_rows(assignment)
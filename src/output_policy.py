@@ -0,0 +1,166 @@
+import math
+import threading
+import time
+
+# S/N 比等衍生數據的發布政策
+#
+# 邊緣計算層每收到一筆數據就會算出新的 S/N 比，相鄰數值通常幾乎相同。OutputPolicy 為每個
+# (設備, 感測器) 保留最新的數值，依下列規則決定何時發布：
+#   interval   固定發布週期（秒）：每個週期最多發布一次各 stream 的最新數值；None 為收到就判斷
+#   deadband   與上次發布的數值相差超過此值（dB）才發布；None 為不抑制
+#   heartbeat  超過此秒數沒有發布時，不論變化大小都發布一次最新數值；None 為不發送
+#   batch      同一設備要發布的數值合併為一則訊框。有 interval 時合併同一個週期內到期的數值；
+#              沒有 interval 時，通過死區的數值先保留，同一設備累積 batch_size 個 stream 時一起發布，
+#              最早保留的數值超過 batch_age 秒仍未湊滿時由 collect() 送出
+# 預設（全部為 None / False）與原本的行為相同：每個新數值都立即發布。
+
+# 沒有 interval 時批次發布的預設 stream 數（每台設備的感測器數量）與最長等待秒數
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_BATCH_AGE = 0.5
+
+
+class _StreamState:
+    __slots__ = ("value", "timestamp", "trace", "dirty", "published", "published_at")
+
+    def __init__(self):
+        self.value = None
+        self.timestamp = None
+        self.trace = None
+        self.dirty = False
+        self.published = None
+        self.published_at = None
+
+
+class OutputPolicy:
+    """S/N 比的發布政策（見模組說明），offer() 與 collect() 可由不同執行緒呼叫"""
+
+    def __init__(self, interval=None, deadband=None, heartbeat=None, batch=False,
+                 batch_size=DEFAULT_BATCH_SIZE, batch_age=DEFAULT_BATCH_AGE):
+        if interval is not None and interval <= 0:
+            raise ValueError("interval 必須大於 0")
+        if heartbeat is not None and heartbeat <= 0:
+            raise ValueError("heartbeat 必須大於 0")
+        if batch_size < 1:
+            raise ValueError("batch_size 必須大於 0")
+        if batch_age <= 0:
+            raise ValueError("batch_age 必須大於 0")
+        self.interval = interval
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.batch = batch
+        self.batch_size = batch_size
+        self.batch_age = batch_age
+        self._streams = {}
+        # 沒有 interval 的批次發布：{設備: {(設備, 感測器): 開始保留的時間}}
+        self._held = {}
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.published = 0
+        # 尚未發布就被新數值取代的數量
+        self.suppressed = 0
+
+    @property
+    def _holding(self):
+        return self.batch and self.interval is None
+
+    @property
+    def tick(self):
+        """背景執行緒呼叫 collect() 的間隔，None 表示不需要背景執行緒"""
+        if self.interval is not None:
+            return self.interval
+        ticks = []
+        if self.heartbeat is not None:
+            ticks.append(self.heartbeat / 4)
+        if self._holding:
+            ticks.append(self.batch_age / 2)
+        return min(ticks) if ticks else None
+
+    def _changed(self, state):
+        if self.deadband is None or state.published is None:
+            return True
+        value, published = state.value, state.published
+        if math.isinf(value) or math.isinf(published):
+            return value != published
+        return abs(value - published) > self.deadband
+
+    def _should_publish(self, state, now):
+        if state.value is None:
+            return False
+        if self.heartbeat is not None and (state.published_at is None or now - state.published_at >= self.heartbeat):
+            return True
+        return state.dirty and self._changed(state)
+
+    def _publish(self, key, state, now):
+        # 心跳重發已發布過的數值時不帶追蹤資訊，以免把等待時間算成延遲
+        trace = state.trace if state.dirty else None
+        state.dirty = False
+        state.published = state.value
+        state.published_at = now
+        self.published += 1
+        return key[0], key[1], state.value, state.timestamp, trace
+
+    def offer(self, device_id, sensor_type, value, timestamp, trace=None, now=None):
+        """提供一個新數值，回傳需要立即發布的 [(設備, 感測器, 數值, 時間戳, 追蹤資訊)]"""
+        if now is None:
+            now = time.monotonic()
+        key = (device_id, sensor_type)
+        with self._lock:
+            self.offered += 1
+            state = self._streams.get(key)
+            if state is None:
+                state = self._streams[key] = _StreamState()
+            elif state.dirty:
+                self.suppressed += 1
+            state.value = value
+            state.timestamp = timestamp
+            state.trace = trace
+            state.dirty = True
+            if self.interval is None and self._should_publish(state, now):
+                if self._holding:
+                    return self._hold(key, now)
+                return [self._publish(key, state, now)]
+        return []
+
+    def _hold(self, key, now):
+        held = self._held.setdefault(key[0], {})
+        held.setdefault(key, now)
+        if len(held) < self.batch_size:
+            return []
+        del self._held[key[0]]
+        return [self._publish(held_key, self._streams[held_key], now) for held_key in held]
+
+    def collect(self, now=None):
+        """回傳目前到期需要發布的數值（週期發布、心跳與等待逾時的批次），由背景執行緒定期呼叫"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            emissions = []
+            for device_id, held in list(self._held.items()):
+                if now - min(held.values()) >= self.batch_age:
+                    del self._held[device_id]
+                    emissions.extend(self._publish(key, self._streams[key], now) for key in held)
+            for key, state in self._streams.items():
+                if key in self._held.get(key[0], ()):
+                    continue
+                if self._should_publish(state, now):
+                    emissions.append(self._publish(key, state, now))
+            return emissions
+
+    def flush(self, now=None):
+        """回傳所有保留中、尚未發布的批次數值（停止前呼叫）"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            held, self._held = self._held, {}
+            return [self._publish(key, self._streams[key], now) for keys in held.values() for key in keys]
+
+    def stats(self):
+        """回傳提供、發布（含心跳）與被抑制的數量"""
+        with self._lock:
+            offered, published, suppressed = self.offered, self.published, self.suppressed
+        return {
+            "offered": offered,
+            "published": published,
+            "suppressed": suppressed,
+            "ratio": round(published / offered, 4) if offered else 0.0,
+        }
@@ -0,0 +1,142 @@
+import json
+import struct
+import time
+
+# 多感測器單一訊框格式
+#
+# 二進位格式（little-endian）：
+#   版本 (uint8) | 感測器數量 n (uint8) | 時間戳 (float64, epoch 秒)
+#   n 組 [名稱長度 (uint8) | 名稱 (utf-8)]
+#   n 個數值 (float64)
+# JSON 格式：
+#   {"v": 版本, "ts": 時間戳, "data": {感測器: 數值, ...}}
+#
+# 附帶延遲追蹤資訊的訊框為版本 2（見 tracing.py）：
+#   二進位格式在時間戳之後加上 序號 (uint32) | 時間點數量 m (uint8) | m 個時間點 (float64)
+#   JSON 格式加上 "seq": 序號, "t": [時間點, ...]
+# 時間點為各元件以 tracing.trace_clock()（單調時鐘）記錄的發送/接收時間，依經過的順序排列。
+#
+# 舊格式為每個感測器一個主題、payload 為 str(float)，
+# 二進位訊框第一個位元組為版本號（非可列印字元），JSON 以 "{" 開頭，
+# 因此三種格式可以直接由 payload 內容判別。
+
+FRAME_VERSION = 1
+TRACED_FRAME_VERSION = 2
+FRAME_TOPIC = "frame"
+
+FRAME_FORMATS = ("binary", "json")
+
+_HEADER = struct.Struct("<BBd")
+_TRACE_HEADER = struct.Struct("<IB")
+
+
+class FrameDecodeError(ValueError):
+    """訊框格式錯誤"""
+
+
+def encode_frame(data, timestamp=None, frame_format="binary", trace=None):
+    """將多個感測器數值編碼為單一訊框
+
+    trace 為 (序號, [時間點, ...]) 時編碼為附帶追蹤資訊的版本 2 訊框。
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    version = FRAME_VERSION if trace is None else TRACED_FRAME_VERSION
+    if frame_format == "json":
+        frame = {"v": version, "ts": timestamp}
+        if trace is not None:
+            frame["seq"] = trace[0]
+            frame["t"] = list(trace[1])
+        frame["data"] = data
+        return json.dumps(frame, separators=(",", ":"), ensure_ascii=False).encode()
+    if frame_format != "binary":
+        raise ValueError(f"不支援的訊框格式: {frame_format}")
+
+    names = [name.encode() for name in data]
+    if len(names) > 255:
+        raise ValueError("單一訊框最多 255 個感測器")
+    parts = [_HEADER.pack(version, len(names), timestamp)]
+    if trace is not None:
+        seq, stamps = trace
+        parts.append(_TRACE_HEADER.pack(seq & 0xFFFFFFFF, len(stamps)))
+        parts.append(struct.pack(f"<{len(stamps)}d", *stamps))
+    for name in names:
+        parts.append(struct.pack("<B", len(name)))
+        parts.append(name)
+    parts.append(struct.pack(f"<{len(names)}d", *data.values()))
+    return b"".join(parts)
+
+
+def decode_traced_frame(payload):
+    """解碼訊框，回傳 (時間戳, {感測器: 數值}, 追蹤資訊)
+
+    追蹤資訊為 (序號, [時間點, ...])，版本 1 的訊框為 None。
+    """
+    if not payload:
+        raise FrameDecodeError("空的訊框")
+    if payload[:1] == b"{":
+        try:
+            frame = json.loads(payload)
+        except ValueError as e:
+            raise FrameDecodeError(f"JSON 訊框格式錯誤: {e}") from e
+        version = frame.get("v")
+        if version not in (FRAME_VERSION, TRACED_FRAME_VERSION):
+            raise FrameDecodeError(f"不支援的訊框版本: {version}")
+        trace = (frame["seq"], frame["t"]) if version == TRACED_FRAME_VERSION else None
+        return frame.get("ts"), {name: float(value) for name, value in frame["data"].items()}, trace
+
+    version = payload[0]
+    if version not in (FRAME_VERSION, TRACED_FRAME_VERSION):
+        raise FrameDecodeError(f"不支援的訊框版本: {version}")
+    try:
+        _, count, timestamp = _HEADER.unpack_from(payload, 0)
+        offset = _HEADER.size
+        trace = None
+        if version == TRACED_FRAME_VERSION:
+            seq, stamp_count = _TRACE_HEADER.unpack_from(payload, offset)
+            offset += _TRACE_HEADER.size
+            trace = (seq, list(struct.unpack_from(f"<{stamp_count}d", payload, offset)))
+            offset += 8 * stamp_count
+        names = []
+        for _ in range(count):
+            length = payload[offset]
+            offset += 1
+            names.append(payload[offset:offset + length].decode())
+            offset += length
+        values = struct.unpack_from(f"<{count}d", payload, offset)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise FrameDecodeError(f"二進位訊框格式錯誤: {e}") from e
+    return timestamp, dict(zip(names, values)), trace
+
+
+def decode_frame(payload):
+    """解碼訊框，回傳 (時間戳, {感測器: 數值})"""
+    timestamp, data, _ = decode_traced_frame(payload)
+    return timestamp, data
+
+
+def is_frame(payload):
+    """判斷 payload 是否為訊框（而非舊格式的單一數值）"""
+    return bool(payload) and (payload[0] in (FRAME_VERSION, TRACED_FRAME_VERSION) or payload[:1] == b"{")
+
+
+def decode_traced_payload(topic, payload):
+    """解碼感測器訊息，回傳 (時間戳, {感測器: 數值}, 追蹤資訊)
+
+    舊格式的單一數值沒有時間戳與追蹤資訊，兩者皆為 None，感測器名稱取主題最後一段。
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if is_frame(payload):
+        return decode_traced_frame(payload)
+    return None, {topic.rsplit("/", 1)[-1]: float(payload)}, None
+
+
+def decode_payload(topic, payload):
+    """解碼感測器訊息，同時支援訊框與舊格式的單一數值
+
+    回傳 (時間戳, {感測器: 數值})，舊格式沒有時間戳，回傳 None，
+    感測器名稱取主題最後一段。
+    """
+    timestamp, data, _ = decode_traced_payload(topic, payload)
+    return timestamp, data
@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+
+
+class RingBuffer:
+    """固定容量的環形緩衝區，以預先配置的 float64 NumPy 陣列儲存數值與時間戳
+
+    - capacity：最多保留的筆數，超過時覆蓋最舊的數據
+    - max_age：保留的時間長度（秒），None 表示只依筆數限制
+    記憶體用量在建立時即固定，可由 nbytes 取得。
+    """
+
+    __slots__ = ("capacity", "max_age", "_values", "_timestamps", "_start", "_count")
+
+    def __init__(self, capacity, max_age=None):
+        if capacity < 1:
+            raise ValueError("capacity 必須大於 0")
+        self.capacity = int(capacity)
+        self.max_age = max_age
+        self._values = np.zeros(self.capacity, dtype=np.float64)
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self._start = 0
+        self._count = 0
+
+    def append(self, value, timestamp=None):
+        """加入一筆數據，回傳因容量或時間限制而移出的數值列表"""
+        if timestamp is None:
+            timestamp = time.time()
+        evicted = []
+        if self.max_age is not None:
+            cutoff = timestamp - self.max_age
+            while self._count and self._timestamps[self._start] < cutoff:
+                evicted.append(self._pop_oldest())
+        if self._count == self.capacity:
+            evicted.append(self._pop_oldest())
+        end = (self._start + self._count) % self.capacity
+        self._values[end] = value
+        self._timestamps[end] = timestamp
+        self._count += 1
+        return evicted
+
+    def extend(self, values, timestamps):
+        """批次加入數據（向量化寫入），回傳被移出的數值陣列
+
+        只依容量移出最舊的數據，max_age 的時間限制在下一次 append() 時套用。
+        """
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(values) != len(timestamps):
+            raise ValueError("values 與 timestamps 長度不一致")
+        overflow = max(self._count + len(values) - self.capacity, 0)
+        evicted_existing = min(overflow, self._count)
+        evicted = self._ordered(self._values)[:evicted_existing]
+        if len(values) > self.capacity:
+            evicted = np.concatenate((evicted, values[:len(values) - self.capacity]))
+            values = values[-self.capacity:]
+            timestamps = timestamps[-self.capacity:]
+        self._start = (self._start + evicted_existing) % self.capacity
+        self._count -= evicted_existing
+        end = (self._start + self._count) % self.capacity
+        first = min(len(values), self.capacity - end)
+        self._values[end:end + first] = values[:first]
+        self._timestamps[end:end + first] = timestamps[:first]
+        self._values[:len(values) - first] = values[first:]
+        self._timestamps[:len(values) - first] = timestamps[first:]
+        self._count += len(values)
+        return evicted
+
+    def _pop_oldest(self):
+        value = float(self._values[self._start])
+        self._start = (self._start + 1) % self.capacity
+        self._count -= 1
+        return value
+
+    def replace_last(self, value):
+        """以新數值取代最後一筆數據"""
+        if not self._count:
+            raise IndexError("緩衝區為空")
+        self._values[(self._start + self._count - 1) % self.capacity] = value
+
+    def last(self):
+        """回傳最後一筆 (時間戳, 數值)"""
+        if not self._count:
+            raise IndexError("緩衝區為空")
+        index = (self._start + self._count - 1) % self.capacity
+        return float(self._timestamps[index]), float(self._values[index])
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+    def _ordered(self, array):
+        end = self._start + self._count
+        if end <= self.capacity:
+            return array[self._start:end].copy()
+        return np.concatenate((array[self._start:], array[:end - self.capacity]))
+
+    def values(self):
+        """依時間先後回傳目前視窗內的數值（複本）"""
+        return self._ordered(self._values)
+
+    def timestamps(self):
+        """依時間先後回傳目前視窗內的時間戳（複本）"""
+        return self._ordered(self._timestamps)
+
+    def snapshot(self):
+        """依時間先後回傳 (數值, 時間戳) 的複本，兩者取自同一組起點與筆數，長度一定一致"""
+        start, count = self._start, self._count
+        index = (start + np.arange(count)) % self.capacity
+        return self._values[index], self._timestamps[index]
+
+    @property
+    def nbytes(self):
+        """緩衝區佔用的記憶體（bytes）"""
+        return self._values.nbytes + self._timestamps.nbytes
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("索引超出範圍")
+        return float(self._values[(self._start + index) % self.capacity])
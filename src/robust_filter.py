@@ -0,0 +1,157 @@
+from bisect import bisect_left, insort
+from collections import deque
+
+# 串流 Hampel 濾波器
+#
+# 以最近 window 筆原始數據的中位數 m 與中位數絕對偏差 MAD（median(|x - m|)）判斷新數據是否為離群值：
+#   |x - m| > threshold · 1.4826 · MAD  → 離群值，以 m 取代
+# 1.4826 讓 MAD 在常態分佈下等於標準差，threshold=3 即約 3σ。中位數與 MAD 對離群值不敏感，
+# 視窗中離群值少於一半時判斷都不受影響，單一突波（例如感測器讀到 0）不會像平均值那樣拉偏 S/N 比。
+#
+# 視窗以排序好的 list 保存：插入與移除用二分搜尋定位（O(log w) 次比較），中位數直接取索引；
+# MAD 為兩個已排序序列（中位數左右兩側的距離）合併後的第 k 小，同樣以二分搜尋求得。
+# 插入與移除還需要搬移插入點之後的 list 元素（O(w) 的 memmove，只搬移指標），
+# 因此每筆數據的成本只與視窗大小有關、不隨歷史長度增加，但不是 O(log w)：
+# 視窗 1 萬筆以內搬移成本不明顯（每筆約 2 ~ 8 µs），10 萬筆時升高到約 35 µs（見 benchmarks 的 outlier_filter）。
+
+MAD_SCALE = 1.4826
+
+DEFAULT_OUTLIER_WINDOW = 25
+DEFAULT_OUTLIER_THRESHOLD = 3.0
+
+
+class SortedWindow:
+    """固定長度的滑動視窗，同時保存到達順序與排序後的數值"""
+
+    __slots__ = ("window_size", "_order", "_sorted")
+
+    def __init__(self, window_size):
+        if window_size < 1:
+            raise ValueError("window_size 必須大於 0")
+        self.window_size = window_size
+        self._order = deque()
+        self._sorted = []
+
+    def push(self, value):
+        """加入一筆數據，視窗已滿時移除最舊的一筆"""
+        if len(self._order) == self.window_size:
+            oldest = self._order.popleft()
+            del self._sorted[bisect_left(self._sorted, oldest)]
+        self._order.append(value)
+        insort(self._sorted, value)
+
+    def reset(self):
+        self._order.clear()
+        self._sorted.clear()
+
+    @property
+    def median(self):
+        values = self._sorted
+        n = len(values)
+        if n == 0:
+            return 0.0
+        middle = n // 2
+        if n % 2:
+            return values[middle]
+        return (values[middle - 1] + values[middle]) / 2
+
+    def _kth_distance(self, center, split, k):
+        """|x - center| 的第 k 小（0 起算）
+
+        split 左側的距離依索引遞減排序、右側依索引遞增排序，兩者皆已排序，
+        以二分搜尋決定從左側取幾個。
+        """
+        values = self._sorted
+        left_size = split
+        right_size = len(values) - split
+        low = max(0, k + 1 - right_size)
+        high = min(k + 1, left_size)
+        while True:
+            # 左側取 i 個，右側取 j 個
+            i = (low + high) // 2
+            j = k + 1 - i
+            left_last = center - values[split - i] if i > 0 else float("-inf")
+            right_last = values[split + j - 1] - center if j > 0 else float("-inf")
+            left_next = center - values[split - i - 1] if i < left_size else float("inf")
+            right_next = values[split + j] - center if j < right_size else float("inf")
+            if left_last > right_next:
+                high = i - 1
+            elif right_last > left_next:
+                low = i + 1
+            else:
+                return max(left_last, right_last)
+
+    def mad(self, median=None):
+        """中位數絕對偏差 median(|x - median|)"""
+        n = len(self._sorted)
+        if n == 0:
+            return 0.0
+        if median is None:
+            median = self.median
+        split = bisect_left(self._sorted, median)
+        middle = n // 2
+        if n % 2:
+            return self._kth_distance(median, split, middle)
+        return (self._kth_distance(median, split, middle - 1) + self._kth_distance(median, split, middle)) / 2
+
+    def values(self):
+        """依到達順序回傳視窗內的數據"""
+        return list(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+
+class HampelFilter:
+    """串流 Hampel 濾波器（見模組說明）
+
+    window 為參考的原始數據筆數，threshold 為以 σ 估計值計的門檻；
+    參考數據少於 min_samples（預設為 window 的一半）時不判斷。
+    MAD 為 0（視窗內超過一半的數值相同）時，與中位數不同的數值都視為離群值。
+    """
+
+    __slots__ = ("threshold", "min_samples", "window", "samples", "outliers")
+
+    def __init__(self, window=DEFAULT_OUTLIER_WINDOW, threshold=DEFAULT_OUTLIER_THRESHOLD, min_samples=None):
+        if threshold <= 0:
+            raise ValueError("threshold 必須大於 0")
+        self.threshold = threshold
+        self.min_samples = max(3, window // 2) if min_samples is None else min_samples
+        self.window = SortedWindow(window)
+        self.samples = 0
+        self.outliers = 0
+
+    def update(self, value):
+        """判斷一筆數據，回傳 (清洗後的數值, 是否為離群值)
+
+        視窗保存原始數據（包含離群值），中位數與 MAD 本身即可承受少於一半的離群值。
+        """
+        self.samples += 1
+        window = self.window
+        outlier = False
+        cleaned = value
+        if len(window) >= self.min_samples:
+            median = window.median
+            if abs(value - median) > self.threshold * MAD_SCALE * window.mad(median):
+                outlier = True
+                cleaned = median
+                self.outliers += 1
+        window.push(value)
+        return cleaned, outlier
+
+    def prime(self, values):
+        """以歷史數據填入參考視窗，不計入 samples / outliers"""
+        for value in values[-self.window.window_size:]:
+            self.window.push(float(value))
+
+    def reset(self):
+        self.window.reset()
+        self.samples = 0
+        self.outliers = 0
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "outliers": self.outliers,
+            "ratio": round(self.outliers / self.samples, 4) if self.samples else 0.0,
+        }
@@ -1,14 +1,24 @@
-import paho.mqtt.client as mqtt
 import time
 import random
 from datetime import datetime
 
+from payload_codec import FRAME_TOPIC, encode_frame
+from transport import PahoTransport
+from load_generator import LoadGenerator, device_ids
+from tracing import trace_clock
+
 class SensorSimulator:
-    def __init__(self, device_id):
+    def __init__(self, device_id, frame_format=None, transport=None, trace=False):
+        """frame_format 設為 "binary" 或 "json" 時，每次採樣只發布一個包含所有感測器的訊框；
+        transport 預設連線到 aiot.jetsion.com，可改用 InMemoryTransport 離線執行；
+        trace=True 時每次採樣附上序號與發送時間點（未使用訊框時，各感測器改以 JSON 訊框發布）"""
         self.device_id = device_id
-        self.client = mqtt.Client()
-        self.client.username_pw_set("jetsion", "jetsion")  # 添加認證
-        self.client.connect("aiot.jetsion.com", 1883, 60)  # 使用正確的broker地址
+        self.frame_format = frame_format
+        self.trace = trace
+        self.sequence = 0
+        self.frame_topic = f"jetsion/taguchi/{device_id}/{FRAME_TOPIC}"
+        self.client = transport if transport is not None else PahoTransport("aiot.jetsion.com")  # 使用正確的broker地址
+        self.client.connect()
         
         # 感測器參數
         self.pressure_range = (0, 120)  # 壓力範圍 (bar)
@@ -68,18 +78,54 @@ class SensorSimulator:
             data[sig["name"]] = value
         return data
     
+    def next_trace(self):
+        """遞增序號並回傳本次採樣的追蹤資訊 (序號, [發送時間點])"""
+        self.sequence += 1
+        return self.sequence, [trace_clock()]
+
+    def trace_stats(self):
+        return {"sent": self.sequence}
+
     def publish_data(self):
         """發布感測器數據到MQTT broker"""
         data = self.generate_sensor_data()
+        trace = self.next_trace() if self.trace else None
+        
+        # 合併為單一訊框發布
+        if self.frame_format:
+            self.client.publish(self.frame_topic, encode_frame(data, frame_format=self.frame_format, trace=trace))
+            print(f"發送訊框到 {self.frame_topic}: {data}")
+            return
         
         # 發布到各個主題，直接發送數值字串
         for sig in self.signals:
-            self.client.publish(sig["topic"], str(data[sig["name"]]))
+            if trace is None:
+                payload = str(data[sig["name"]])
+            else:
+                payload = encode_frame({sig["name"]: data[sig["name"]]}, frame_format="json", trace=trace)
+            self.client.publish(sig["topic"], payload)
             print(f"發送數據到 {sig['topic']}: {data[sig['name']]}")
         
         # 打印發送的數據
         print(f"發送數據: {data}")
     
+    def load_generator(self, devices=1, seed=None):
+        """建立負載產生器：以相同的訊號規格模擬 devices 台設備（int 或設備 ID 列表）
+
+        只有一台時使用本身的 device_id，其餘為 device001、device002 ...
+        """
+        if isinstance(devices, int):
+            devices = [self.device_id] if devices == 1 else device_ids(devices)
+        return LoadGenerator(
+            self.signals,
+            devices,
+            "jetsion/taguchi/{device}/{signal}",
+            self.client,
+            frame_format=self.frame_format,
+            decimals=[0 if sig["name"] == "rpm" else 2 for sig in self.signals],
+            seed=seed
+        )
+
     def run(self, interval=10):
         """運行感測器模擬"""
         try:
@@ -91,10 +137,13 @@ class SensorSimulator:
             self.client.disconnect()
 
 class MultiSensorSimulator:
-    def __init__(self):
-        self.client = mqtt.Client()
-        self.client.username_pw_set("jetsion", "jetsion")
-        self.client.connect("aiot.jetsion.com", 1883, 60)
+    def __init__(self, frame_format=None, transport=None, trace=False):
+        self.frame_format = frame_format
+        self.trace = trace
+        self.sequence = 0
+        self.frame_topic = f"iii/device001/{FRAME_TOPIC}"
+        self.client = transport if transport is not None else PahoTransport("aiot.jetsion.com")
+        self.client.connect()
         # 定義每個訊號的 topic 與數值範圍
         self.signals = [
             {"name": "D20", "topic": "iii/device001/D20", "min": 0.0, "spec_low": 1.0, "spec_high": 999.0, "max": 1000.0},
@@ -128,13 +177,43 @@ class MultiSensorSimulator:
             data[sig["name"]] = value
         return data
 
+    def next_trace(self):
+        """遞增序號並回傳本次採樣的追蹤資訊 (序號, [發送時間點])"""
+        self.sequence += 1
+        return self.sequence, [trace_clock()]
+
+    def trace_stats(self):
+        return {"sent": self.sequence}
+
     def publish_data(self):
         data = self.generate_signal_data()
+        trace = self.next_trace() if self.trace else None
+        if self.frame_format:
+            self.client.publish(self.frame_topic, encode_frame(data, frame_format=self.frame_format, trace=trace))
+            print(f"發送多訊號訊框到 {self.frame_topic}: {data}")
+            return
         for sig in self.signals:
-            self.client.publish(sig["topic"], str(data[sig["name"]]))
+            if trace is None:
+                payload = str(data[sig["name"]])
+            else:
+                payload = encode_frame({sig["name"]: data[sig["name"]]}, frame_format="json", trace=trace)
+            self.client.publish(sig["topic"], payload)
             print(f"發送數據到 {sig['topic']}: {data[sig['name']]}")
         print(f"發送多訊號數據: {data}")
 
+    def load_generator(self, devices=1, seed=None):
+        """建立負載產生器：以相同的訊號規格模擬 devices 台設備（int 或設備 ID 列表）"""
+        if isinstance(devices, int):
+            devices = device_ids(devices)
+        return LoadGenerator(
+            self.signals,
+            devices,
+            "iii/{device}/{signal}",
+            self.client,
+            frame_format=self.frame_format,
+            seed=seed
+        )
+
     def run(self, interval=10):
         try:
             while True:
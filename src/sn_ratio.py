@@ -0,0 +1,112 @@
+import math
+
+import numpy as np
+
+# 田口法 S/N 比（dB，皆以大者為佳）
+#
+#   stb   望小特性              -10·log10(Σy²/n)
+#   ltb   望大特性              -10·log10(Σ(1/y²)/n)
+#   ntb1  望目特性 I（只看變異） -10·log10(σ²)
+#   ntb2  望目特性 II           -10·log10(σ²/μ²)
+#
+# 四種特性都由同一組累計量求得：n、Σy、Σy² 與 Σ1/y²。RunningStats 以 Welford 形式
+# （平均值與離均差平方和）保存前兩者，另外累計 Σ1/y² 與數值為 0 的筆數，
+# 每筆數據 O(1) 更新，計算任何一種（或全部）S/N 比都不必再掃描緩衝區。
+# 筆數少於 2 時為 0；σ² 為 0 時為 inf；ntb2 平均值為 0 時為 0；ltb 有數值為 0 時為 -inf。
+
+SN_TYPES = ("stb", "ltb", "ntb1", "ntb2")
+
+DEFAULT_SN_TYPE = "ntb2"
+
+# 各感測器預設的 S/N 特性，未列出的感測器使用 DEFAULT_SN_TYPE
+DEFAULT_SN_TYPES = {
+    "vibration": "stb",
+    "rpm": "ntb2",
+}
+
+
+# 品質標示的門檻 {特性: (良好, 可接受)}，S/N 比大於門檻時分別標示為「良好」、「可接受」，否則為「不佳」。
+# 只有 ntb2（σ²/μ²）與量測單位無關，固定的 dB 門檻才有意義；stb、ltb、ntb1 的數值隨單位與量級平移
+# （例如 rpm 與 vibration 相差數十 dB），未列出的特性不標示品質。
+QUALITY_THRESHOLDS = {
+    "ntb2": (10.0, 5.0),
+}
+
+
+def check_sn_type(sn_type):
+    if sn_type not in SN_TYPES:
+        raise ValueError(f"不支援的 S/N 特性: {sn_type}（可用 {', '.join(SN_TYPES)}）")
+    return sn_type
+
+
+def sn_from_moments(sn_type, count, mean, variance, inv_square_mean=0.0, zeros=0):
+    """由累計量計算單一 S/N 比（未取捨位數）
+
+    variance 為母體變異數，inv_square_mean 為 Σ(1/y²)/n（不含數值為 0 的數據），zeros 為數值為 0 的筆數。
+    """
+    if count < 2:
+        return 0
+    if sn_type == "ntb2":
+        if mean == 0:
+            return 0
+        if variance == 0:
+            return float("inf")
+        return -10 * math.log10(variance / (mean ** 2))
+    if sn_type == "ntb1":
+        if variance == 0:
+            return float("inf")
+        return -10 * math.log10(variance)
+    if sn_type == "stb":
+        mean_square = mean * mean + variance
+        if mean_square == 0:
+            return float("inf")
+        return -10 * math.log10(mean_square)
+    if sn_type == "ltb":
+        if zeros:
+            return float("-inf")
+        # 移出數據時的浮點誤差可能讓累計量略小於 0
+        if inv_square_mean <= 0:
+            return float("inf")
+        return -10 * math.log10(inv_square_mean)
+    raise ValueError(f"不支援的 S/N 特性: {sn_type}")
+
+
+def sn_quality(sn_type, sn, thresholds=QUALITY_THRESHOLDS):
+    """依 QUALITY_THRESHOLDS 回傳品質標示，該特性沒有門檻時回傳 None"""
+    limits = thresholds.get(sn_type)
+    if limits is None:
+        return None
+    good, acceptable = limits
+    if sn > good:
+        return "良好"
+    if sn > acceptable:
+        return "可接受"
+    return "不佳"
+
+
+def sn_ratios(count, mean, variance, inv_square_mean=None, zeros=None, sn_type=DEFAULT_SN_TYPE):
+    """向量化計算 S/N 比，結果取到小數第 2 位（與 EdgeComputing.calculate_sn_ratio 相同）
+
+    sn_type 可為單一特性或與 count 等長的特性陣列；沒有提供 inv_square_mean 時 ltb 為 NaN。
+    """
+    count = np.asarray(count)
+    mean = np.asarray(mean, dtype=np.float64)
+    variance = np.asarray(variance, dtype=np.float64)
+    inv_square_mean = np.full(mean.shape, np.nan) if inv_square_mean is None else np.asarray(inv_square_mean, dtype=np.float64)
+    zeros = np.zeros(mean.shape) if zeros is None else np.asarray(zeros)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ntb2 = np.where(mean == 0, 0.0, np.where(variance == 0, np.inf, -10 * np.log10(variance / mean ** 2)))
+        ntb1 = np.where(variance == 0, np.inf, -10 * np.log10(variance))
+        mean_square = mean * mean + variance
+        stb = np.where(mean_square == 0, np.inf, -10 * np.log10(mean_square))
+        ltb = np.where(zeros > 0, -np.inf, np.where(inv_square_mean <= 0, np.inf, -10 * np.log10(inv_square_mean)))
+    by_type = {"stb": stb, "ltb": ltb, "ntb1": ntb1, "ntb2": ntb2}
+    if isinstance(sn_type, str):
+        sn = by_type[check_sn_type(sn_type)]
+    else:
+        sn_type = np.asarray(sn_type)
+        for name in np.unique(sn_type):
+            check_sn_type(name)
+        sn = np.select([sn_type == name for name in SN_TYPES], [by_type[name] for name in SN_TYPES])
+    sn = np.where(count < 2, 0.0, sn)
+    return np.round(sn, 2)
@@ -0,0 +1,287 @@
+import math
+import threading
+
+from streaming_stats import RunningStats
+
+# 統計製程管制（SPC）
+#
+# 每個 (設備, 感測器) stream 維護三種管制圖，每筆數據 O(1) 更新，狀態只有固定數量的數值：
+#   ewma     指數加權移動平均 z = λx + (1-λ)z，管制界限 μ0 ± L·σ·√(λ/(2-λ)·(1-(1-λ)^2i))，
+#            進入管制界限外時發出一次警報，回到界限內後才會再次發出
+#   cusum    雙邊累積和 C+ = max(0, C+ + x - μ0 - kσ)、C- = max(0, C- + μ0 - x - kσ)，
+#            超過 hσ 時發出 cusum_high / cusum_low 警報並歸零
+#   xbar / range  每 subgroup_size 筆為一個子群組，子群組平均值超出 X̿ ± A2·R̄ 或全距超出 D3·R̄ ~ D4·R̄ 時發出警報
+# 管制界限由前 baseline 筆數據（基準期）學習：μ0 與 σ 為基準期的平均值與標準差，X̿ 與 R̄ 為基準期各子群組的平均。
+# 基準期內不發出警報；需要重新學習時（例如調整控制因子後）呼叫 reset()。
+# 基準期的數據完全相同時 σ 與 R̄ 為 0，之後任何偏離都會發出警報。
+
+DEFAULT_BASELINE = 100
+DEFAULT_SUBGROUP_SIZE = 5
+DEFAULT_EWMA_LAMBDA = 0.2
+DEFAULT_EWMA_L = 3.0
+DEFAULT_CUSUM_K = 0.5
+DEFAULT_CUSUM_H = 5.0
+
+CHARTS = ("ewma", "cusum_high", "cusum_low", "xbar", "range")
+
+# X̄-R 管制圖係數 {子群組大小: (A2, D3, D4)}
+XBAR_R_CONSTANTS = {
+    2: (1.880, 0.0, 3.267),
+    3: (1.023, 0.0, 2.574),
+    4: (0.729, 0.0, 2.282),
+    5: (0.577, 0.0, 2.114),
+    6: (0.483, 0.0, 2.004),
+    7: (0.419, 0.076, 1.924),
+    8: (0.373, 0.136, 1.864),
+    9: (0.337, 0.184, 1.816),
+    10: (0.308, 0.223, 1.777),
+}
+
+
+class SPCConfig:
+    """管制圖參數，同一個 SPCMonitor 的所有 stream 共用"""
+
+    __slots__ = ("baseline", "subgroup_size", "ewma_lambda", "ewma_l", "cusum_k", "cusum_h")
+
+    def __init__(self, baseline=DEFAULT_BASELINE, subgroup_size=DEFAULT_SUBGROUP_SIZE,
+                 ewma_lambda=DEFAULT_EWMA_LAMBDA, ewma_l=DEFAULT_EWMA_L,
+                 cusum_k=DEFAULT_CUSUM_K, cusum_h=DEFAULT_CUSUM_H):
+        if subgroup_size not in XBAR_R_CONSTANTS:
+            raise ValueError(f"subgroup_size 必須介於 {min(XBAR_R_CONSTANTS)} 與 {max(XBAR_R_CONSTANTS)} 之間")
+        if baseline < 2 * subgroup_size:
+            raise ValueError("baseline 至少需要兩個子群組的數據")
+        if not 0 < ewma_lambda <= 1:
+            raise ValueError("ewma_lambda 必須介於 0 與 1 之間")
+        self.baseline = baseline
+        self.subgroup_size = subgroup_size
+        self.ewma_lambda = ewma_lambda
+        self.ewma_l = ewma_l
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+
+
+class SPCChart:
+    """單一 stream 的 EWMA、CUSUM 與 X̄-R 管制圖（見模組說明）"""
+
+    __slots__ = (
+        "config", "baseline_stats", "baseline_means", "baseline_ranges",
+        "center", "sigma", "xbar_limits", "range_limits",
+        "ewma", "ewma_decay", "ewma_alarm", "cusum_high", "cusum_low",
+        "subgroup_count", "subgroup_sum", "subgroup_min", "subgroup_max",
+        "samples", "alarms",
+    )
+
+    def __init__(self, config):
+        self.config = config
+        self.reset()
+
+    def reset(self):
+        """清除管制界限，重新進入基準期"""
+        self.baseline_stats = RunningStats()
+        self.baseline_means = RunningStats()
+        self.baseline_ranges = RunningStats()
+        self.center = None
+        self.sigma = None
+        self.xbar_limits = None
+        self.range_limits = None
+        self.ewma = 0.0
+        # (1-λ)^2i，用於計算 EWMA 隨筆數收斂的管制界限
+        self.ewma_decay = 1.0
+        self.ewma_alarm = False
+        self.cusum_high = 0.0
+        self.cusum_low = 0.0
+        self._reset_subgroup()
+        self.samples = 0
+        self.alarms = 0
+
+    def _reset_subgroup(self):
+        self.subgroup_count = 0
+        self.subgroup_sum = 0.0
+        self.subgroup_min = math.inf
+        self.subgroup_max = -math.inf
+
+    @property
+    def learning(self):
+        return self.center is None
+
+    def _learn(self):
+        config = self.config
+        self.center = self.baseline_stats.mean
+        self.sigma = self.baseline_stats.std
+        a2, d3, d4 = XBAR_R_CONSTANTS[config.subgroup_size]
+        grand_mean = self.baseline_means.mean
+        mean_range = self.baseline_ranges.mean
+        self.xbar_limits = (grand_mean - a2 * mean_range, grand_mean + a2 * mean_range)
+        self.range_limits = (d3 * mean_range, d4 * mean_range)
+        self.ewma = self.center
+        self.baseline_stats = self.baseline_means = self.baseline_ranges = None
+
+    def update(self, value):
+        """加入一筆數據，回傳這筆數據觸發的警報 [(管制圖, 統計量, 下限, 上限)]，通常為空串列"""
+        self.samples += 1
+        config = self.config
+        alarms = []
+
+        # 子群組（基準期與監控期共用）
+        self.subgroup_count += 1
+        self.subgroup_sum += value
+        if value < self.subgroup_min:
+            self.subgroup_min = value
+        if value > self.subgroup_max:
+            self.subgroup_max = value
+        subgroup = None
+        if self.subgroup_count == config.subgroup_size:
+            subgroup = (self.subgroup_sum / config.subgroup_size, self.subgroup_max - self.subgroup_min)
+            self._reset_subgroup()
+
+        if self.center is None:
+            self.baseline_stats.push(value)
+            if subgroup is not None:
+                self.baseline_means.push(subgroup[0])
+                self.baseline_ranges.push(subgroup[1])
+            if self.baseline_stats.count >= config.baseline and subgroup is not None:
+                self._learn()
+            return alarms
+
+        center, sigma = self.center, self.sigma
+
+        # EWMA
+        weight = config.ewma_lambda
+        self.ewma = weight * value + (1 - weight) * self.ewma
+        self.ewma_decay *= (1 - weight) ** 2
+        width = config.ewma_l * sigma * math.sqrt(weight / (2 - weight) * (1 - self.ewma_decay))
+        low, high = center - width, center + width
+        outside = self.ewma < low or self.ewma > high
+        if outside and not self.ewma_alarm:
+            alarms.append(("ewma", self.ewma, low, high))
+        self.ewma_alarm = outside
+
+        # 雙邊 CUSUM
+        slack = config.cusum_k * sigma
+        decision = config.cusum_h * sigma
+        self.cusum_high = max(0.0, self.cusum_high + value - center - slack)
+        self.cusum_low = max(0.0, self.cusum_low + center - value - slack)
+        if self.cusum_high > decision:
+            alarms.append(("cusum_high", self.cusum_high, 0.0, decision))
+            self.cusum_high = self.cusum_low = 0.0
+        elif self.cusum_low > decision:
+            alarms.append(("cusum_low", self.cusum_low, 0.0, decision))
+            self.cusum_high = self.cusum_low = 0.0
+
+        # X̄-R
+        if subgroup is not None:
+            mean, spread = subgroup
+            low, high = self.xbar_limits
+            if mean < low or mean > high:
+                alarms.append(("xbar", mean, low, high))
+            low, high = self.range_limits
+            if spread < low or spread > high:
+                alarms.append(("range", spread, low, high))
+
+        self.alarms += len(alarms)
+        return alarms
+
+    def state(self):
+        """回傳目前的管制界限與統計量，包含尚未湊滿的子群組"""
+        state = {"samples": self.samples, "alarms": self.alarms, "learning": self.learning}
+        if not self.learning:
+            state.update({
+                "center": self.center,
+                "sigma": self.sigma,
+                "ewma": self.ewma,
+                "ewma_decay": self.ewma_decay,
+                "ewma_alarm": self.ewma_alarm,
+                "cusum_high": self.cusum_high,
+                "cusum_low": self.cusum_low,
+                "xbar_limits": list(self.xbar_limits),
+                "range_limits": list(self.range_limits),
+                "subgroup": [self.subgroup_count, self.subgroup_sum, self.subgroup_min, self.subgroup_max]
+                if self.subgroup_count else None,
+            })
+        return state
+
+    def restore(self, state):
+        """由 state() 的結果還原管制界限、統計量與尚未湊滿的子群組；仍在基準期的 stream 重新學習"""
+        self.reset()
+        self.samples = state["samples"]
+        self.alarms = state["alarms"]
+        if state["learning"]:
+            return
+        self.center = state["center"]
+        self.sigma = state["sigma"]
+        self.xbar_limits = tuple(state["xbar_limits"])
+        self.range_limits = tuple(state["range_limits"])
+        self.ewma = state["ewma"]
+        self.ewma_decay = state["ewma_decay"]
+        self.ewma_alarm = state["ewma_alarm"]
+        self.cusum_high = state["cusum_high"]
+        self.cusum_low = state["cusum_low"]
+        subgroup = state.get("subgroup")
+        if subgroup:
+            self.subgroup_count, self.subgroup_sum, self.subgroup_min, self.subgroup_max = subgroup
+        self.baseline_stats = self.baseline_means = self.baseline_ranges = None
+
+
+class SPCMonitor:
+    """所有 (設備, 感測器) stream 的管制圖，收到 stream 的第一筆數據時建立
+
+    同一 stream 的數據由同一個 worker 依序送入（見 worker_pool.py），
+    只有建立 stream 與彙總統計需要鎖。
+    """
+
+    def __init__(self, config=None):
+        self.config = config or SPCConfig()
+        self.charts = {}
+        self.counts = {chart: 0 for chart in CHARTS}
+        self._lock = threading.Lock()
+
+    def chart(self, device_id, sensor_type):
+        key = (device_id, sensor_type)
+        chart = self.charts.get(key)
+        if chart is None:
+            with self._lock:
+                chart = self.charts.setdefault(key, SPCChart(self.config))
+        return chart
+
+    def update(self, device_id, sensor_type, value):
+        """更新 stream 的管制圖，回傳觸發的警報（見 SPCChart.update）"""
+        alarms = self.chart(device_id, sensor_type).update(value)
+        if alarms:
+            with self._lock:
+                for alarm in alarms:
+                    self.counts[alarm[0]] += 1
+        return alarms
+
+    def reset(self, device_id=None, sensor_type=None):
+        """重新學習管制界限；未指定設備或感測器時套用到所有符合的 stream"""
+        for (device, sensor), chart in list(self.charts.items()):
+            if device_id in (None, device) and sensor_type in (None, sensor):
+                chart.reset()
+
+    def states(self, device_id=None):
+        """回傳 stream 的 [(設備, 感測器, SPCChart.state())]，供 checkpoint 保存；device_id 只取該設備"""
+        return [
+            (device, sensor_type, chart.state())
+            for (device, sensor_type), chart in list(self.charts.items())
+            if device_id in (None, device)
+        ]
+
+    def restore(self, states):
+        """由 states() 的結果還原各 stream 的管制圖"""
+        for device_id, sensor_type, state in states:
+            self.chart(device_id, sensor_type).restore(state)
+
+    def stats(self):
+        """回傳 stream 數量、仍在基準期的數量、各管制圖的警報數與各設備的警報數"""
+        charts = list(self.charts.items())
+        devices = {}
+        for (device_id, _), chart in charts:
+            devices[device_id] = devices.get(device_id, 0) + chart.alarms
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "streams": len(charts),
+            "learning": sum(1 for _, chart in charts if chart.learning),
+            "alarms": counts,
+            "devices": devices,
+        }
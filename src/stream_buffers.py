@@ -0,0 +1,128 @@
+import threading
+import time
+
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+# UI 每個 stream 預設保留的筆數
+DEFAULT_DEPTH = 1000
+
+
+def local_datetime64(epoch):
+    """將 Unix 秒數陣列轉為本地時間的 datetime64[us]（Plotly 直接以此顯示時間軸）"""
+    epoch = np.asarray(epoch, dtype=np.float64)
+    if not len(epoch):
+        return epoch.astype("datetime64[us]")
+    offset = time.localtime(float(epoch[-1])).tm_gmtoff
+    return ((epoch + offset) * 1e6).astype("datetime64[us]")
+
+
+class StreamSnapshot:
+    """單一 stream 在某個時間點的內容（依時間排序的陣列複本）
+
+    timestamps 為本地時間的 datetime64[us]，可直接交給 Plotly；epoch 為原始的 Unix 秒數；
+    version 為複製當下的數據版本。
+    """
+
+    __slots__ = ("epoch", "values", "version")
+
+    def __init__(self, epoch, values, version=0):
+        self.epoch = epoch
+        self.values = values
+        self.version = version
+
+    @property
+    def timestamps(self):
+        return local_datetime64(self.epoch)
+
+    def last(self):
+        """回傳最後一筆 (時間戳, 數值)，沒有數據時為 None"""
+        if not len(self.values):
+            return None
+        return float(self.epoch[-1]), float(self.values[-1])
+
+    def __len__(self):
+        return len(self.values)
+
+
+class StreamBuffers:
+    """多個 stream 的固定容量時間序列緩衝區（每個 stream 一個 RingBuffer）
+
+    MQTT 執行緒寫入、Streamlit 執行緒讀取，兩者共用一把鎖；
+    snapshot() 在鎖內一次複製所有陣列，讀到的各 stream 彼此一致。
+    每個 stream 另有數據版本，每寫入一筆遞增，讀取端可據此判斷內容是否改變而不必複製陣列。
+    """
+
+    def __init__(self, depth=DEFAULT_DEPTH, names=()):
+        self.depth = int(depth)
+        self._buffers = {name: RingBuffer(self.depth) for name in names}
+        self._versions = dict.fromkeys(self._buffers, 0)
+        self._lock = threading.Lock()
+
+    def append(self, name, timestamp, value):
+        """加入一筆數據，不存在的 stream 自動建立"""
+        with self._lock:
+            buffer = self._buffers.get(name)
+            if buffer is None:
+                buffer = self._buffers[name] = RingBuffer(self.depth)
+                self._versions[name] = 0
+            buffer.append(value, timestamp)
+            self._versions[name] += 1
+
+    def backfill(self, name, timestamps, values):
+        """以歷史數據（依時間排序的陣列）補齊 stream，回傳補進的筆數
+
+        只取早於緩衝區第一筆的歷史數據放在前面，與啟動後收到的即時數據不重疊；
+        整批以向量化寫入，超過容量時保留最新的部分。
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            buffer = self._buffers.get(name)
+            if buffer is None:
+                buffer = self._buffers[name] = RingBuffer(self.depth)
+                self._versions[name] = 0
+            live = len(buffer)
+            if live:
+                keep = int(np.searchsorted(timestamps, buffer.timestamps()[0], side="left"))
+                timestamps = np.concatenate((timestamps[:keep], buffer.timestamps()))
+                values = np.concatenate((values[:keep], buffer.values()))
+                buffer.clear()
+            buffer.extend(values, timestamps)
+            added = len(buffer) - live
+            if added > 0:
+                self._versions[name] += 1
+            return max(added, 0)
+
+    def names(self):
+        with self._lock:
+            return list(self._buffers)
+
+    def snapshot(self, names=None):
+        """回傳 {stream: StreamSnapshot}，names 預設為所有 stream"""
+        with self._lock:
+            if names is None:
+                names = list(self._buffers)
+            snapshot = {}
+            for name in names:
+                buffer = self._buffers.get(name)
+                if buffer is None:
+                    snapshot[name] = StreamSnapshot(np.empty(0), np.empty(0))
+                else:
+                    snapshot[name] = StreamSnapshot(buffer.timestamps(), buffer.values(), self._versions[name])
+            return snapshot
+
+    def versions(self):
+        """回傳各 stream 的數據版本 {stream: 版本}"""
+        with self._lock:
+            return dict(self._versions)
+
+    def latest(self):
+        """回傳各 stream 的最後一筆 {stream: (時間戳, 數值)}，沒有數據的 stream 不列出"""
+        with self._lock:
+            return {name: buffer.last() for name, buffer in self._buffers.items() if len(buffer)}
+
+    def lengths(self):
+        with self._lock:
+            return {name: len(buffer) for name, buffer in self._buffers.items()}
@@ -0,0 +1,142 @@
+from collections import deque
+import math
+
+import numpy as np
+
+
+class RunningStats:
+    """以 Welford 演算法增量維護平均值與變異數
+
+    每次更新皆為 O(1)，不需保存歷史數據；
+    variance 為母體變異數，與 np.std(values) ** 2 一致。
+    搭配滑動視窗時以 remove() 移出過期數據，removals 記錄移出次數，
+    累積到一定數量後可用 rebuild() 從視窗內容重新計算以消除浮點誤差。
+    另外累計 Σ1/y²（inv_square_sum，不含 0）與數值為 0 的筆數（zeros），供望大特性 S/N 比使用。
+    """
+
+    __slots__ = ("count", "mean", "m2", "inv_square_sum", "zeros", "removals")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.inv_square_sum = 0.0
+        self.zeros = 0
+        self.removals = 0
+
+    def push(self, value):
+        """加入一筆數據"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value:
+            self.inv_square_sum += 1.0 / (value * value)
+        else:
+            self.zeros += 1
+
+    def remove(self, value):
+        """移出一筆先前加入的數據（Welford 反向更新）"""
+        if self.count <= 1:
+            self.reset()
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (value - self.mean)
+        if value:
+            self.inv_square_sum -= 1.0 / (value * value)
+        else:
+            self.zeros -= 1
+        self.removals += 1
+
+    def rebuild(self, values):
+        """以目前視窗內的全部數據重新計算統計量"""
+        values = np.asarray(values, dtype=np.float64)
+        self.count = len(values)
+        self.removals = 0
+        if self.count == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            self.inv_square_sum = 0.0
+            self.zeros = 0
+            return
+        self.mean = float(np.mean(values))
+        self.m2 = float(np.sum((values - self.mean) ** 2))
+        nonzero = values[values != 0]
+        self.inv_square_sum = float(np.sum(1.0 / (nonzero * nonzero)))
+        self.zeros = self.count - len(nonzero)
+
+    def reset(self):
+        """清除所有統計量"""
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.inv_square_sum = 0.0
+        self.zeros = 0
+        self.removals = 0
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        # 浮點誤差可能讓 m2 略小於 0
+        return max(self.m2, 0.0) / self.count
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def inv_square_mean(self):
+        """Σ(1/y²)/n"""
+        return self.inv_square_sum / self.count if self.count else 0.0
+
+    def __len__(self):
+        return self.count
+
+
+class MovingAverage:
+    """固定長度的移動平均視窗，每次更新為 O(1)
+
+    replace_last() 用來把平滑後的數值寫回視窗，
+    使下一次平均建立在已平滑的序列上（與原本覆寫緩衝區最後一筆的行為相同）。
+    """
+
+    __slots__ = ("window_size", "_window", "_sum")
+
+    def __init__(self, window_size=3):
+        if window_size < 1:
+            raise ValueError("window_size 必須大於 0")
+        self.window_size = window_size
+        self._window = deque(maxlen=window_size)
+        self._sum = 0.0
+
+    def push(self, value):
+        """加入一筆數據，視窗已滿時移除最舊的一筆"""
+        if len(self._window) == self.window_size:
+            self._sum -= self._window[0]
+        self._window.append(value)
+        self._sum += value
+
+    def replace_last(self, value):
+        """以新數值取代視窗中最後一筆"""
+        self._sum += value - self._window[-1]
+        self._window[-1] = value
+
+    def reset(self):
+        self._window.clear()
+        self._sum = 0.0
+
+    @property
+    def full(self):
+        return len(self._window) == self.window_size
+
+    @property
+    def mean(self):
+        if not self._window:
+            return 0.0
+        return self._sum / len(self._window)
+
+    def __len__(self):
+        return len(self._window)
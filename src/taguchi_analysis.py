@@ -0,0 +1,189 @@
+import numpy as np
+
+# 田口法分析：回應表、主效果與變異數分析（ANOVA）
+#
+# 所有函式都以 NumPy 陣列運算處理，回應值的形狀為 (..., runs, responses)：
+#   runs      - 實驗次數（直交表的列）
+#   responses - 回應變數數量（例如每個感測器的 S/N 比）
+#   ...       - 可選的批次維度（例如數千組實驗一次分析）
+# 直交表 design 的形狀為 (runs, factors)，水準以 1 起算，與 EdgeComputing.experiment_design 相同。
+
+
+def design_matrix(experiment_design, factors=None):
+    """將 [{"A": 1, "B": 2, ...}, ...] 形式的實驗設計轉為 (runs, factors) 整數陣列
+
+    回傳 (design, factors)，factors 為因子名稱列表，預設依第一列的鍵排序。
+    """
+    if factors is None:
+        factors = sorted(experiment_design[0])
+    design = np.array([[int(run[factor]) for factor in factors] for run in experiment_design], dtype=np.int16)
+    return design, list(factors)
+
+
+def _as_design(design):
+    design = np.asarray(design)
+    if design.ndim != 2:
+        raise ValueError("design 必須為 (runs, factors) 陣列")
+    if design.min() < 1:
+        raise ValueError("水準必須從 1 起算")
+    return design.astype(np.intp)
+
+
+def level_weights(design):
+    """回傳 (factors, levels, runs) 的平均權重矩陣與各水準出現次數 (factors, levels)
+
+    weights[f, l, r] = 1 / n(f, l)（第 r 次實驗的因子 f 為水準 l+1 時），其餘為 0，
+    因此 responses 與 weights 做一次矩陣乘法即可得到所有因子、水準的平均值。
+    """
+    design = _as_design(design)
+    runs, factor_count = design.shape
+    level_count = int(design.max())
+    indicator = np.zeros((factor_count, level_count, runs))
+    indicator[np.arange(factor_count)[:, None], design.T - 1, np.arange(runs)[None, :]] = 1.0
+    counts = indicator.sum(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(counts[..., None] > 0, indicator / counts[..., None], 0.0)
+    return weights, counts
+
+
+def response_table(design, responses):
+    """回傳各因子、各水準的平均回應值，形狀 (..., factors, levels, responses)
+
+    混合水準直交表中不存在的水準為 NaN。
+    """
+    responses = np.asarray(responses, dtype=np.float64)
+    weights, counts = level_weights(design)
+    # (..., runs, responses) x (factors, levels, runs) -> (..., factors, levels, responses)
+    table = np.einsum("...rk,flr->...flk", responses, weights, optimize=True)
+    missing = counts == 0
+    if missing.any():
+        table[..., missing, :] = np.nan
+    return table
+
+
+def main_effects(table, larger_is_better=True):
+    """由回應表計算各因子的 delta（最大與最小水準平均之差）、排名與最佳水準
+
+    排名 1 為影響最大的因子；最佳水準以 1 起算，
+    S/N 比應使用 larger_is_better=True。
+    """
+    table = np.asarray(table, dtype=np.float64)
+    delta = np.nanmax(table, axis=-2) - np.nanmin(table, axis=-2)
+    order = np.argsort(-delta, axis=-2, kind="stable")
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(1, delta.shape[-2] + 1).reshape(-1, 1), axis=-2)
+    filled = np.where(np.isnan(table), -np.inf if larger_is_better else np.inf, table)
+    best = (np.argmax(filled, axis=-2) if larger_is_better else np.argmin(filled, axis=-2)) + 1
+    return {"delta": delta, "rank": rank, "best_level": best}
+
+
+def _pool_mask(ss, dof, error_dof, pool, total_dof):
+    """決定各回應變數要併入誤差項的因子，回傳 (..., factors, responses) 布林陣列"""
+    mask = np.zeros(ss.shape, dtype=bool)
+    if pool is None:
+        return mask
+    if isinstance(pool, str) and pool != "auto":
+        raise ValueError(f"不支援的 pool 設定: {pool}")
+    order = np.argsort(ss, axis=-2, kind="stable")
+    sorted_dof = np.take_along_axis(np.broadcast_to(dof[:, None], ss.shape), order, axis=-2)
+    if pool == "auto":
+        # 依 SS 由小到大併入誤差項，直到誤差自由度達總自由度的一半（誤差自由度為 0 時至少併入一個因子）
+        target = max(total_dof / 2.0, 1.0)
+        before = error_dof + np.cumsum(sorted_dof, axis=-2) - sorted_dof
+        pooled_sorted = before < target
+    elif isinstance(pool, (int, np.integer)):
+        pooled_sorted = np.zeros(ss.shape, dtype=bool)
+        pooled_sorted[..., :int(pool), :] = True
+    else:
+        raise ValueError(f"不支援的 pool 設定: {pool}")
+    np.put_along_axis(mask, order, pooled_sorted, axis=-2)
+    return mask
+
+
+def anova(design, responses, pool="auto"):
+    """變異數分析
+
+    pool:
+        None   - 不併入誤差項
+        "auto" - 依 SS 由小到大併入，直到誤差自由度達總自由度的一半
+        整數 k - 每個回應變數併入 SS 最小的 k 個因子
+    回傳的陣列形狀為 (..., factors, responses)，誤差項為 (..., responses)：
+        ss, dof, ms, f_ratio, ss_percent（SS 佔總變異百分比）,
+        contribution（扣除誤差後的純貢獻率 %）, pooled,
+        error_ss, error_dof, error_ms, error_contribution, total_ss, total_dof
+    """
+    responses = np.asarray(responses, dtype=np.float64)
+    design = _as_design(design)
+    runs = design.shape[0]
+    weights, counts = level_weights(design)
+    table = np.einsum("...rk,flr->...flk", responses, weights, optimize=True)
+
+    grand_mean = responses.mean(axis=-2, keepdims=True)
+    total_ss = ((responses - grand_mean) ** 2).sum(axis=-2)
+    total_dof = runs - 1
+
+    # SS_f = Σ_l n(f, l) * (平均(f, l) - 總平均)^2
+    deviation = table - grand_mean[..., None, :]
+    ss = np.einsum("fl,...flk->...fk", counts, deviation ** 2, optimize=True)
+    dof = (counts > 0).sum(axis=1) - 1
+
+    residual_ss = np.maximum(total_ss - ss.sum(axis=-2), 0.0)
+    residual_dof = total_dof - int(dof.sum())
+    if residual_dof < 0:
+        raise ValueError("因子自由度總和超過實驗次數")
+
+    pooled = _pool_mask(ss, dof, residual_dof, pool, total_dof)
+    dof_full = np.broadcast_to(dof[:, None], ss.shape)
+    error_ss = residual_ss + np.where(pooled, ss, 0.0).sum(axis=-2)
+    error_dof = residual_dof + np.where(pooled, dof_full, 0).sum(axis=-2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ms = ss / dof_full
+        error_ms = np.where(error_dof > 0, error_ss / error_dof, np.nan)
+        f_ratio = np.where(pooled, np.nan, ms / error_ms[..., None, :])
+        ss_percent = np.where(total_ss[..., None, :] > 0, ss / total_ss[..., None, :] * 100, 0.0)
+        # 純貢獻率：SS_f' = SS_f - dof_f * MS_e，誤差項吸收扣除的部分
+        pure_ss = np.where(pooled, 0.0, np.maximum(ss - dof_full * np.nan_to_num(error_ms)[..., None, :], 0.0))
+        contribution = np.where(total_ss[..., None, :] > 0, pure_ss / total_ss[..., None, :] * 100, 0.0)
+    error_contribution = np.where(total_ss > 0, 100.0 - contribution.sum(axis=-2), 0.0)
+
+    return {
+        "ss": ss,
+        "dof": dof,
+        "ms": ms,
+        "f_ratio": f_ratio,
+        "ss_percent": ss_percent,
+        "contribution": contribution,
+        "pooled": pooled,
+        "error_ss": error_ss,
+        "error_dof": error_dof,
+        "error_ms": error_ms,
+        "error_contribution": error_contribution,
+        "total_ss": total_ss,
+        "total_dof": total_dof,
+    }
+
+
+def analyze(design, sn_ratios, means=None, pool="auto"):
+    """完整的田口法分析：S/N 比（與平均值）的回應表、主效果與 ANOVA
+
+    sn_ratios / means 形狀為 (..., runs, responses)；S/N 比以大者為佳。
+    """
+    sn_table = response_table(design, sn_ratios)
+    result = {
+        "sn": {
+            "response_table": sn_table,
+            **main_effects(sn_table, larger_is_better=True),
+            "anova": anova(design, sn_ratios, pool),
+        }
+    }
+    if means is not None:
+        mean_table = response_table(design, means)
+        effects = main_effects(mean_table)
+        result["mean"] = {
+            "response_table": mean_table,
+            "delta": effects["delta"],
+            "rank": effects["rank"],
+            "anova": anova(design, means, pool),
+        }
+    return result
@@ -0,0 +1,285 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+# 記錄格式：固定寬度的 (時間戳, 數值)，皆為 little-endian float64
+RECORD_DTYPE = np.dtype([("ts", "<f8"), ("value", "<f8")])
+
+# 每個分段檔的預設記錄數（65536 筆 = 1 MB）
+DEFAULT_SEGMENT_SIZE = 65536
+
+INDEX_FILE = "index.json"
+
+# 寫入端定期呼叫 flush() 的預設間隔（秒），程序異常結束時最多遺失這段時間內的索引更新
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class ColumnStream:
+    """單一設備/感測器的只追加時間序列
+
+    數據分成固定大小的分段檔（seg_000000.bin ...），每個分段檔預先配置並以
+    np.memmap 映射，寫入時直接寫進映射的記憶體；index.json 記錄各分段的
+    時間範圍與筆數，查詢時先以時間範圍挑出分段，再在分段內以二分搜尋定位。
+    時間戳應為非遞減，時間戳 0 代表尚未寫入的位置。
+    append 由寫入端的單一執行緒呼叫，flush() 可由其他執行緒（例如定期寫回的背景執行緒）同時呼叫：
+    換新分段、寫回映射與寫入索引都持有 _lock。
+    """
+
+    def __init__(self, path, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.path = path
+        self.segment_size = segment_size
+        os.makedirs(path, exist_ok=True)
+        # 各分段的 [檔名, 第一筆時間戳, 最後一筆時間戳, 筆數]
+        self.segments = []
+        self._first_ts = []
+        self._write_map = None
+        self._read_maps = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load_index()
+
+    # ---- 索引 ----
+    def _index_path(self):
+        return os.path.join(self.path, INDEX_FILE)
+
+    def _load_index(self):
+        if os.path.exists(self._index_path()):
+            with open(self._index_path(), encoding="utf-8") as f:
+                index = json.load(f)
+            self.segment_size = index.get("segment_size", self.segment_size)
+            self.segments = [list(segment) for segment in index["segments"]]
+        if self.segments:
+            # 最後一個分段可能在上次寫入索引後又寫入數據，依時間戳重新計算筆數
+            last = self.segments[-1]
+            column = self._open(last[0], "r")["ts"]
+            count = int(np.count_nonzero(column))
+            if count:
+                last[1] = float(column[0])
+                last[2] = float(column[count - 1])
+            last[3] = count
+        self._first_ts = [segment[1] for segment in self.segments]
+
+    def _save_index(self):
+        """寫入索引（呼叫端持有 _lock）
+
+        先清除標記並複製索引，寫入期間的新數據會讓下一次 flush() 再寫一次；
+        暫存檔名不重複，其他程序（例如同時記錄歷史數據的 UI）寫入同一個索引時也不會互相覆蓋暫存檔。
+        """
+        self._dirty = False
+        segments = [list(segment) for segment in list(self.segments)]
+        fd, tmp_path = tempfile.mkstemp(prefix=INDEX_FILE + ".", suffix=".tmp", dir=self.path)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"segment_size": self.segment_size, "segments": segments}, f)
+            os.replace(tmp_path, self._index_path())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ---- 分段檔 ----
+    def _open(self, name, mode):
+        return np.memmap(os.path.join(self.path, name), dtype=RECORD_DTYPE, mode=mode, shape=(self.segment_size,))
+
+    def _new_segment(self):
+        name = f"seg_{len(self.segments):06d}.bin"
+        self._write_map = self._open(name, "w+")
+        self.segments.append([name, 0.0, 0.0, 0])
+        self._first_ts.append(0.0)
+        self._save_index()
+
+    def _writable(self):
+        if not self.segments or self.segments[-1][3] >= self.segment_size:
+            with self._lock:
+                if self._write_map is not None:
+                    self._write_map.flush()
+                    self._read_maps.pop(self.segments[-1][0], None)
+                self._new_segment()
+        elif self._write_map is None:
+            with self._lock:
+                self._write_map = self._open(self.segments[-1][0], "r+")
+        return self._write_map, self.segments[-1]
+
+    def _column(self, index):
+        """回傳分段 index 已寫入部分的唯讀映射（不複製）"""
+        name, _, _, count = self.segments[index]
+        if index == len(self.segments) - 1 and self._write_map is not None:
+            return self._write_map[:count]
+        segment_map = self._read_maps.get(name)
+        if segment_map is None:
+            segment_map = self._open(name, "r")
+            self._read_maps[name] = segment_map
+        return segment_map[:count]
+
+    # ---- 寫入 ----
+    def append(self, timestamp, value):
+        """追加一筆數據"""
+        segment_map, segment = self._writable()
+        position = segment[3]
+        segment_map[position] = (timestamp, value)
+        if position == 0:
+            segment[1] = timestamp
+            self._first_ts[-1] = timestamp
+        segment[2] = timestamp
+        segment[3] = position + 1
+        self._dirty = True
+
+    def append_many(self, timestamps, values):
+        """批次追加數據（向量化寫入）"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        written = 0
+        while written < len(timestamps):
+            segment_map, segment = self._writable()
+            position = segment[3]
+            count = min(self.segment_size - position, len(timestamps) - written)
+            segment_map["ts"][position:position + count] = timestamps[written:written + count]
+            segment_map["value"][position:position + count] = values[written:written + count]
+            if position == 0:
+                segment[1] = float(timestamps[written])
+                self._first_ts[-1] = segment[1]
+            segment[2] = float(timestamps[written + count - 1])
+            segment[3] = position + count
+            written += count
+        self._dirty = True
+
+    def flush(self):
+        """將映射的數據寫回磁碟並更新索引"""
+        with self._lock:
+            if self._write_map is not None:
+                self._write_map.flush()
+            if self._dirty:
+                self._save_index()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._write_map = None
+            self._read_maps = {}
+
+    # ---- 查詢 ----
+    def __len__(self):
+        return sum(segment[3] for segment in self.segments)
+
+    def time_range(self):
+        """回傳 (最早時間戳, 最新時間戳)，沒有數據時回傳 None"""
+        if not self.segments or not self.segments[0][3]:
+            return None
+        return self.segments[0][1], self.segments[-1][2]
+
+    def iter_chunks(self, start=None, end=None):
+        """依分段逐一回傳 [start, end) 範圍內的記錄（memmap 視圖，不複製）"""
+        first = 0
+        if start is not None:
+            first = max(bisect.bisect_right(self._first_ts, start) - 1, 0)
+        for index in range(first, len(self.segments)):
+            _, first_ts, last_ts, count = self.segments[index]
+            if not count:
+                continue
+            if end is not None and first_ts >= end:
+                break
+            if start is not None and last_ts < start:
+                continue
+            column = self._column(index)
+            low = 0 if start is None else int(np.searchsorted(column["ts"], start, side="left"))
+            high = count if end is None else int(np.searchsorted(column["ts"], end, side="left"))
+            if high > low:
+                yield column[low:high]
+
+    def read(self, start=None, end=None):
+        """回傳 [start, end) 範圍內的 (時間戳陣列, 數值陣列)
+
+        範圍只落在單一分段時直接回傳 memmap 視圖，跨分段時合併為新陣列。
+        """
+        chunks = list(self.iter_chunks(start, end))
+        if not chunks:
+            return np.empty(0), np.empty(0)
+        if len(chunks) == 1:
+            return chunks[0]["ts"], chunks[0]["value"]
+        records = np.concatenate(chunks)
+        return records["ts"], records["value"]
+
+    def latest(self, count):
+        """回傳最新 count 筆的 (時間戳陣列, 數值陣列)"""
+        chunks = []
+        remaining = count
+        for index in range(len(self.segments) - 1, -1, -1):
+            if remaining <= 0:
+                break
+            column = self._column(index)
+            chunks.append(column[max(len(column) - remaining, 0):])
+            remaining -= len(chunks[-1])
+        if not chunks:
+            return np.empty(0), np.empty(0)
+        records = chunks[0] if len(chunks) == 1 else np.concatenate(chunks[::-1])
+        return records["ts"], records["value"]
+
+
+class TimeSeriesStore:
+    """以設備/感測器分欄的只追加時間序列儲存區
+
+    目錄結構為 <root>/<device_id>/<sensor>/，sensor 可包含 "/"（例如 "sn_ratio/pressure"）。
+    同一個 stream 同時只能由一個執行緒寫入；EdgeComputing 的 worker 依設備分區，符合此條件。
+    """
+
+    def __init__(self, root, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.root = root
+        self.segment_size = segment_size
+        self._streams = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _stream_path(self, device_id, sensor):
+        parts = [device_id] + sensor.split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"不合法的 stream 名稱: {device_id}/{sensor}")
+        return os.path.join(self.root, *parts)
+
+    def stream(self, device_id, sensor):
+        """取得 stream，不存在時建立"""
+        key = (device_id, sensor)
+        stream = self._streams.get(key)
+        if stream is None:
+            with self._lock:
+                stream = self._streams.get(key)
+                if stream is None:
+                    stream = ColumnStream(self._stream_path(device_id, sensor), self.segment_size)
+                    self._streams[key] = stream
+        return stream
+
+    def has_stream(self, device_id, sensor):
+        return os.path.exists(os.path.join(self._stream_path(device_id, sensor), INDEX_FILE))
+
+    def streams(self):
+        """列出儲存區中所有 (device_id, sensor)"""
+        found = []
+        for directory, _, files in os.walk(self.root):
+            if INDEX_FILE in files:
+                parts = os.path.relpath(directory, self.root).split(os.sep)
+                found.append((parts[0], "/".join(parts[1:])))
+        return sorted(found)
+
+    def append(self, device_id, sensor, timestamp, value):
+        self.stream(device_id, sensor).append(timestamp, value)
+
+    def append_many(self, device_id, sensor, timestamps, values):
+        self.stream(device_id, sensor).append_many(timestamps, values)
+
+    def read(self, device_id, sensor, start=None, end=None):
+        return self.stream(device_id, sensor).read(start, end)
+
+    def latest(self, device_id, sensor, count):
+        return self.stream(device_id, sensor).latest(count)
+
+    def flush(self):
+        for stream in list(self._streams.values()):
+            stream.flush()
+
+    def close(self):
+        for stream in list(self._streams.values()):
+            stream.close()
+        self._streams = {}
@@ -0,0 +1,171 @@
+import threading
+
+# MQTT 主題路由
+#
+# 處理函式以 MQTT 主題過濾器註冊，過濾器的每一層可為：
+#   文字        必須完全相同
+#   {名稱}      單層萬用字元（同 +），該層內容以「名稱」擷取，例如 {device}、{sensor}
+#   +           單層萬用字元，不擷取
+#   #           多層萬用字元，只能在最後一層，其餘各層以 "/" 連接後擷取為 "#"
+# 過濾器編譯為依層展開的字典樹，比對時主題只切割一次；同一主題有多個過濾器符合時，
+# 每一層依文字、單層萬用字元、多層萬用字元的順序優先，因此較具體的過濾器先符合，與註冊順序無關。
+# 比對結果以主題為鍵快取，設備與感測器數量固定時，每則訊息的路由成本是一次字典查詢，
+# 不隨註冊的過濾器數量增加。
+
+# 比對結果快取的上限，超過時清空重建（主題數量異常增加時避免無限制佔用記憶體）
+DEFAULT_CACHE_SIZE = 4096
+
+
+class Route:
+    """一個已註冊的過濾器：category 為計數器使用的主題分類"""
+
+    __slots__ = ("topic_filter", "handler", "category", "captures")
+
+    def __init__(self, topic_filter, handler, category, captures):
+        self.topic_filter = topic_filter
+        self.handler = handler
+        self.category = category
+        # (層索引, 名稱)
+        self.captures = captures
+
+    def params(self, levels):
+        params = {name: levels[index] for index, name in self.captures if name != "#"}
+        if self.captures and self.captures[-1][1] == "#":
+            params["#"] = "/".join(levels[self.captures[-1][0]:])
+        return params
+
+    def __repr__(self):
+        return f"Route({self.topic_filter!r}, category={self.category!r})"
+
+
+class RoutedMessage:
+    """路由後的訊息：params 為擷取的主題欄位，text 為解碼一次後快取的 payload 字串"""
+
+    __slots__ = ("topic", "payload", "params", "route", "_text")
+
+    def __init__(self, topic, payload, params, route):
+        self.topic = topic
+        self.payload = payload
+        self.params = params
+        self.route = route
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            payload = self.payload
+            self._text = payload if isinstance(payload, str) else payload.decode(errors="replace")
+        return self._text
+
+    def __getitem__(self, name):
+        return self.params[name]
+
+
+class _Node:
+    __slots__ = ("children", "single", "multi", "route")
+
+    def __init__(self):
+        self.children = {}
+        self.single = None
+        self.multi = None
+        self.route = None
+
+
+class TopicRouter:
+    """以主題過濾器分派 MQTT 訊息（見模組說明）
+
+    add() 與 match() 可由不同執行緒呼叫；快取在註冊新的過濾器時清空。
+    """
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self.routes = []
+        self.cache_size = cache_size
+        self._root = _Node()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def add(self, topic_filter, handler, category=None):
+        """註冊過濾器，回傳 Route；同一過濾器（忽略擷取名稱）重複註冊時拋出 ValueError"""
+        levels = topic_filter.split("/")
+        captures = []
+        node = self._root
+        with self._lock:
+            for index, level in enumerate(levels):
+                if level == "#":
+                    if index != len(levels) - 1:
+                        raise ValueError(f"# 只能在過濾器的最後一層: {topic_filter}")
+                    captures.append((index, "#"))
+                    if node.multi is None:
+                        node.multi = _Node()
+                    node = node.multi
+                elif level == "+" or (level.startswith("{") and level.endswith("}")):
+                    if level != "+":
+                        captures.append((index, level[1:-1]))
+                    if node.single is None:
+                        node.single = _Node()
+                    node = node.single
+                elif "+" in level or "#" in level:
+                    raise ValueError(f"萬用字元必須佔滿整層: {topic_filter}")
+                else:
+                    node = node.children.setdefault(level, _Node())
+            if node.route is not None:
+                raise ValueError(f"過濾器已註冊: {topic_filter}（{node.route.topic_filter}）")
+            route = node.route = Route(topic_filter, handler, category, tuple(captures))
+            self.routes.append(route)
+            self._cache.clear()
+        return route
+
+    def route(self, topic_filter, category=None):
+        """裝飾器形式的 add()"""
+        def decorator(handler):
+            self.add(topic_filter, handler, category)
+            return handler
+        return decorator
+
+    def _find(self, node, levels, index):
+        if index == len(levels):
+            if node.route is not None:
+                return node.route
+            # "a/#" 也符合 "a"（MQTT 規範）
+            if node.multi is not None:
+                return node.multi.route
+            return None
+        child = node.children.get(levels[index])
+        if child is not None:
+            route = self._find(child, levels, index + 1)
+            if route is not None:
+                return route
+        if node.single is not None:
+            route = self._find(node.single, levels, index + 1)
+            if route is not None:
+                return route
+        if node.multi is not None:
+            return node.multi.route
+        return None
+
+    def match(self, topic):
+        """回傳 (Route, 擷取的欄位)，沒有符合的過濾器時為 (None, None)"""
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+        levels = topic.split("/")
+        route = self._find(self._root, levels, 0)
+        result = (route, route.params(levels)) if route is not None else (None, None)
+        with self._lock:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[topic] = result
+        return result
+
+    def dispatch(self, topic, payload, *args):
+        """呼叫符合的處理函式 handler(RoutedMessage, *args)，回傳符合的 Route（沒有時為 None）"""
+        route, params = self.match(topic)
+        if route is not None:
+            route.handler(RoutedMessage(topic, payload, params, route), *args)
+        return route
+
+    def category(self, topic, default="other"):
+        route, _ = self.match(topic)
+        if route is None or route.category is None:
+            return default
+        return route.category
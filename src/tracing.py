@@ -0,0 +1,99 @@
+import threading
+import time
+
+from edge_metrics import LatencyHistogram
+
+# 端到端延遲追蹤
+#
+# 模擬器在每次採樣附上序號與發送時間點，邊緣計算層在轉發 S/N 比時依序附加接收與發布的時間點，
+# UI 收到時以最後一個時間點計算各段（hop）延遲。時間點以單調時鐘記錄，不受系統校時影響，
+# 但只有在同一台主機上的元件之間才可直接相減；跨主機時各段延遲會包含時鐘差。
+
+trace_clock = time.monotonic
+
+# 經過邊緣計算層的 S/N 比：感測器 -> 邊緣 -> (處理) -> UI
+SN_RATIO_HOPS = ("sensor_edge", "edge", "edge_ui")
+
+
+class SequenceTracker:
+    """依序號偵測遺失與亂序的訊息
+
+    每個 stream（例如主題）獨立追蹤最後的序號；序號跳號時累計遺失數量，
+    小於等於最後序號的訊息計為亂序，並從遺失數量中扣回（遲到而非遺失）。
+    序號回到 1 視為發送端重新啟動，重新開始追蹤。
+    count_gaps=False 時只計算亂序，用於刻意不逐筆轉發的 stream。
+    """
+
+    __slots__ = ("count_gaps", "last", "received", "lost", "out_of_order")
+
+    def __init__(self, count_gaps=True):
+        self.count_gaps = count_gaps
+        self.reset()
+
+    def reset(self):
+        self.last = {}
+        self.received = 0
+        self.lost = 0
+        self.out_of_order = 0
+
+    def track(self, stream, seq):
+        self.received += 1
+        last = self.last.get(stream)
+        if last is None or (seq == 1 and last > 1):
+            self.last[stream] = seq
+            return
+        if seq > last:
+            if self.count_gaps:
+                self.lost += seq - last - 1
+            self.last[stream] = seq
+        else:
+            self.out_of_order += 1
+            if self.count_gaps and self.lost:
+                self.lost -= 1
+
+    def snapshot(self):
+        return {
+            "streams": len(self.last),
+            "received": self.received,
+            "lost": self.lost,
+            "out_of_order": self.out_of_order,
+        }
+
+
+class TraceStats:
+    """各段延遲與端到端延遲的直方圖，以及序號統計
+
+    hops 為各段名稱，長度等於收到的時間點數量：第 i 段為第 i 個時間點到下一個時間點
+    （最後一段到本地接收時間）。記錄時不加鎖，與 EdgeMetrics 相同。
+    """
+
+    def __init__(self, hops, count_gaps=True):
+        self.hops = tuple(hops)
+        self.latency = {hop: LatencyHistogram() for hop in self.hops}
+        self.latency["end_to_end"] = LatencyHistogram()
+        self.sequences = SequenceTracker(count_gaps)
+        self._lock = threading.Lock()
+
+    def record(self, stream, trace, received=None):
+        """記錄一筆追蹤資訊 (序號, [時間點, ...])，received 預設為目前的 trace_clock()"""
+        if received is None:
+            received = trace_clock()
+        seq, stamps = trace
+        self.sequences.track(stream, seq)
+        points = list(stamps[:len(self.hops)]) + [received]
+        for hop, start, end in zip(self.hops, points, points[1:]):
+            self.latency[hop].record(max(int((end - start) * 1e9), 0))
+        self.latency["end_to_end"].record(max(int((received - points[0]) * 1e9), 0))
+
+    def reset(self):
+        with self._lock:
+            for histogram in self.latency.values():
+                histogram.reset()
+            self.sequences.reset()
+
+    def snapshot(self):
+        """回傳序號統計與各段延遲摘要（µs，含 p50/p95/p99）"""
+        with self._lock:
+            snapshot = self.sequences.snapshot()
+            snapshot["latency"] = {hop: histogram.snapshot() for hop, histogram in self.latency.items()}
+            return snapshot
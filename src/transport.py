@@ -0,0 +1,294 @@
+from collections import deque
+import logging
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# MQTT 傳輸層
+#
+# EdgeComputing、SensorSimulator、MultiSensorSimulator 與 ui.MQTTManager
+# 都透過 transport 參數取得傳輸層物件，介面與 paho.mqtt.client.Client 相同的子集：
+#   on_connect / on_disconnect / on_message 回調
+#   connect()、disconnect()、loop_start()、loop_stop()
+#   subscribe(topic)、unsubscribe(topic)、publish(topic, payload)
+# PahoTransport 連線到實際的 broker；InMemoryTransport 則在同一個程序內
+# 透過 InMemoryBroker 互相傳遞訊息，可在沒有網路的環境下進行壓力與延遲測試。
+# 與 paho 相同，InMemoryTransport 呼叫 loop_start() 後由自己的網路執行緒依序呼叫 on_message，
+# 發布端不會在 publish() 中執行訂閱者的回調；沒有啟動 loop 的 transport 在 publish() 中同步送達，
+# 回調中再次發布的訊息延後到目前的訊息送達完畢後才送出，不會遞迴呼叫回調。
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USERNAME = "jetsion"
+DEFAULT_PASSWORD = "jetsion"
+
+# InMemoryBroker 快取的主題數上限
+_ROUTE_CACHE_LIMIT = 100000
+
+
+def topic_matches(topic_filter, topic):
+    """判斷主題是否符合 MQTT 訂閱過濾條件（支援 + 與 # 萬用字元）"""
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    # 以 $ 開頭的系統主題不與萬用字元開頭的過濾條件比對
+    if topic.startswith("$") and filter_parts[0] in ("+", "#"):
+        return False
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class PahoTransport(mqtt.Client):
+    """連線到實際 MQTT broker 的傳輸層，建立時指定 broker 位址"""
+
+    def __init__(self, host, port=1883, keepalive=60, client_id="",
+                 username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD):
+        super().__init__(client_id=client_id)
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        if username is not None:
+            self.username_pw_set(username, password)
+
+    def connect(self, host=None, port=None, keepalive=None, *args, **kwargs):
+        return super().connect(
+            host or self.host,
+            port or self.port,
+            keepalive or self.keepalive,
+            *args,
+            **kwargs
+        )
+
+
+class InMemoryMessage:
+    """與 paho MQTTMessage 相同欄位的訊息物件"""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "timestamp")
+
+    def __init__(self, topic, payload, qos=0, retain=False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.timestamp = time.monotonic()
+
+
+class _PublishInfo:
+    """對應 paho MQTTMessageInfo 的最小介面"""
+
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, mid):
+        self.rc = mqtt.MQTT_ERR_SUCCESS
+        self.mid = mid
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        return None
+
+
+def _to_bytes(payload):
+    if payload is None:
+        return b""
+    if isinstance(payload, bytes):
+        return payload
+    if isinstance(payload, (bytearray, memoryview)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode()
+    if isinstance(payload, (int, float)):
+        return str(payload).encode()
+    raise TypeError(f"不支援的 payload 型別: {type(payload).__name__}")
+
+
+class InMemoryBroker:
+    """程序內的發布/訂閱中介（送達方式見模組說明）
+
+    主題對應的訂閱者清單會快取，訂閱變動時清除，因此大量發布時
+    每則訊息只需一次字典查詢。同一個 transport 有多個訂閱符合時只送達一次。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 各執行緒正在同步送達的訊息，回調中發布的訊息排在後面
+        self._local = threading.local()
+        self._subscriptions = {}
+        self._route_cache = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, transport, topic_filter):
+        with self._lock:
+            self._subscriptions.setdefault(transport, set()).add(topic_filter)
+            self._route_cache = {}
+
+    def unsubscribe(self, transport, topic_filter=None):
+        with self._lock:
+            filters = self._subscriptions.get(transport)
+            if filters is None:
+                return
+            if topic_filter is None:
+                del self._subscriptions[transport]
+            else:
+                filters.discard(topic_filter)
+            self._route_cache = {}
+
+    def _subscribers(self, topic):
+        subscribers = self._route_cache.get(topic)
+        if subscribers is None:
+            if len(self._route_cache) >= _ROUTE_CACHE_LIMIT:
+                self._route_cache = {}
+            with self._lock:
+                subscribers = tuple(
+                    transport for transport, filters in self._subscriptions.items()
+                    if any(topic_matches(topic_filter, topic) for topic_filter in filters)
+                )
+                self._route_cache[topic] = subscribers
+        return subscribers
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """將訊息送達所有符合的訂閱者，回傳送達數量"""
+        self.published += 1
+        subscribers = self._subscribers(topic)
+        self.delivered += len(subscribers)
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            # 在訂閱者的回調中發布：等目前的訊息送達完畢後再送出
+            pending.extend((transport, topic, payload, qos, retain) for transport in subscribers)
+            return len(subscribers)
+        pending = self._local.pending = deque((transport, topic, payload, qos, retain) for transport in subscribers)
+        try:
+            while pending:
+                transport, *message = pending.popleft()
+                transport.deliver(InMemoryMessage(*message))
+        finally:
+            self._local.pending = None
+        return len(subscribers)
+
+
+# 未指定 broker 時，同一個程序內的 InMemoryTransport 共用此 broker
+default_broker = InMemoryBroker()
+
+
+class InMemoryTransport:
+    """透過 InMemoryBroker 收發訊息的傳輸層，介面與 paho client 相容"""
+
+    def __init__(self, broker=None, client_id=""):
+        self.broker = broker if broker is not None else default_broker
+        self.client_id = client_id
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.connected = False
+        self._mid = 0
+        # loop_start() 之後收到的訊息，由網路執行緒依序交給 on_message
+        self._inbox = deque()
+        self._inbox_ready = threading.Condition()
+        self._dispatching = False
+        self._loop_thread = None
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, *args, **kwargs):
+        self.connected = True
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self, *args, **kwargs):
+        if not self.connected:
+            return mqtt.MQTT_ERR_NO_CONN
+        self.connected = False
+        self.broker.unsubscribe(self)
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_start(self):
+        """啟動網路執行緒，之後收到的訊息由該執行緒呼叫 on_message"""
+        if self._loop_thread is not None:
+            return mqtt.MQTT_ERR_INVAL
+        self._loop_thread = threading.Thread(target=self._loop, name=f"in_memory_loop_{self.client_id}", daemon=True)
+        self._loop_thread.start()
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, *args, **kwargs):
+        """停止網路執行緒，尚未交給 on_message 的訊息丟棄（與 paho 相同）"""
+        thread = self._loop_thread
+        if thread is None:
+            return mqtt.MQTT_ERR_INVAL
+        with self._inbox_ready:
+            self._loop_thread = None
+            self._inbox.clear()
+            self._inbox_ready.notify_all()
+        if thread is not threading.current_thread():
+            thread.join()
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def _loop(self):
+        thread = threading.current_thread()
+        inbox = self._inbox
+        while True:
+            with self._inbox_ready:
+                while not inbox and self._loop_thread is thread:
+                    self._inbox_ready.wait()
+                if self._loop_thread is not thread:
+                    self._dispatching = False
+                    self._inbox_ready.notify_all()
+                    return
+                message = inbox.popleft()
+                self._dispatching = True
+            try:
+                if self.on_message is not None:
+                    self.on_message(self, None, message)
+            except Exception as e:
+                logger.error("on_message 回調發生錯誤: %s", e)
+            with self._inbox_ready:
+                self._dispatching = False
+                if not inbox:
+                    self._inbox_ready.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """等待網路執行緒把已收到的訊息都交給 on_message，逾時回傳 False"""
+        with self._inbox_ready:
+            return self._inbox_ready.wait_for(
+                lambda: self._loop_thread is None or (not self._inbox and not self._dispatching), timeout
+            )
+
+    def is_connected(self):
+        return self.connected
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic)
+        self._mid += 1
+        return mqtt.MQTT_ERR_SUCCESS, self._mid
+
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        self._mid += 1
+        return mqtt.MQTT_ERR_SUCCESS, self._mid
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self._mid += 1
+        self.broker.publish(topic, _to_bytes(payload), qos, retain)
+        return _PublishInfo(self._mid)
+
+    def deliver(self, message):
+        """由 broker 呼叫：已啟動網路執行緒時排入佇列，否則直接交給 on_message 回調"""
+        if self._loop_thread is not None:
+            with self._inbox_ready:
+                if self._loop_thread is not None:
+                    self._inbox.append(message)
+                    self._inbox_ready.notify_all()
+                    return
+        if self.on_message is not None:
+            self.on_message(self, None, message)
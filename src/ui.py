@@ -1,6 +1,6 @@
 import streamlit as st
-import paho.mqtt.client as mqtt
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from datetime import datetime
 import json
@@ -8,6 +8,16 @@ import time
 import logging
 import threading
 import random
+import argparse
+from collections import deque
+
+from payload_codec import FRAME_TOPIC, decode_traced_payload
+from transport import PahoTransport
+from tracing import SN_RATIO_HOPS, TraceStats, trace_clock
+from stream_buffers import DEFAULT_DEPTH, StreamBuffers, local_datetime64
+from downsample import DEFAULT_MAX_POINTS, METHODS, downsample
+from timeseries_store import TimeSeriesStore
+from experiment_runner import EXPERIMENT_TOPIC
 
 # 配置日誌
 logging.basicConfig(
@@ -16,47 +26,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SENSOR_TYPES = ("pressure", "vibration", "rpm", "current")
+
+# UI 訂閱的設備，也是 Streamlit 程序啟動時（每個程序一次）從歷史數據補齊的設備
+DEVICE_ID = "device001"
+
+# 預設每秒檢查一次是否有新數據
+REFRESH_INTERVAL = 1.0
+
+# 保留並顯示的製程管制警報筆數
+ALARM_HISTORY = 50
+
+# 趨勢圖：(感測器, 中文名稱, 線條顏色)
+SENSOR_CHARTS = (
+    ("pressure", "壓力", "blue"),
+    ("vibration", "振動", "red"),
+    ("rpm", "轉速", "green"),
+    ("current", "電流", "purple"),
+)
+
+# 趨勢圖的時間範圍（秒），None 為緩衝區內的全部數據
+TIME_RANGES = {"全部": None, "最近 1 分鐘": 60, "最近 10 分鐘": 600, "最近 1 小時": 3600}
+
+# Streamlit 1.37 起為 st.fragment，1.33~1.36 為 st.experimental_fragment，更早的版本沒有
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
 class MQTTManager:
     _instance = None
     _lock = threading.Lock()
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(MQTTManager, cls).__new__(cls)
                 cls._instance._initialized = False
             return cls._instance
     
-    def __init__(self):
+    def __init__(self, transport=None, depth=DEFAULT_DEPTH, history=None, record_history=False):
+        """transport 預設連線到 jetsion.com，可改用 InMemoryTransport 離線執行；
+        depth 為每個 stream 保留的筆數；
+        history 為 TimeSeriesStore 目錄（例如 EdgeComputing(store=...) 寫入的目錄），
+        第一次建立時（每個 Streamlit 程序一次）先從中載入各感測器最近 depth 筆的原始數據與 S/N 比；
+        緩衝區由所有工作階段共用，之後開啟的工作階段不再補齊，直接看到已補齊與即時收到的數據；
+        record_history=True 時 UI 也將收到的數據寫入 history（邊緣計算層未記錄歷史時使用，兩者不可同時寫入）。
+        MQTTManager 為單例，只有第一次建立時的參數有效"""
         if self._initialized:
             return
             
         self._initialized = True
         self.connected = False
-        self.data_buffer = {
-            "pressure": [],
-            "vibration": [],
-            "rpm": [],
-            "current": []
-        }
-        self.sn_buffer = {
-            "pressure": [],
-            "vibration": [],
-            "rpm": [],
-            "current": []
-        }
+        # 預先配置的時間戳/數值環形緩衝區，寫入與快照共用同一把鎖
+        self.data_buffer = StreamBuffers(depth, SENSOR_TYPES)
+        self.sn_buffer = StreamBuffers(depth, SENSOR_TYPES)
+        # 延遲追蹤：S/N 比經過邊緣計算層的各段延遲，以及原始數據直接到 UI 的延遲與遺失
+        # S/N 比不一定逐筆發布（例如視窗未滿），因此只統計亂序
+        self.sn_trace = TraceStats(SN_RATIO_HOPS, count_gaps=False)
+        self.raw_trace = TraceStats(("sensor_ui",))
+        # 邊緣計算層自動執行實驗的進度、各次結果與分析摘要
+        self.experiment = {"status": None, "results": {}, "summary": None}
+        # 邊緣計算層發布的最新離群值旗標 {感測器: 旗標}
+        self.outliers = {}
+        # 最近的製程管制警報
+        self.alarms = deque(maxlen=ALARM_HISTORY)
         self.client = None
-        self._setup_mqtt()
+        self.recorder = None
+        if history is not None:
+            self.backfill(history)
+            if record_history:
+                self.recorder = TimeSeriesStore(history) if isinstance(history, str) else history
+        self._setup_mqtt(transport)
+    
+    def backfill(self, history, device_id=DEVICE_ID):
+        """從 TimeSeriesStore 批次載入各感測器最近的原始數據與 S/N 比，回傳 {stream: 載入筆數}
+        
+        每次重新開啟儲存區，讀得到其他行程（例如邊緣計算層）最近寫入的數據；
+        只補在已收到的即時數據之前，可在連線後再次呼叫。
+        """
+        started = time.perf_counter()
+        store = TimeSeriesStore(history.root if isinstance(history, TimeSeriesStore) else history)
+        loaded = {}
+        try:
+            for sensor_type in SENSOR_TYPES:
+                for buffers, sensor in ((self.data_buffer, sensor_type), (self.sn_buffer, f"sn_ratio/{sensor_type}")):
+                    if store.has_stream(device_id, sensor):
+                        timestamps, values = store.latest(device_id, sensor, buffers.depth)
+                        loaded[sensor] = buffers.backfill(sensor_type, timestamps, values)
+        finally:
+            store.close()
+        logger.info(f"從歷史數據補齊 {sum(loaded.values())} 筆，耗時 {(time.perf_counter() - started) * 1000:.1f} ms: {loaded}")
+        return loaded
     
-    def _setup_mqtt(self):
-        self.client = mqtt.Client()
-        self.client.username_pw_set("jetsion", "jetsion")
+    def _setup_mqtt(self, transport=None):
+        self.client = transport if transport is not None else PahoTransport("jetsion.com")
         self.client.on_connect = self._on_connect
         self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
         
         try:
-            self.client.connect("jetsion.com", 1883, 60)
+            self.client.connect()
             self.client.loop_start()
             logger.info("MQTT 連接請求已發送")
         except Exception as e:
@@ -79,8 +146,9 @@ class MQTTManager:
     def _on_message(self, client, userdata, msg):
         try:
             topic = msg.topic
-            payload = msg.payload.decode()
-            timestamp = datetime.now()
+            received_clock = trace_clock()
+            payload = msg.payload.decode(errors="replace")
+            timestamp = time.time()
             
             logger.info(f"收到消息 - Topic: {topic}, Payload: {payload}")
             
@@ -89,59 +157,144 @@ class MQTTManager:
             if len(parts) >= 4:
                 sensor_type = parts[-1]  # 最後一個部分是感測器類型
                 
-                # 處理 S/N 比數據
+                # 處理自動實驗的進度與結果
+                if parts[3] == EXPERIMENT_TOPIC:
+                    self._on_experiment(parts[4:], msg.payload)
+                    return
+                
+                # 處理製程管制警報
+                if parts[3] == "alarms":
+                    try:
+                        alarm = json.loads(msg.payload)
+                    except ValueError:
+                        logger.error(f"製程管制警報格式錯誤: {payload}")
+                        return
+                    alarm["device"] = parts[2]
+                    alarm["sensor"] = sensor_type
+                    self.alarms.append(alarm)
+                    return
+                
+                # 處理離群值旗標（含累計數量）
+                if parts[3] == "outliers":
+                    try:
+                        self.outliers[sensor_type] = json.loads(msg.payload)
+                    except ValueError:
+                        logger.error(f"離群值數據格式錯誤: {payload}")
+                    return
+                
+                # 處理 S/N 比數據（單一感測器或合併多個感測器的訊框）
                 if "sn_ratio" in topic:
                     try:
-                        value = float(payload)
-                        if sensor_type not in self.sn_buffer:
-                            self.sn_buffer[sensor_type] = []
-                        
-                        self.sn_buffer[sensor_type].append({
-                            "timestamp": timestamp,
-                            "value": value
-                        })
-                        
-                        if len(self.sn_buffer[sensor_type]) > 100:
-                            self.sn_buffer[sensor_type] = self.sn_buffer[sensor_type][-100:]
-                        
-                        logger.info(f"更新 {sensor_type} S/N 比數據: {value}")
+                        _, readings, trace = decode_traced_payload(topic, msg.payload)
                     except ValueError:
                         logger.error(f"S/N 比數據格式錯誤: {payload}")
+                        return
+                    if trace is not None:
+                        self.sn_trace.record(topic, trace, received_clock)
+                    for reading_type, value in readings.items():
+                        if reading_type in SENSOR_TYPES:
+                            self.sn_buffer.append(reading_type, timestamp, value)
+                            self._record(parts[2], f"sn_ratio/{reading_type}", timestamp, value)
+                            logger.info(f"更新 {reading_type} S/N 比數據: {value}")
                 
-                # 處理原始感測器數據
-                elif sensor_type in ["pressure", "vibration", "rpm", "current"]:
+                # 處理原始感測器數據（單一訊框或舊格式的單一數值）
+                elif sensor_type == FRAME_TOPIC or sensor_type in SENSOR_TYPES:
                     try:
-                        value = float(payload)
-                        if sensor_type not in self.data_buffer:
-                            self.data_buffer[sensor_type] = []
-                        
-                        self.data_buffer[sensor_type].append({
-                            "timestamp": timestamp,
-                            "value": value
-                        })
-                        
-                        if len(self.data_buffer[sensor_type]) > 100:
-                            self.data_buffer[sensor_type] = self.data_buffer[sensor_type][-100:]
-                        
-                        logger.info(f"更新 {sensor_type} 原始數據: {value}")
-                        logger.info(f"當前 {sensor_type} 緩衝區大小: {len(self.data_buffer[sensor_type])}")
+                        frame_timestamp, readings, trace = decode_traced_payload(topic, msg.payload)
                     except ValueError:
                         logger.error(f"原始數據格式錯誤: {payload}")
+                        return
+                    if trace is not None:
+                        self.raw_trace.record(topic, trace, received_clock)
+                    if frame_timestamp is not None:
+                        timestamp = frame_timestamp
+                    for reading_type, value in readings.items():
+                        if reading_type in SENSOR_TYPES:
+                            self._append_raw_data(reading_type, timestamp, value)
+                            self._record(parts[2], reading_type, timestamp, value)
                 
         except Exception as e:
             logger.error(f"處理數據失敗: {str(e)}")
     
+    def _append_raw_data(self, sensor_type, timestamp, value):
+        """timestamp 為 Unix 秒數"""
+        self.data_buffer.append(sensor_type, timestamp, value)
+        logger.info(f"更新 {sensor_type} 原始數據: {value}")
+    
+    def _on_experiment(self, parts, payload):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.error(f"實驗數據格式錯誤: {payload}")
+            return
+        if parts == ["status"]:
+            self.experiment["status"] = data
+        elif parts[:1] == ["result"]:
+            self.experiment["results"][data["run"]] = data
+        elif parts == ["summary"]:
+            self.experiment["summary"] = data
+    
+    def _record(self, device_id, sensor, timestamp, value):
+        if self.recorder is not None:
+            self.recorder.append(device_id, sensor, timestamp, value)
+    
     def get_data(self):
-        return self.data_buffer
+        """回傳原始數據快照 {感測器: StreamSnapshot}（timestamps / values 陣列）"""
+        return self.data_buffer.snapshot()
     
     def get_sn_data(self):
-        return self.sn_buffer
+        """回傳 S/N 比快照 {感測器: StreamSnapshot}"""
+        return self.sn_buffer.snapshot()
+    
+    def get_versions(self):
+        """回傳各 stream 的數據版本 {"raw": {感測器: 版本}, "sn": {感測器: 版本}}，每收到一筆遞增"""
+        return {"raw": self.data_buffer.versions(), "sn": self.sn_buffer.versions()}
+    
+    def get_stream(self, kind, sensor_type):
+        """回傳單一 stream 的快照，kind 為 raw（原始數據）或 sn（S/N 比）"""
+        buffers = self.data_buffer if kind == "raw" else self.sn_buffer
+        return buffers.snapshot([sensor_type])[sensor_type]
+    
+    def get_latest_data(self):
+        """回傳各感測器最新一筆原始數據 {感測器: {"timestamp": datetime, "value": 數值}}"""
+        return {
+            sensor_type: {"timestamp": datetime.fromtimestamp(timestamp), "value": value}
+            for sensor_type, (timestamp, value) in self.data_buffer.latest().items()
+        }
+    
+    def get_latency_stats(self):
+        """回傳延遲追蹤統計：sn_ratio（各段與端到端延遲）與 raw（感測器直接到 UI 的延遲、遺失與亂序）"""
+        return {"sn_ratio": self.sn_trace.snapshot(), "raw": self.raw_trace.snapshot()}
+    
+    def get_alarms(self):
+        """回傳最近的製程管制警報（舊到新），每筆為 {"device", "sensor", "timestamp", "value", "alarms"}"""
+        return list(self.alarms)
+    
+    def get_outliers(self):
+        """回傳各感測器最新的離群值旗標 {感測器: {"timestamp", "value", "replacement", "outliers", "samples"}}"""
+        return dict(self.outliers)
+    
+    def get_experiment(self):
+        """回傳自動實驗的 {"status", "results": {次數: 結果}, "summary"}"""
+        return {
+            "status": self.experiment["status"],
+            "results": dict(self.experiment["results"]),
+            "summary": self.experiment["summary"],
+        }
     
     def is_connected(self):
         return self.connected
 
 class TaguchiUI:
-    def __init__(self):
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, depth=DEFAULT_DEPTH,
+                 max_points=DEFAULT_MAX_POINTS, downsample_method="lttb", history=None, record_history=False):
+        """refresh_interval 為檢查新數據的間隔（秒），0 表示不自動更新；
+        depth 為每個 stream 保留的筆數；趨勢圖超過 max_points 點時以 downsample_method（lttb / minmax）降採樣；
+        history / record_history 見 MQTTManager，每個程序只在第一個工作階段建立 MQTTManager 時從 history 補齊一次"""
+        self.refresh_interval = refresh_interval
+        self.max_points = max_points
+        self.downsample_method = downsample_method
+        
         # 控制因子數據
         self.control_factors = {
             "A": {"1": 25, "2": 30, "3": 35},  # 壓力
@@ -151,7 +304,7 @@ class TaguchiUI:
         
         # 初始化 MQTT 管理器
         if 'mqtt_manager' not in st.session_state:
-            st.session_state.mqtt_manager = MQTTManager()
+            st.session_state.mqtt_manager = MQTTManager(depth=depth, history=history, record_history=record_history)
         
         # 初始化實驗設定
         if 'experiment_settings' not in st.session_state:
@@ -165,6 +318,10 @@ class TaguchiUI:
                     'C': {'1': [], '2': [], '3': []}
                 }
             }
+        
+        # 趨勢圖快取 {(kind, 感測器, 時間範圍): (數據版本, Figure)}，數據沒有變化時重用
+        if 'figure_cache' not in st.session_state:
+            st.session_state.figure_cache = {}
     
     def generate_sensor_data(self, factor, level):
         """根據控制因子設定生成模擬感測器數據"""
@@ -208,177 +365,23 @@ class TaguchiUI:
         
         # 感測器數據顯示
         st.header("感測器數據")
-        data = st.session_state.mqtt_manager.get_data()
-        sn_data = st.session_state.mqtt_manager.get_sn_data()
-        
-        # 顯示數據緩存狀態
-        st.write("數據緩存狀態：")
-        st.write("原始值數據：", {k: len(v) for k, v in data.items()})
-        st.write("S/N 比值數據：", {k: len(v) for k, v in sn_data.items()})
-        
-        # 壓力數據
-        st.subheader("壓力數據")
-        col1, col2 = st.columns(2)
-        with col1:
-            if data["pressure"]:
-                df = pd.DataFrame(data["pressure"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df["timestamp"],
-                    y=df["value"],
-                    name="壓力原始值",
-                    line=dict(color='blue')
-                ))
-                fig.update_layout(
-                    title="壓力原始值趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="數值"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到壓力原始值數據")
-        
-        with col2:
-            if sn_data["pressure"]:
-                df_sn = pd.DataFrame(sn_data["pressure"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df_sn["timestamp"],
-                    y=df_sn["value"],
-                    name="壓力 S/N 比",
-                    line=dict(color='blue')
-                ))
-                fig.update_layout(
-                    title="壓力 S/N 比趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="S/N 比 (dB)"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到壓力 S/N 比值數據")
+        manager = st.session_state.mqtt_manager
+        # 繪圖前記下數據版本，之後有新數據才重新執行整個頁面
+        versions = manager.get_versions()
         
-        # 振動數據
-        st.subheader("振動數據")
-        col1, col2 = st.columns(2)
-        with col1:
-            if data["vibration"]:
-                df = pd.DataFrame(data["vibration"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df["timestamp"],
-                    y=df["value"],
-                    name="振動原始值",
-                    line=dict(color='red')
-                ))
-                fig.update_layout(
-                    title="振動原始值趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="數值"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到振動原始值數據")
+        self._live(self.render_buffer_status)()
+        time_range = TIME_RANGES[st.selectbox("時間範圍", list(TIME_RANGES), key="time_range")]
+        for sensor_type, label, color in SENSOR_CHARTS:
+            st.subheader(f"{label}數據")
+            col1, col2 = st.columns(2)
+            with col1:
+                self._live(self.render_stream_chart)("raw", sensor_type, label, color, time_range)
+            with col2:
+                self._live(self.render_stream_chart)("sn", sensor_type, label, color, time_range)
         
-        with col2:
-            if sn_data["vibration"]:
-                df_sn = pd.DataFrame(sn_data["vibration"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df_sn["timestamp"],
-                    y=df_sn["value"],
-                    name="振動 S/N 比",
-                    line=dict(color='red')
-                ))
-                fig.update_layout(
-                    title="振動 S/N 比趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="S/N 比 (dB)"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到振動 S/N 比值數據")
-        
-        # 轉速數據
-        st.subheader("轉速數據")
-        col1, col2 = st.columns(2)
-        with col1:
-            if data["rpm"]:
-                df = pd.DataFrame(data["rpm"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df["timestamp"],
-                    y=df["value"],
-                    name="轉速原始值",
-                    line=dict(color='green')
-                ))
-                fig.update_layout(
-                    title="轉速原始值趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="數值"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到轉速原始值數據")
-        
-        with col2:
-            if sn_data["rpm"]:
-                df_sn = pd.DataFrame(sn_data["rpm"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df_sn["timestamp"],
-                    y=df_sn["value"],
-                    name="轉速 S/N 比",
-                    line=dict(color='green')
-                ))
-                fig.update_layout(
-                    title="轉速 S/N 比趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="S/N 比 (dB)"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到轉速 S/N 比值數據")
-        
-        # 電流數據
-        st.subheader("電流數據")
-        col1, col2 = st.columns(2)
-        with col1:
-            if data["current"]:
-                df = pd.DataFrame(data["current"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df["timestamp"],
-                    y=df["value"],
-                    name="電流原始值",
-                    line=dict(color='purple')
-                ))
-                fig.update_layout(
-                    title="電流原始值趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="數值"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到電流原始值數據")
-        
-        with col2:
-            if sn_data["current"]:
-                df_sn = pd.DataFrame(sn_data["current"])
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df_sn["timestamp"],
-                    y=df_sn["value"],
-                    name="電流 S/N 比",
-                    line=dict(color='purple')
-                ))
-                fig.update_layout(
-                    title="電流 S/N 比趨勢圖",
-                    xaxis_title="時間",
-                    yaxis_title="S/N 比 (dB)"
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.warning("尚未收到電流 S/N 比值數據")
+        self._live(self.render_alarms)()
+        self._live(self.render_latency)()
+        self._live(self.render_experiment)()
         
         # 控制因子設定
         st.header("控制因子設定")
@@ -405,13 +408,9 @@ class TaguchiUI:
                     level_values[level_a]
                 )
                 # 收集當前數據到 level_history
-                current_data = st.session_state.mqtt_manager.get_data()
-                if current_data:
-                    logger.info(f"收集因子 A 水準 {level_a} 的數據: {current_data}")
-                    formatted_data = {}
-                    for sensor_type, measurements in current_data.items():
-                        if measurements:
-                            formatted_data[sensor_type] = measurements[-1]
+                formatted_data = st.session_state.mqtt_manager.get_latest_data()
+                if formatted_data:
+                    logger.info(f"收集因子 A 水準 {level_a} 的數據: {formatted_data}")
                     st.session_state.experiment_settings['level_history']['A'][level_a].append(formatted_data)
         
         with col2:
@@ -433,13 +432,9 @@ class TaguchiUI:
                     level_values[level_b]
                 )
                 # 收集當前數據到 level_history
-                current_data = st.session_state.mqtt_manager.get_data()
-                if current_data:
-                    logger.info(f"收集因子 B 水準 {level_b} 的數據: {current_data}")
-                    formatted_data = {}
-                    for sensor_type, measurements in current_data.items():
-                        if measurements:
-                            formatted_data[sensor_type] = measurements[-1]
+                formatted_data = st.session_state.mqtt_manager.get_latest_data()
+                if formatted_data:
+                    logger.info(f"收集因子 B 水準 {level_b} 的數據: {formatted_data}")
                     st.session_state.experiment_settings['level_history']['B'][level_b].append(formatted_data)
         
         with col3:
@@ -461,13 +456,9 @@ class TaguchiUI:
                     level_values[level_c]
                 )
                 # 收集當前數據到 level_history
-                current_data = st.session_state.mqtt_manager.get_data()
-                if current_data:
-                    logger.info(f"收集因子 C 水準 {level_c} 的數據: {current_data}")
-                    formatted_data = {}
-                    for sensor_type, measurements in current_data.items():
-                        if measurements:
-                            formatted_data[sensor_type] = measurements[-1]
+                formatted_data = st.session_state.mqtt_manager.get_latest_data()
+                if formatted_data:
+                    logger.info(f"收集因子 C 水準 {level_c} 的數據: {formatted_data}")
                     st.session_state.experiment_settings['level_history']['C'][level_c].append(formatted_data)
         
         # 顯示當前實驗狀態
@@ -489,7 +480,7 @@ class TaguchiUI:
             # 加入 log 輸出
             logger.info(f"開始生成各水準數據比較圖表，當前因子: {current_factor}")
             logger.info(f"level_history: {level_history}")
-            logger.info(f"當前數據緩衝區: {st.session_state.mqtt_manager.get_data()}")
+            logger.info(f"當前數據緩衝區: {st.session_state.mqtt_manager.data_buffer.lengths()}")
             
             # 創建比較圖表
             for sensor_type in ['pressure', 'vibration', 'rpm', 'current']:
@@ -540,10 +531,170 @@ class TaguchiUI:
         else:
             st.warning("目前沒有進行中的實驗")
         
-        # 自動更新機制
-        time.sleep(1)
-        st.rerun()
+        # 自動更新機制：有 st.fragment 時各區塊自行定時重繪，否則在數據改變時重新執行整個頁面
+        if self.refresh_interval and _fragment is None:
+            self._wait_for_change(versions)
+    
+    def _live(self, render):
+        """有 st.fragment 時將 render 包成定時重跑的 fragment，只重繪該區塊；否則直接回傳"""
+        if not self.refresh_interval or _fragment is None:
+            return render
+        return _fragment(run_every=self.refresh_interval)(render)
+    
+    def _wait_for_change(self, versions):
+        """定時檢查數據版本，有新數據時才重新執行頁面
+        
+        等待期間更新一個狀態列：Streamlit 在每次呼叫元件時處理使用者操作觸發的重跑，
+        因此按鈕與選單在等待時仍可即時反應。
+        """
+        manager = st.session_state.mqtt_manager
+        status = st.empty()
+        while True:
+            time.sleep(self.refresh_interval)
+            if manager.get_versions() != versions:
+                st.rerun()
+            status.caption(f"最後檢查時間 {datetime.now():%H:%M:%S}，沒有新數據")
+    
+    def stream_figure(self, kind, sensor_type, label, color, time_range=None):
+        """回傳 stream 的趨勢圖，數據版本未變時重用快取的 Figure；沒有數據時回傳 None
+        
+        time_range 為只顯示最後幾秒的數據；點數超過 max_points 時降採樣，
+        傳給瀏覽器的點數與緩衝區大小無關。
+        """
+        manager = st.session_state.mqtt_manager
+        cache = st.session_state.figure_cache
+        key = (kind, sensor_type, time_range)
+        cached = cache.get(key)
+        if cached is not None and cached[0] == manager.get_versions()[kind].get(sensor_type, 0):
+            return cached[1]
+        
+        stream = manager.get_stream(kind, sensor_type)
+        fig = None
+        if stream:
+            epoch, values = stream.epoch, stream.values
+            if time_range is not None:
+                start = np.searchsorted(epoch, epoch[-1] - time_range)
+                epoch, values = epoch[start:], values[start:]
+            epoch, values = downsample(epoch, values, self.max_points, self.downsample_method)
+            name, yaxis_title = (f"{label}原始值", "數值") if kind == "raw" else (f"{label} S/N 比", "S/N 比 (dB)")
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                x=local_datetime64(epoch),
+                y=values,
+                name=name,
+                line=dict(color=color)
+            ))
+            fig.update_layout(
+                title=f"{name}趨勢圖",
+                xaxis_title="時間",
+                yaxis_title=yaxis_title
+            )
+        cache[key] = (stream.version, fig)
+        return fig
+    
+    def render_stream_chart(self, kind, sensor_type, label, color, time_range=None):
+        fig = self.stream_figure(kind, sensor_type, label, color, time_range)
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+        elif kind == "raw":
+            st.warning(f"尚未收到{label}原始值數據")
+        else:
+            st.warning(f"尚未收到{label} S/N 比值數據")
+    
+    def render_buffer_status(self):
+        manager = st.session_state.mqtt_manager
+        # 顯示數據緩存狀態
+        st.write("數據緩存狀態：")
+        st.write("原始值數據：", manager.data_buffer.lengths())
+        st.write("S/N 比值數據：", manager.sn_buffer.lengths())
+        outliers = manager.get_outliers()
+        if outliers:
+            st.write("離群值（已以中位數取代）：", {
+                sensor_type: f"{flag['outliers']} / {flag['samples']}" for sensor_type, flag in outliers.items()
+            })
+    
+    def render_alarms(self):
+        # 邊緣計算層的 EWMA / CUSUM / X̄-R 警報（見 spc.py），最新的在最上面
+        alarms = st.session_state.mqtt_manager.get_alarms()
+        if not alarms:
+            return
+        st.header("製程管制警報")
+        rows = []
+        for alarm in reversed(alarms):
+            for item in alarm["alarms"]:
+                rows.append({
+                    "時間": datetime.fromtimestamp(alarm["timestamp"]).strftime("%H:%M:%S"),
+                    "設備": alarm["device"],
+                    "感測器": alarm["sensor"],
+                    "管制圖": item["chart"],
+                    "數值": alarm["value"],
+                    "統計量": round(item["statistic"], 4),
+                    "界限": f"{item['lower']:.4g} ~ {item['upper']:.4g}",
+                })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+    
+    def render_latency(self):
+        # 延遲追蹤（模擬器以 trace=True 啟動時才有數據）
+        latency = st.session_state.mqtt_manager.get_latency_stats()
+        if latency["sn_ratio"]["received"] or latency["raw"]["received"]:
+            st.header("延遲追蹤")
+            rows = []
+            for path, stats in latency.items():
+                for hop, summary in stats["latency"].items():
+                    if summary["count"]:
+                        rows.append({
+                            "路徑": path,
+                            "區段": hop,
+                            "筆數": summary["count"],
+                            "p50 (ms)": summary["p50_us"] / 1000,
+                            "p95 (ms)": summary["p95_us"] / 1000,
+                            "p99 (ms)": summary["p99_us"] / 1000,
+                        })
+            st.dataframe(pd.DataFrame(rows), use_container_width=True)
+            raw = latency["raw"]
+            st.write(f"原始數據：收到 {raw['received']} 筆，遺失 {raw['lost']} 筆，亂序 {raw['out_of_order']} 筆；"
+                     f"S/N 比亂序 {latency['sn_ratio']['out_of_order']} 筆")
+
+    def render_experiment(self):
+        # 自動實驗（EdgeComputing.run_experiment）的進度與各次實驗的統計結果
+        experiment = st.session_state.mqtt_manager.get_experiment()
+        status = experiment["status"]
+        if status is None:
+            return
+        st.header("自動實驗")
+        st.write(f"階段：{status['phase']}，第 {status['run']} / {status['runs']} 次實驗")
+        rows = []
+        for run, result in sorted(experiment["results"].items()):
+            row = {"實驗": run}
+            row.update(result["levels"])
+            for sensor_type, stats in result["sensors"].items():
+                row[f"{sensor_type} 平均"] = stats["mean"]
+                row[f"{sensor_type} S/N"] = stats["sn"]
+            rows.append(row)
+        if rows:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True)
+        if experiment["summary"] is not None:
+            st.write("各感測器 S/N 比的最佳水準：", experiment["summary"]["best_level"])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="田口法實驗監控介面（streamlit run src/ui.py -- [參數]）")
+    parser.add_argument("--refresh", type=float, default=REFRESH_INTERVAL,
+                        help="檢查新數據的間隔秒數，0 表示不自動更新")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="每個 stream 保留的筆數")
+    parser.add_argument("--max-points", type=int, default=DEFAULT_MAX_POINTS, help="每張趨勢圖最多的點數")
+    parser.add_argument("--downsample", choices=METHODS, default="lttb", help="降採樣方法")
+    parser.add_argument("--history", help="歷史數據目錄（TimeSeriesStore），UI 程序啟動後第一次開啟頁面時從中補齊趨勢圖")
+    parser.add_argument("--record-history", action="store_true", help="UI 也將收到的數據寫入 --history")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    ui = TaguchiUI()
+    args = parse_args()
+    ui = TaguchiUI(
+        refresh_interval=args.refresh,
+        depth=args.depth,
+        max_points=args.max_points,
+        downsample_method=args.downsample,
+        history=args.history,
+        record_history=args.record_history
+    )
     ui.run() 
\ No newline at end of file
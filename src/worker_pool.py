@@ -0,0 +1,182 @@
+from collections import deque
+import threading
+import time
+import zlib
+
+# 佇列滿時的處理方式
+#   block       - 呼叫端等待直到佇列有空間
+#   drop_oldest - 丟棄佇列中最舊的一筆，放入新數據
+#   drop_newest - 丟棄新進的數據
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# stats() 彙總的各分區計數器
+_COUNTERS = ("enqueued", "processed", "errors", "dropped_oldest", "dropped_newest", "blocked", "inline")
+
+
+class _Partition:
+    """單一 worker 的有界佇列與計數器"""
+
+    __slots__ = ("items", "lock", "not_empty", "not_full", "idle", "thread",
+                 "pending", "enqueued", "processed", "errors",
+                 "dropped_oldest", "dropped_newest", "blocked", "inline")
+
+    def __init__(self):
+        self.items = deque()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.idle = threading.Condition(self.lock)
+        # 尚未處理完成的筆數（含佇列中與處理中）
+        self.pending = 0
+        self.enqueued = 0
+        self.processed = 0
+        self.errors = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.blocked = 0
+        # worker 自己排入同一分區、直接處理的筆數
+        self.inline = 0
+
+
+class PartitionedWorkerPool:
+    """依分區鍵把工作分派到固定的 worker 執行緒
+
+    同一個分區鍵（例如設備 ID）永遠由同一個 worker 依序處理，
+    因此處理順序與接收順序一致，且不同 worker 不會同時修改同一設備的狀態。
+    每個 worker 有各自的有界佇列，佇列滿時依 overflow 政策處理並計數。
+    worker 在處理途中排入自己的分區時（例如處理函式發布的訊息經由同步的傳輸層回到 submit），
+    該筆直接在 worker 上處理而不排入佇列，worker 不會在自己已滿的佇列上等待。
+    """
+
+    def __init__(self, handler, workers=2, queue_size=10000, overflow="block", name="edge_worker"):
+        if workers < 1:
+            raise ValueError("workers 必須大於 0")
+        if queue_size < 1:
+            raise ValueError("queue_size 必須大於 0")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支援的溢位政策: {overflow}，可用: {', '.join(OVERFLOW_POLICIES)}")
+        self.handler = handler
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.name = name
+        self._partitions = [_Partition() for _ in range(workers)]
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        """啟動所有 worker 執行緒"""
+        if self._running:
+            return
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._worker, args=(partition,), name=f"{self.name}_{i}", daemon=True)
+            for i, partition in enumerate(self._partitions)
+        ]
+        for partition, thread in zip(self._partitions, self._threads):
+            partition.thread = thread
+            thread.start()
+
+    def stop(self, timeout=None):
+        """停止 worker，佇列中剩餘的數據會先處理完畢"""
+        self._running = False
+        for partition in self._partitions:
+            with partition.lock:
+                partition.not_empty.notify_all()
+                partition.not_full.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        for partition in self._partitions:
+            partition.thread = None
+        self._threads = []
+
+    def partition_for(self, key):
+        """回傳分區鍵對應的 worker 編號"""
+        return zlib.crc32(key.encode()) % len(self._partitions)
+
+    def submit(self, key, *item):
+        """放入一筆工作，回傳是否成功排入佇列"""
+        partition = self._partitions[self.partition_for(key)]
+        if partition.thread is threading.current_thread():
+            with partition.lock:
+                partition.pending += 1
+                partition.enqueued += 1
+                partition.inline += 1
+            self._process(partition, item)
+            return True
+        with partition.lock:
+            if len(partition.items) >= self.queue_size:
+                if self.overflow == "drop_newest":
+                    partition.dropped_newest += 1
+                    return False
+                if self.overflow == "drop_oldest":
+                    partition.items.popleft()
+                    partition.pending -= 1
+                    partition.dropped_oldest += 1
+                else:
+                    partition.blocked += 1
+                    while len(partition.items) >= self.queue_size and self._running:
+                        partition.not_full.wait()
+            partition.items.append(item)
+            partition.pending += 1
+            partition.enqueued += 1
+            partition.not_empty.notify()
+        return True
+
+    def _worker(self, partition):
+        while True:
+            with partition.lock:
+                while not partition.items and self._running:
+                    partition.not_empty.wait()
+                if not partition.items:
+                    return
+                item = partition.items.popleft()
+                partition.not_full.notify()
+            self._process(partition, item)
+
+    def _process(self, partition, item):
+        try:
+            self.handler(*item)
+            error = False
+        except Exception:
+            error = True
+        with partition.lock:
+            partition.processed += 1
+            partition.errors += error
+            partition.pending -= 1
+            if not partition.pending:
+                partition.idle.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """等待所有已排入的工作處理完畢，逾時回傳 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for partition in self._partitions:
+            with partition.lock:
+                while partition.pending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    partition.idle.wait(remaining)
+        return True
+
+    def stats(self):
+        """回傳佇列深度與各項計數"""
+        totals = {
+            "workers": len(self._partitions),
+            "queue_size": self.queue_size,
+            "overflow": self.overflow,
+            "queued": 0,
+            "enqueued": 0,
+            "processed": 0,
+            "errors": 0,
+            "dropped_oldest": 0,
+            "dropped_newest": 0,
+            "blocked": 0,
+            "inline": 0,
+        }
+        for partition in self._partitions:
+            with partition.lock:
+                totals["queued"] += len(partition.items)
+                for counter in _COUNTERS:
+                    totals[counter] += getattr(partition, counter)
+        return totals
@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from edge_computing import EdgeComputing  # noqa: E402
+from transport import InMemoryBroker, InMemoryTransport  # noqa: E402
+
+
+def test_factor_level_checked_before_parsing():
+    broker = InMemoryBroker()
+    edge = EdgeComputing("device001", transport=InMemoryTransport(broker), workers=0, metrics_interval=None, spc=False)
+    publisher = InMemoryTransport(broker)
+    publisher.connect()
+    # 未知的因子或水準帶非數值內容時直接忽略，不算處理錯誤
+    publisher.publish("jetsion/taguchi/device001/control_factors/Z/1", "on")
+    publisher.publish("jetsion/taguchi/device001/control_factors/A/9", "on")
+    publisher.publish("jetsion/taguchi/device001/control_factors/A/1", "42.5")
+    assert edge.client.wait_idle(10)
+    edge.stop()
+    assert edge.metrics.counters["control_factors"]["errors"] == 0
+    assert edge.shards["device001"].control_factors["A"]["levels"]["1"] == 42.5
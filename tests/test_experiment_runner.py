@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import checkpoint  # noqa: E402
+from edge_computing import EdgeComputing  # noqa: E402
+from experiment_runner import ExperimentRunner  # noqa: E402
+from transport import InMemoryBroker, InMemoryTransport  # noqa: E402
+
+
+def strict_loads(payload):
+    """與瀏覽器等嚴格的 JSON 接收端相同，遇到 Infinity / NaN 時失敗"""
+    def reject(constant):
+        raise ValueError(f"不是合法的 JSON: {constant}")
+    return json.loads(payload, parse_constant=reject)
+
+
+def test_infinite_sn_published_as_null():
+    broker = InMemoryBroker()
+    edge = EdgeComputing("device001", transport=InMemoryTransport(broker), workers=0, metrics_interval=None, spc=False)
+    edge.plan_experiment({"A": 2, "B": 2})
+    received = {}
+    listener = InMemoryTransport(broker)
+    listener.on_message = lambda client, userdata, message: received.setdefault(message.topic, []).append(message.payload)
+    listener.connect()
+    listener.subscribe("jetsion/taguchi/device001/experiment/#")
+
+    runner = ExperimentRunner(edge, settle=0, dwell=0.05)
+    thread = runner.start()
+    # 數值固定不變：變異數為 0，ntb2 的 S/N 比為 inf
+    while thread.is_alive():
+        runner.observe("device001", "rpm", 1500.0, time.time())
+    thread.join()
+
+    assert len(runner.results) == len(runner.design)
+    # results 保留原始數值供分析使用
+    assert all(result["sensors"]["rpm"]["sn"] == float("inf") for result in runner.results)
+    prefix = "jetsion/taguchi/device001/experiment"
+    for run in range(1, len(runner.design) + 1):
+        result = strict_loads(received[f"{prefix}/result/{run}"][-1])
+        assert result["sensors"]["rpm"]["sn"] is None
+        assert result["sensors"]["rpm"]["mean"] == 1500.0
+    summary = strict_loads(received[f"{prefix}/summary"][-1])
+    assert summary["delta"]["rpm"] == {"A": None, "B": None}
+
+
+def checkpoint_during_run(tmp_path):
+    """以非預設的 L4 設計執行實驗，在第一次實驗的穩定等待期間寫入快照"""
+    edge = EdgeComputing("device001", transport=InMemoryTransport(InMemoryBroker()), workers=0,
+                         metrics_interval=None, spc=False)
+    edge.plan_experiment({"A": 2, "B": 2})
+    runner = ExperimentRunner(edge, settle=30, dwell=30)
+    edge.experiment_runner = runner
+    thread = runner.start()
+    while runner.phase != "settle":
+        time.sleep(0.01)
+    path = str(tmp_path / "edge.ckpt")
+    checkpoint.write(path, *checkpoint.capture(edge))
+    runner.stop()
+    thread.join()
+    return edge, path
+
+
+def resumed_edge(path):
+    edge = EdgeComputing("device001", transport=InMemoryTransport(InMemoryBroker()), workers=0,
+                         metrics_interval=None, spc=False)
+    checkpoint.restore(edge, *checkpoint.read(path))
+    return edge
+
+
+def test_resume_uses_checkpointed_design(tmp_path):
+    original, path = checkpoint_during_run(tmp_path)
+    edge = resumed_edge(path)
+    # 新的 EdgeComputing 預設為 L9，繼續時使用快照中的 L4 設計
+    assert len(edge.experiment_design) == 9
+    runner = edge.resume_experiment()
+    assert runner is not None
+    runner.stop()
+    assert runner.design == original.experiment_design
+    assert edge.experiment_plan == original.experiment_plan
+    assert len(edge.experiment_design) == 4
+
+
+def test_resume_refuses_changed_levels(tmp_path, caplog):
+    _, path = checkpoint_during_run(tmp_path)
+    edge = resumed_edge(path)
+    edge.control_factors["A"]["levels"]["2"] = 99
+    assert edge.resume_experiment() is None
+    assert edge.experiment_runner is None
+    assert "水準設定與快照不同" in caplog.text
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from edge_computing import SENSOR_TYPES, EdgeComputing  # noqa: E402
+from output_policy import OutputPolicy  # noqa: E402
+from payload_codec import decode_traced_payload  # noqa: E402
+from transport import InMemoryBroker, InMemoryTransport  # noqa: E402
+
+
+def test_batch_without_interval_holds_until_batch_size():
+    policy = OutputPolicy(batch=True, batch_size=3, batch_age=1.0)
+    assert policy.tick == 0.5
+    assert policy.offer("device001", "temperature", 10.0, 1.0, now=0.0) == []
+    assert policy.offer("device001", "pressure", 20.0, 1.0, now=0.1) == []
+    emissions = policy.offer("device001", "rpm", 30.0, 1.0, now=0.2)
+    assert sorted(emission[1] for emission in emissions) == ["pressure", "rpm", "temperature"]
+    # 未湊滿的批次在等待超過 batch_age 後由 collect() 送出
+    assert policy.offer("device001", "temperature", 11.0, 2.0, now=0.3) == []
+    assert policy.collect(now=1.0) == []
+    assert [emission[1] for emission in policy.collect(now=1.3)] == ["temperature"]
+    assert policy.offer("device001", "pressure", 21.0, 3.0, now=1.4) == []
+    assert [emission[2] for emission in policy.flush()] == [21.0]
+
+
+def test_edge_batch_publishes_several_sn_ratios_per_frame():
+    broker = InMemoryBroker()
+    edge = EdgeComputing("device001", transport=InMemoryTransport(broker), workers=0, metrics_interval=None,
+                         spc=False, sn_output=OutputPolicy(batch=True))
+    frames = []
+    listener = InMemoryTransport(broker)
+    listener.on_message = lambda client, userdata, message: frames.append((message.topic, message.payload))
+    listener.connect()
+    listener.subscribe("jetsion/taguchi/device001/sn_ratio/#")
+
+    for i in range(20):
+        for sensor_type in SENSOR_TYPES:
+            edge.process_sensor_data(sensor_type, 100.0 + i % 3, float(i))
+    edge.stop()
+
+    assert frames
+    assert all(topic == "jetsion/taguchi/device001/sn_ratio/frame" for topic, _ in frames)
+    readings = [decode_traced_payload(topic, payload)[1] for topic, payload in frames]
+    assert all(sorted(data) == sorted(SENSOR_TYPES) for data in readings)
+    assert sum(len(data) for data in readings) == edge.sn_output.stats()["published"]
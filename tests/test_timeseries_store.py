@@ -0,0 +1,38 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from timeseries_store import TimeSeriesStore  # noqa: E402
+
+
+def test_concurrent_append_and_flush(tmp_path):
+    # 分段很小，寫入端頻繁換新分段並寫入索引，同時背景執行緒不斷 flush()
+    store = TimeSeriesStore(str(tmp_path), segment_size=8)
+    stop = threading.Event()
+    errors = []
+
+    def flusher():
+        while not stop.is_set():
+            try:
+                store.flush()
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=flusher)
+    thread.start()
+    try:
+        for i in range(3000):
+            store.append("device001", "rpm", 1.0 + i, float(i))
+    finally:
+        stop.set()
+        thread.join()
+    store.close()
+
+    assert errors == []
+    timestamps, values = TimeSeriesStore(str(tmp_path), segment_size=8).read("device001", "rpm")
+    np.testing.assert_array_equal(values, np.arange(3000, dtype=np.float64))
+    assert not [name for name in os.listdir(tmp_path / "device001" / "rpm") if name.endswith(".tmp")]
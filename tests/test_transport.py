@@ -0,0 +1,56 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from transport import InMemoryBroker, InMemoryTransport  # noqa: E402
+
+
+def make_pair():
+    broker = InMemoryBroker()
+    publisher = InMemoryTransport(broker)
+    subscriber = InMemoryTransport(broker)
+    subscriber.connect()
+    subscriber.subscribe("test/#")
+    return publisher, subscriber
+
+
+def test_loop_delivers_on_network_thread():
+    publisher, subscriber = make_pair()
+    received = []
+    inside_publish = threading.local()
+
+    def on_message(client, userdata, message):
+        received.append((message.topic, threading.current_thread(), getattr(inside_publish, "active", False)))
+
+    subscriber.on_message = on_message
+    subscriber.loop_start()
+    for i in range(100):
+        inside_publish.active = True
+        publisher.publish(f"test/{i}", b"x")
+        inside_publish.active = False
+    assert subscriber.wait_idle(5)
+    subscriber.loop_stop()
+    assert [topic for topic, _, _ in received] == [f"test/{i}" for i in range(100)]
+    # 回調在 subscriber 的網路執行緒執行，不在發布端的 publish() 之中
+    assert all(thread is not threading.current_thread() and not active for _, thread, active in received)
+
+
+def test_publish_from_callback_is_not_recursive():
+    publisher, subscriber = make_pair()
+    depth = [0]
+    order = []
+
+    def on_message(client, userdata, message):
+        depth[0] += 1
+        assert depth[0] == 1
+        order.append(message.topic)
+        if message.topic == "test/first":
+            client.publish("test/echo", b"1")
+            order.append("published")
+        depth[0] -= 1
+
+    subscriber.on_message = on_message
+    publisher.publish("test/first", b"0")
+    assert order == ["test/first", "published", "test/echo"]
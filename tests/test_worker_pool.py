@@ -0,0 +1,52 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from edge_computing import EdgeComputing  # noqa: E402
+from transport import InMemoryBroker, InMemoryTransport  # noqa: E402
+from worker_pool import PartitionedWorkerPool  # noqa: E402
+
+
+def test_worker_submitting_to_own_full_partition_runs_inline():
+    handled = []
+    release = threading.Event()
+
+    def handler(value):
+        if value == 0:
+            release.wait(5)
+            # 佇列已滿時排入自己的分區，不可在自己的佇列上等待
+            pool.submit("key", -1)
+        handled.append(value)
+
+    pool = PartitionedWorkerPool(handler, workers=1, queue_size=2)
+    pool.start()
+    pool.submit("key", 0)
+    pool.submit("key", 1)
+    pool.submit("key", 2)
+    release.set()
+    assert pool.wait_idle(5)
+    pool.stop()
+    assert handled == [-1, 0, 1, 2]
+    stats = pool.stats()
+    assert stats["inline"] == 1
+    assert stats["processed"] == 4
+
+
+def test_edge_drops_own_publications_before_queueing():
+    broker = InMemoryBroker()
+    edge = EdgeComputing("device001", transport=InMemoryTransport(broker), workers=1, queue_size=8,
+                         metrics_interval=None)
+    publisher = InMemoryTransport(broker)
+    publisher.connect()
+    for i in range(500):
+        publisher.publish("jetsion/taguchi/device001/rpm", str(1500 + i % 7))
+    edge.publish_control_factors()
+    assert edge.client.wait_idle(10)
+    assert edge.worker_pool.wait_idle(10)
+    stats = edge.queue_stats()
+    edge.stop()
+    # 只有感測器數據排入佇列，S/N 比與控制因子設定等自身發布的訊息在排入前丟棄
+    assert stats["enqueued"] == 500
+    assert edge.metrics.counters["control_factors"]["errors"] == 0